@@ -2,15 +2,45 @@ import os
 import pytz
 import logging
 import pandas as pd
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from core.session import create_session
+from core.jobs import JobManager
+from utils.rows_file import count_rows, stream_ndjson, stream_arrow
+from utils.run_journal import RunJournal, purge_journals
 from core.extract_tags import extract_and_load_tags
 from core.extract_tickets_date import extract_tickets, extract_ticket_messages
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens one LiveAgent client session per worker, shared by every request and background job, and closes it on
+    shutdown after interrupting the jobs still running. Run journals of old failed jobs are deleted on startup.
+    """
+    app.state.session = create_session()
+    app.state.jobs = JobManager()
+    purge_journals()
+    try:
+        yield
+    finally:
+        await app.state.jobs.shutdown()
+        await app.state.session.close()
+
+def job_response(job: dict) -> JSONResponse:
+    """
+    The `202 Accepted` response of an endpoint that started a background job.
+    """
+    return JSONResponse(status_code=202, content={
+        'job_id': job["id"],
+        'status': job["status"],
+        'url': f"/jobs/{job['id']}"
+    })
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 def root():
@@ -20,15 +50,18 @@ def root():
     return {"message": "Hello World"}
 
 @app.post("/mechanigo-liveagent/update-tags/{table_name}")
-async def update_tags(table_name: str):
+async def update_tags(table_name: str, request: Request):
     """
     To update & run tags daily.
     It starts from fetching the tags data from the LiveAgent API through the `/tags` endpoint.
-    Finally, it is loaded to BigQuery.
+    Finally, it is loaded to BigQuery. Runs as a background job; poll `GET /jobs/{job_id}` for the result.
     """
     try:
-        tags = await extract_and_load_tags(table_name)
-        return JSONResponse(tags)
+        session = request.app.state.session
+        job = request.app.state.jobs.submit(
+            "tags", table_name, lambda progress, rows_path: extract_and_load_tags(table_name, session, rows_path)
+        )
+        return job_response(job)
     except Exception as e:
         return JSONResponse(content={
             'error': str(e),
@@ -36,19 +69,26 @@ async def update_tags(table_name: str):
         })
 
 @app.post("/mechanigo-liveagent/update-tickets/{table_name}")
-async def update_tickets(table_name: str):
+async def update_tickets(table_name: str, request: Request, incremental: bool = False):
     """
     To update & run tickets daily.
     It starts from fetching the tickets data from the LiveAgent API through the `/tickets` endpoint.
-    It is then loaded to BigQuery.
+    It is then loaded to BigQuery. With `?incremental=true`, only tickets changed since the last
+    incremental run are fetched, and they are upserted on `ticket_id` so changed tickets are updated instead of
+    appended. Runs as a background job; poll `GET /jobs/{job_id}` for the result.
     """
     try:
         now = pd.Timestamp.now(tz="UTC").astimezone(pytz.timezone("Asia/Manila"))
         print(f"NOW: {now}")
         date = now - pd.Timedelta(hours=6)
         logger.info(f"Date and time Ran: {date}")
-        tickets = await extract_tickets(date, table_name)
-        return JSONResponse(tickets)
+        session = request.app.state.session
+        job = request.app.state.jobs.submit(
+            "tickets", table_name,
+            lambda progress, rows_path: extract_tickets(date, table_name, session, incremental, progress, rows_path),
+            incremental=incremental
+        )
+        return job_response(job)
     except Exception as e:
         return JSONResponse(content={
             'error': str(e),
@@ -56,20 +96,86 @@ async def update_tickets(table_name: str):
         })
 
 @app.post("/mechanigo-liveagent/update-ticket-messages/{table_name}")
-async def update_ticket_messages(table_name: str):
+async def update_ticket_messages(table_name: str, request: Request, incremental: bool = False, resume: str = None):
     """
     To update & run ticket messages daily.
     It starts from fetching the ticket messages from the LiveAgent API through the `/tickets/{ticket_id}/messages` endpoint.
-    It is then loaded to BigQuery.
+    It is then loaded to BigQuery. With `?incremental=true`, only new or changed tickets are fetched, only their
+    messages after the last incremental run are fetched, and they are upserted. Runs as a background job; poll
+    `GET /jobs/{job_id}` for progress and the result.
+
+    Fetched messages are checkpointed in a run journal whose ID is in the job's `params.run_id`. If the job fails,
+    `?resume=<run_id>` starts a new job that skips the tickets already fetched.
     """
     try:
-        ticket_messages = await extract_ticket_messages(table_name)
-        return JSONResponse(ticket_messages)
+        try:
+            journal = RunJournal(resume)
+        except FileNotFoundError as e:
+            return JSONResponse(status_code=404, content={
+                'error': str(e),
+                'status': 'error'
+            })
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={
+                'error': str(e),
+                'status': 'error'
+            })
+
+        session = request.app.state.session
+        job = request.app.state.jobs.submit(
+            "messages", table_name,
+            lambda progress, rows_path: extract_ticket_messages(table_name, session, incremental, progress, rows_path, journal),
+            incremental=incremental,
+            run_id=journal.run_id
+        )
+        return job_response(job)
     except Exception as e:
         return JSONResponse(content={
             'error': str(e),
             'status': 'error'
         })
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request):
+    """
+    Status of a background job: `queued`, `running`, `succeeded`, `failed` or `interrupted`, with its progress
+    counts while it runs and a summary of the load once it succeeded. The loaded rows themselves are served by
+    `GET /jobs/{job_id}/rows`.
+    """
+    job = request.app.state.jobs.store.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={
+            'error': f"Job {job_id} not found",
+            'status': 'error'
+        })
+    return JSONResponse(job)
+
+@app.get("/jobs/{job_id}/rows")
+async def get_job_rows(
+    job_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(10000, ge=1, le=1000000),
+    format: str = Query("ndjson", pattern="^(ndjson|arrow)$")
+):
+    """
+    Streams the rows loaded by a succeeded job, from the job's Parquet file, as newline-delimited JSON
+    (`format=ndjson`) or an Arrow IPC stream (`format=arrow`). Page through them with `offset` and `limit`;
+    the `X-Total-Count` header holds the total number of rows. Rows are kept for `JOB_ROWS_MAX_AGE_HOURS`.
+    """
+    jobs = request.app.state.jobs
+    job = jobs.store.get(job_id)
+    path = jobs.rows_path(job_id)
+    if job is None or job["status"] != "succeeded" or not os.path.exists(path):
+        return JSONResponse(status_code=404, content={
+            'error': f"No rows for job {job_id}",
+            'status': 'error'
+        })
+
+    headers = {"X-Total-Count": str(count_rows(path))}
+    if format == "arrow":
+        return StreamingResponse(stream_arrow(path, offset, limit), media_type="application/vnd.apache.arrow.stream", headers=headers)
+    return StreamingResponse(stream_ndjson(path, offset, limit), media_type="application/x-ndjson", headers=headers)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get('PORT', 8080)))
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Compares decoding LiveAgent API pages with the standard library (`await res.json()`, the old path) with the
+`core.decoders.PageDecoder` backends (`msgspec`, `orjson`, `json`), with and without the projection to the fields
+used downstream, measuring decode time and the size of what is kept.
+
+The pages are read from a directory of recorded responses (`tickets_*.json` and `messages_*.json`), which
+`--record` writes from the live API (needs the API credentials). Without `--fixtures`, pages shaped like the API's
+responses are generated.
+
+Usage:
+    python -m benchmarks.bench_decoders --record fixtures/pages --pages 2 --tickets 50
+    python -m benchmarks.bench_decoders --fixtures fixtures/pages --repeat 20
+    python -m benchmarks.bench_decoders --tickets 100 --messages 25
+"""
+import os
+import json
+import glob
+import time
+import asyncio
+import argparse
+from config import config
+from core.session import create_session
+from core.retry import request_json
+from core.extraction_spec import ExtractionSpec
+from core.decoders import PageDecoder, available_backends
+from core.liveagent_client import TICKET_FIELDS, MESSAGE_FIELDS, _messages_request
+
+def ticket_record(i: int) -> dict:
+    return {
+        "id": f"t{i:06d}", "owner_contactid": f"c{i}", "owner_email": f"customer{i}@example.com",
+        "owner_name": f"Customer {i}", "departmentid": "d1", "agentid": f"agent{i % 20}", "status": "R",
+        "tags": ["booking", "inquiry"], "code": f"ABC-{i:05d}", "channel_type": "F",
+        "date_created": "2025-01-01 08:00:00", "date_changed": "2025-01-02 09:30:00",
+        "date_resolved": "2025-01-02 09:30:00", "last_activity": "2025-01-02 09:30:00",
+        "last_activity_public": "2025-01-02 09:30:00", "public_access_urlcode": f"{i:032x}",
+        "subject": f"Booking inquiry #{i}", "custom_fields": [{"code": "plate", "value": f"ABC {i:04d}"}],
+    }
+
+def message_group(i: int, j: int) -> dict:
+    return {
+        "id": f"g{i}-{j}", "parent_id": f"t{i:06d}", "ticket_id": f"t{i:06d}", "userid": f"agent{i % 20}",
+        "user_full_name": f"Agent {i % 20}", "type": "M", "status": "T", "datecreated": "2025-01-01 08:00:00",
+        "datefinished": "2025-01-01 08:00:00", "sort_date": "2025-01-01 08:00:00", "mail_msg_id": f"<{i}.{j}@mail>",
+        "pop3_msg_id": "",
+        "messages": [
+            {
+                "id": f"m{i}-{j}-{k}", "userid": f"agent{i % 20}", "type": "M", "datecreated": "2025-01-01 08:00:00",
+                "format": "H", "visibility": "P",
+                "message": "<p>Hello, I would like to book a service for my car.</p>" * (k % 3 + 1),
+            }
+            for k in range(2)
+        ],
+    }
+
+def generate_pages(tickets: int, messages: int, per_page: int = 100) -> dict:
+    records = [ticket_record(i) for i in range(tickets)]
+    return {
+        "tickets": [json.dumps(records[start:start + per_page]).encode() for start in range(0, tickets, per_page)],
+        "messages": [json.dumps([message_group(i, j) for j in range(messages)]).encode() for i in range(tickets)],
+    }
+
+def read_pages(directory: str) -> dict:
+    def read(pattern: str) -> list:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            with open(path, "rb") as f:
+                pages.append(f.read())
+        return pages
+
+    return {"tickets": read("tickets_*.json"), "messages": read("messages_*.json")}
+
+async def record_pages(directory: str, pages: int, tickets: int):
+    def save(name: str, body: bytes):
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(body)
+
+    os.makedirs(directory, exist_ok=True)
+    raw = lambda body: body
+    async with create_session() as session:
+        payload = ExtractionSpec().ticket_payload()
+        ticket_ids = []
+        for page in range(1, pages + 1):
+            body = await request_json(session, config.tickets_list_url, params={**payload, "_page": page}, headers=config.headers, decoder=raw)
+            save(f"tickets_{page:03d}.json", body)
+            ticket_ids += [ticket["id"] for ticket in json.loads(body)]
+
+        for i, ticket_id in enumerate(ticket_ids[:tickets]):
+            url, params = _messages_request(ticket_id, None)
+            body = await request_json(session, url, params=params, headers=config.headers, decoder=raw)
+            save(f"messages_{i:05d}.json", body)
+    print(f"Recorded {pages} ticket page(s) and the messages of {min(tickets, len(ticket_ids))} ticket(s) in {directory}")
+
+def measure(decode, pages: list, repeat: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decoded = [decode(page) for page in pages]
+    seconds = (time.perf_counter() - start) / repeat
+    return seconds, sum(len(json.dumps(data)) for data in decoded)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decoding LiveAgent API pages.")
+    parser.add_argument("--fixtures", help="Directory of recorded pages (default: generated pages)")
+    parser.add_argument("--record", help="Record pages from the API into this directory and exit")
+    parser.add_argument("--pages", type=int, default=1, help="Ticket pages to record (default: 1)")
+    parser.add_argument("--tickets", type=int, default=100, help="Tickets whose messages are recorded/generated (default: 100)")
+    parser.add_argument("--messages", type=int, default=25, help="Message groups per generated ticket (default: 25)")
+    parser.add_argument("--repeat", type=int, default=10, help="Times each decoder runs over the pages (default: 10)")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record_pages(args.record, args.pages, args.tickets))
+        return
+
+    pages = read_pages(args.fixtures) if args.fixtures else generate_pages(args.tickets, args.messages)
+    projections = {"tickets": (TICKET_FIELDS, None), "messages": (["messages"], {"messages": MESSAGE_FIELDS})}
+
+    for kind, page_bodies in pages.items():
+        size = sum(len(page) for page in page_bodies)
+        print(f"{kind}: {len(page_bodies)} page(s), {size / 1024 ** 2:.1f} MiB")
+        if not page_bodies:
+            continue
+
+        fields, nested = projections[kind]
+        decoders = [("res.json() (json)", lambda body: json.loads(body.decode("utf-8")))]
+        for backend in available_backends():
+            decoders.append((backend, PageDecoder(backend=backend)))
+            decoders.append((f"{backend} projected", PageDecoder(fields, nested, backend=backend)))
+
+        for name, decode in decoders:
+            seconds, kept = measure(decode, page_bodies, args.repeat)
+            print(f"  {name + ':':<22}{seconds * 1000:8.1f} ms, {size / 1024 ** 2 / seconds:7.1f} MiB/s, kept {kept / 1024 ** 2:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares building the messages DataFrame from one dictionary per message (the old path) with the
+`core.message_columns.MessageColumns` accumulator, measuring time and peak Python memory.
+
+Usage:
+    python -m benchmarks.bench_message_columns --tickets 20000 --messages 25
+"""
+import time
+import argparse
+import tracemalloc
+import pandas as pd
+from core.message_columns import MessageColumns, MESSAGE_COLUMNS
+
+def ticket_fields(i: int) -> dict:
+    return {
+        "ticket_id": f"ticket{i}", "code": f"CODE-{i}", "owner_name": f"Customer {i}",
+        "subject": f"Booking inquiry #{i}", "ticket_date_created": "2025-01-01 00:00:00", "agentid": f"agent{i % 20}",
+        "status": "R", "channel_type": "F", "agent_name": f"Agent {i % 20}", "tags": "booking,inquiry"
+    }
+
+def message_fields(i: int, j: int) -> dict:
+    return {
+        "message_id": f"m{i}-{j}", "message": "Hello, I would like to book a service.", "datecreated": "2025-01-01 00:00:00",
+        "type": "M", "sender_name": f"Customer {i}", "receiver_type": "Agent", "receiver_name": f"Agent {i % 20}"
+    }
+
+def build_dicts(tickets: int, messages: int) -> pd.DataFrame:
+    rows = []
+    for i in range(tickets):
+        fields = ticket_fields(i)
+        for j in range(messages):
+            rows.append({**fields, **message_fields(i, j)})
+    return pd.DataFrame(rows, columns=MESSAGE_COLUMNS)
+
+def build_columns(tickets: int, messages: int) -> pd.DataFrame:
+    columns = MessageColumns()
+    for i in range(tickets):
+        ticket = columns.add_ticket(**ticket_fields(i))
+        for j in range(messages):
+            columns.add_message(ticket, **message_fields(i, j))
+    return columns.to_frame()
+
+def measure(func, tickets: int, messages: int) -> tuple:
+    # timed without tracemalloc, which slows allocation-heavy code down
+    start = time.perf_counter()
+    func(tickets, messages)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    df = func(tickets, messages)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, df
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark building the messages DataFrame.")
+    parser.add_argument("--tickets", type=int, default=20000, help="Number of tickets (default: 20000)")
+    parser.add_argument("--messages", type=int, default=25, help="Messages per ticket (default: 25)")
+    args = parser.parse_args()
+
+    dict_seconds, dict_peak, old = measure(build_dicts, args.tickets, args.messages)
+    column_seconds, column_peak, new = measure(build_columns, args.tickets, args.messages)
+    pd.testing.assert_frame_equal(old, new)
+
+    print(f"messages:     {len(new)}")
+    print(f"dict per row: {dict_seconds:.2f}s, peak {dict_peak / 1024 ** 2:.0f} MiB")
+    print(f"columnar:     {column_seconds:.2f}s, peak {column_peak / 1024 ** 2:.0f} MiB")
+
+if __name__ == "__main__":
+    main()
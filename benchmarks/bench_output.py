@@ -0,0 +1,72 @@
+"""
+Compares writing the messages of a run to CSV (`main.py --csv`) with the day-partitioned Parquet output of
+`utils.rows_file.PartitionedRowsWriter` (`main.py --parquet`), measuring write time and size on disk. Both are
+written batch by batch, as `main.py` does.
+
+Usage:
+    python -m benchmarks.bench_output --tickets 20000 --messages 25 --days 30
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+import pytz
+
+from benchmarks.bench_message_columns import build_columns
+from utils.date_utils import normalize_datetimes
+from utils.rows_file import PartitionedRowsWriter
+
+def make_frame(tickets: int, messages: int, days: int) -> pd.DataFrame:
+    df = build_columns(tickets, messages)
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2025-01-01").value // 10 ** 9
+    seconds = rng.integers(0, days * 86400, size=len(df)) + start
+    df["datecreated"] = pd.to_datetime(seconds, unit="s").strftime("%Y-%m-%d %H:%M:%S")
+    df["message"] = [f"Message {i}: " + "Hello, I would like to book a service. " * (i % 4 + 1) for i in range(len(df))]
+    return normalize_datetimes(df, "datecreated", "ticket_date_created", target_tz=pytz.timezone("Asia/Manila"), keep_tz=True)
+
+def batches(df: pd.DataFrame, size: int):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+def size_of(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def write_csv(df: pd.DataFrame, path: str, batch_rows: int):
+    for i, batch in enumerate(batches(df, batch_rows)):
+        batch.to_csv(path, index=False, mode="w" if i == 0 else "a", header=i == 0)
+
+def write_parquet(df: pd.DataFrame, path: str, batch_rows: int, compression: str):
+    with PartitionedRowsWriter(path, "datecreated", "bench", compression=compression) as output:
+        for batch in batches(df, batch_rows):
+            output.write(batch)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CSV and Parquet outputs of main.py.")
+    parser.add_argument("--tickets", type=int, default=20000, help="Number of tickets (default: 20000)")
+    parser.add_argument("--messages", type=int, default=25, help="Messages per ticket (default: 25)")
+    parser.add_argument("--days", type=int, default=30, help="Days the messages are spread over (default: 30)")
+    parser.add_argument("--batch_rows", type=int, default=5000, help="Rows per batch (default: 5000)")
+    args = parser.parse_args()
+
+    df = make_frame(args.tickets, args.messages, args.days)
+    print(f"messages: {len(df)} over {args.days} days")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = [
+            ("csv", os.path.join(tmp, "messages.csv"), lambda path: write_csv(df, path, args.batch_rows)),
+            ("parquet zstd", os.path.join(tmp, "zstd"), lambda path: write_parquet(df, path, args.batch_rows, "zstd")),
+            ("parquet snappy", os.path.join(tmp, "snappy"), lambda path: write_parquet(df, path, args.batch_rows, "snappy")),
+        ]
+        for name, path, write in outputs:
+            start = time.perf_counter()
+            write(path)
+            seconds = time.perf_counter() - start
+            print(f"{name + ':':<16}{seconds:.2f}s, {size_of(path) / 1024 ** 2:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
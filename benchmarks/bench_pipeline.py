@@ -0,0 +1,192 @@
+"""
+End-to-end throughput of an extraction window against the mock LiveAgent API (`benchmarks.mock_liveagent`) and a
+fake BigQuery client (`benchmarks.fake_bigquery`), without touching the production account or a GCP project. For
+every scenario (number of tickets in the window) a mock server and a fresh client process are started, and the
+client runs the ticket list, agents, messages and load, reporting requests/sec, messages/sec, peak RSS and the
+end-to-end latency of the window.
+
+Pipelines:
+    - `stream`: `stream_tickets()` -> `stream_message_frames()` -> `BigQuerySink`, as `main.py` and the API do
+    - `batch`: `fetch_tickets()` -> `fetch_all_messages()` -> `load_data_to_bq()`, all in memory
+
+The mock API enforces the rate limit of `--rate_limit` requests per minute, and the client is configured with the
+same limit. At the production limit (180) a 1k-ticket window takes about six minutes and is bound by the limit;
+raise it on both sides (e.g. `--rate_limit 60000`) to measure the client itself.
+
+Usage:
+    python -m benchmarks.bench_pipeline --scenarios 1k
+    python -m benchmarks.bench_pipeline --scenarios 1k,10k,100k --rate_limit 60000 --latency 0.02
+    python -m benchmarks.bench_pipeline --scenarios 10k --pipeline batch --fixtures fixtures/pages
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import resource
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+import pytz
+
+from config import config
+from core.session import create_session
+from core.extraction_spec import ExtractionSpec
+from core.reference_data import get_agent_lookup
+from core.liveagent_client import stream_tickets, stream_message_frames, fetch_tickets, fetch_all_messages
+from core.table_specs import MESSAGES_TABLE
+from utils.bq_sink import BigQuerySink
+from utils.bq_utils import load_data_to_bq
+from utils.date_utils import normalize_datetimes
+from benchmarks.fake_bigquery import FakeBigQueryClient
+
+SCENARIOS = {"1k": 1000, "10k": 10000, "100k": 100000}
+manila_tz = pytz.timezone("Asia/Manila")
+# Prefix of the result line a client process prints
+RESULT = "RESULT "
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def fetch_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as res:
+        return json.loads(res.read())
+
+def start_server(port: int, tickets: int, args) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.mock_liveagent", "--port", str(port), "--tickets", str(tickets),
+        "--messages", str(args.messages), "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--rate_limit", str(args.rate_limit)
+    ]
+    if args.fixtures:
+        command += ["--fixtures", args.fixtures]
+    server = subprocess.Popen(command)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            fetch_json(f"http://127.0.0.1:{port}/_stats")
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("The mock LiveAgent server exited")
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("The mock LiveAgent server did not start")
+
+def run_scenario(name: str, tickets: int, args) -> dict:
+    port = free_port()
+    server = start_server(port, tickets, args)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                LIVEAGENT_BASE_URL=f"http://127.0.0.1:{port}",
+                API_KEY="benchmark",
+                LIVEAGENT_RATE_LIMIT=str(args.rate_limit or 10 ** 9),
+                REFERENCE_CACHE_DIR=os.path.join(tmp, "reference"),
+                RUN_JOURNAL_DIR=os.path.join(tmp, "runs"),
+                MESSAGE_CACHE_ENABLED="false",
+            )
+            command = [
+                sys.executable, "-m", "benchmarks.bench_pipeline", "--client", "--tickets", str(tickets),
+                "--pipeline", args.pipeline, "--upload_mib_per_second", str(args.upload_mib_per_second),
+                "--job_latency", str(args.job_latency)
+            ]
+            client = subprocess.run(
+                command, env=env, capture_output=True, text=True, check=False
+            )
+        if client.returncode != 0:
+            raise RuntimeError(f"Scenario {name} failed:\n{client.stderr[-2000:]}")
+        result = json.loads(next(line for line in client.stdout.splitlines() if line.startswith(RESULT))[len(RESULT):])
+        result["server"] = fetch_json(f"http://127.0.0.1:{port}/_stats")
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+async def run_client(tickets: int, pipeline: str, bq_client) -> dict:
+    spec = ExtractionSpec(max_pages=-(-tickets // 100), per_page=100, message_per_page=100)
+    project_id, dataset_name, table_name = "benchmark", "liveagent", "messages"
+    messages = 0
+    first_load = None
+    start = time.perf_counter()
+
+    async with create_session() as session:
+        agent_lookup = await get_agent_lookup(session)
+
+        if pipeline == "stream":
+            with BigQuerySink(project_id, dataset_name, table_name, "WRITE_TRUNCATE", spec=MESSAGES_TABLE, client=bq_client) as sink:
+                tickets_stream = stream_tickets(session, spec.ticket_payload(), spec.max_pages)
+                async for df in stream_message_frames(session, tickets_stream, agent_lookup, spec=spec):
+                    if df.empty:
+                        continue
+                    df = normalize_datetimes(df, "datecreated", "ticket_date_created", target_tz=manila_tz, keep_tz=True)
+                    await asyncio.to_thread(sink.write, df)
+                    messages += len(df)
+                    if first_load is None and sink.flushes:
+                        first_load = time.perf_counter() - start
+        else:
+            ticket_data = await fetch_tickets(session, spec.ticket_payload(), spec.max_pages)
+            df = await fetch_all_messages(session, ticket_data, agent_lookup, spec=spec)
+            df = normalize_datetimes(df, "datecreated", "ticket_date_created", target_tz=manila_tz, keep_tz=True)
+            config.BQ_CLIENT = bq_client
+            config.creds = {"project_id": project_id}
+            result = await asyncio.to_thread(load_data_to_bq, df, project_id, dataset_name, table_name, "WRITE_TRUNCATE", None, MESSAGES_TABLE)
+            if result.startswith("Failed"):
+                raise RuntimeError(result)
+            messages = len(df)
+
+    seconds = time.perf_counter() - start
+    return {
+        "tickets": tickets,
+        "messages": messages,
+        "seconds": seconds,
+        "first_load_seconds": first_load if first_load is not None else seconds,
+        # kilobytes on Linux
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "bq": bq_client.stats,
+    }
+
+def client_main(args):
+    bq_client = FakeBigQueryClient(args.upload_mib_per_second, args.job_latency)
+    result = asyncio.run(run_client(args.tickets, args.pipeline, bq_client))
+    print(RESULT + json.dumps(result), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction windows against a mock LiveAgent API.")
+    parser.add_argument("--scenarios", default="1k", help=f"Comma-separated windows, of {', '.join(SCENARIOS)} or a ticket count (default: 1k)")
+    parser.add_argument("--pipeline", choices=["stream", "batch"], default="stream", help="Pipeline to run (default: stream)")
+    parser.add_argument("--messages", type=int, default=10, help="Average message groups per ticket (default: 10)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each API response is delayed (default: 0.05)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Random extra API delay in seconds, up to (default: 0.02)")
+    parser.add_argument("--rate_limit", type=int, default=180, help="API requests per minute, 0 for none (default: 180)")
+    parser.add_argument("--fixtures", help="Directory of recorded pages the mock API replays (see bench_decoders --record)")
+    parser.add_argument("--upload_mib_per_second", type=float, default=0, help="Simulated BigQuery upload bandwidth, 0 for none (default: 0)")
+    parser.add_argument("--job_latency", type=float, default=0, help="Seconds each BigQuery job takes (default: 0)")
+    # runs one window in this process, see `run_scenario()`
+    parser.add_argument("--client", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--tickets", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        client_main(args)
+        return
+
+    print(f"{'scenario':<10}{'tickets':>9}{'messages':>10}{'requests':>10}{'429s':>6}{'req/s':>9}{'msg/s':>10}{'first load':>12}{'end-to-end':>12}{'peak RSS':>11}")
+    for name in args.scenarios.split(","):
+        tickets = SCENARIOS.get(name) or int(name)
+        result = run_scenario(name, tickets, args)
+        server = result["server"]
+        print(
+            f"{name:<10}{tickets:>9}{result['messages']:>10}{server['requests']:>10}{server['throttled']:>6}"
+            f"{server['requests'] / result['seconds']:>9.1f}{result['messages'] / result['seconds']:>10.0f}"
+            f"{result['first_load_seconds']:>11.1f}s{result['seconds']:>11.1f}s{result['peak_rss_mib']:>7.0f} MiB"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Measures how long a fresh interpreter takes to import the API app, which is what each gunicorn worker does before
+it can serve (and what a Cloud Run cold start waits for). The eager case also imports the Google Cloud SDK and the
+service-account module, as `config/config.py` did at import time before settings became lazy. Building the
+credentials and the client is not included, since it needs real credentials.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+LAZY = "import app"
+EAGER = "import app; from google.cloud import bigquery; from google.oauth2 import service_account"
+CHECK = "import sys, app; print('google.cloud.bigquery.client' in sys.modules)"
+
+def timed(code: str) -> float:
+    env = dict(os.environ, API_KEY=os.environ.get("API_KEY", "benchmark"))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, env=env, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the API app.")
+    parser.add_argument("--runs", type=int, default=5, help="Interpreter starts per case (default: 5)")
+    args = parser.parse_args()
+
+    # warm the file system cache so the first run is not an outlier
+    timed(LAZY)
+    lazy = [timed(LAZY) for _ in range(args.runs)]
+    eager = [timed(EAGER) for _ in range(args.runs)]
+
+    env = dict(os.environ, API_KEY=os.environ.get("API_KEY", "benchmark"))
+    loaded = subprocess.run([sys.executable, "-c", CHECK], check=True, env=env, capture_output=True, text=True).stdout.strip()
+
+    print(f"runs:                 {args.runs}")
+    print(f"eager (SDK imported): {statistics.median(eager):.2f}s median")
+    print(f"lazy:                 {statistics.median(lazy):.2f}s median")
+    print(f"saved per worker:     {statistics.median(eager) - statistics.median(lazy):.2f}s")
+    print(f"SDK loaded by app:    {loaded}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compares the old per-row time zone conversion with `utils.date_utils.normalize_datetimes()` on a synthetic
+message frame.
+
+Usage:
+    python -m benchmarks.bench_timezone --rows 1000000
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import pytz
+
+from utils.date_utils import normalize_datetimes
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2025-01-01").value // 10 ** 9
+    seconds = rng.integers(0, 365 * 86400, size=rows) + start
+    dates = pd.to_datetime(seconds, unit="s").strftime("%Y-%m-%d %H:%M:%S")
+    return pd.DataFrame({"datecreated": dates, "ticket_date_created": dates})
+
+def per_row(df: pd.DataFrame, *columns: str, target_tz) -> pd.DataFrame:
+    # the conversion previously done by `set_timezone()`
+    for column in columns:
+        df[column] = pd.to_datetime(df[column], errors="coerce").dt.tz_localize('UTC')
+        df[column] = df[column].apply(
+            lambda x: x.astimezone(target_tz).replace(tzinfo=None) if pd.notnull(x) else x
+        )
+    return df
+
+def timed(func, df: pd.DataFrame) -> tuple:
+    start = time.perf_counter()
+    result = func(df, "datecreated", "ticket_date_created", target_tz=pytz.timezone("Asia/Manila"))
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark time zone conversion of message dates.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of messages (default: 1000000)")
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    old_seconds, old = timed(per_row, df.copy())
+    new_seconds, new = timed(normalize_datetimes, df.copy())
+
+    pd.testing.assert_series_equal(
+        pd.to_datetime(old["datecreated"]).astype("datetime64[ns]"),
+        new["datecreated"].astype("datetime64[ns]")
+    )
+    print(f"rows:       {args.rows}")
+    print(f"per-row:    {old_seconds:.2f}s (dtype {old['datecreated'].dtype})")
+    print(f"vectorized: {new_seconds:.2f}s (dtype {new['datecreated'].dtype})")
+    print(f"speedup:    {old_seconds / new_seconds:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+An in-memory stand-in for `bigquery.Client`, for benchmarks that load without a GCP project. Pass it as the `client`
+of `utils.bq_sink.BigQuerySink`, or set it as `config.BQ_CLIENT` for `load_data_to_bq()`.
+"""
+import io
+import time
+import threading
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.bq_utils import bigquery, exceptions
+
+class FakeJob:
+    num_dml_affected_rows = None
+
+    def result(self):
+        return self
+
+class FakeBigQueryClient:
+    """
+    Keeps datasets and tables in memory. Load jobs serialize the rows to Parquet, as the real client does before
+    uploading, count them and drop them; `upload_mib_per_second` and `job_latency` add the time the upload and
+    the job would take. Queries (the `MERGE` of `run_merge_job()`) are not executed.
+
+    Parameters:
+        - upload_mib_per_second (`float`) - simulated upload bandwidth, 0 for none; default is 0
+        - job_latency (`float`) - seconds every job takes on top of the upload; default is 0
+    """
+    def __init__(self, upload_mib_per_second: float = 0, job_latency: float = 0):
+        self.upload_mib_per_second = upload_mib_per_second
+        self.job_latency = job_latency
+        self.datasets = {}
+        self.tables = {}
+        self.stats = {"loads": 0, "rows": 0, "bytes": 0, "queries": 0, "seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def get_dataset(self, dataset_id):
+        if str(dataset_id) not in self.datasets:
+            raise exceptions.NotFound(f"Dataset {dataset_id} not found")
+        return self.datasets[str(dataset_id)]
+
+    def create_dataset(self, dataset, timeout=None):
+        self.datasets[f"{dataset.project}.{dataset.dataset_id}"] = dataset
+        return dataset
+
+    def get_table(self, table_id):
+        if str(table_id) not in self.tables:
+            raise exceptions.NotFound(f"Table {table_id} not found")
+        return self.tables[str(table_id)]
+
+    def create_table(self, table):
+        self.tables[str(table.reference)] = table
+        return table
+
+    def update_table(self, table, fields):
+        self.tables[str(table.reference)] = table
+        return table
+
+    def delete_table(self, table_id, not_found_ok=False):
+        if self.tables.pop(str(table_id), None) is None and not not_found_ok:
+            raise exceptions.NotFound(f"Table {table_id} not found")
+
+    def query(self, sql, job_config=None):
+        with self._lock:
+            self.stats["queries"] += 1
+        return FakeJob()
+
+    def _load(self, table_id, job_config, rows: int, size: int, started: float) -> FakeJob:
+        table = self.get_table(table_id)
+        if not table.schema and job_config.schema:
+            table.schema = job_config.schema
+
+        delay = self.job_latency + (size / 1024 ** 2 / self.upload_mib_per_second if self.upload_mib_per_second else 0)
+        time.sleep(delay)
+        with self._lock:
+            self.stats["loads"] += 1
+            self.stats["rows"] += rows
+            self.stats["bytes"] += size
+            self.stats["seconds"] += time.perf_counter() - started
+        return FakeJob()
+
+    def load_table_from_dataframe(self, df, table_id, job_config=None):
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), buffer)
+        return self._load(table_id, job_config or bigquery.LoadJobConfig(), len(df), buffer.tell(), started)
+
+    def load_table_from_file(self, file, table_id, job_config=None):
+        started = time.perf_counter()
+        data = file.read()
+        rows = pq.ParquetFile(io.BytesIO(data)).metadata.num_rows
+        return self._load(table_id, job_config or bigquery.LoadJobConfig(), rows, len(data), started)
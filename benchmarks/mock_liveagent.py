@@ -0,0 +1,194 @@
+"""
+A local stand-in for the LiveAgent API, for benchmarks that must not touch the production account. Serves
+`/tickets`, `/tickets/{ticket_id}/messages`, `/agents`, `/tags` and `/ping` with the API's paging (`_page`,
+`_perPage`), a response latency, and the API rate limit (requests per minute per API key, answered with 429 and
+`Retry-After` when exceeded). `/_stats` reports the requests served and throttled.
+
+Tickets and messages are generated, or replayed from recorded pages (see `bench_decoders --record`) with fresh
+ticket IDs. Point the extraction at it with `LIVEAGENT_BASE_URL`.
+
+Usage:
+    python -m benchmarks.mock_liveagent --tickets 10000 --latency 0.05 --port 8765
+    LIVEAGENT_BASE_URL=http://127.0.0.1:8765 API_KEY=benchmark python main.py --skip_bq ...
+"""
+import time
+import random
+import asyncio
+import argparse
+from collections import deque
+from aiohttp import web
+from utils.json_utils import dumps
+from benchmarks.bench_decoders import read_pages
+from core.decoders import decode
+
+AGENTS = 20
+
+class MockLiveAgent:
+    """
+    The data and limits of the mock API.
+
+    Parameters:
+        - tickets (`int`) - number of tickets the ticket list returns
+        - messages (`int`) - average number of message groups per ticket; default is 10
+        - latency (`float`) - seconds every response is delayed; default is 0.05
+        - jitter (`float`) - up to this many seconds are added to the latency at random; default is 0.02
+        - rate_limit (`int`) - requests per minute allowed per API key, 0 for no limit; default is 180
+        - fixtures (`str`) - directory of recorded pages to replay; default is generated pages
+    """
+    def __init__(self, tickets: int, messages: int = 10, latency: float = 0.05, jitter: float = 0.02, rate_limit: int = 180, fixtures: str = None):
+        self.tickets = tickets
+        self.messages = messages
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.windows = {}
+        self.stats = {"requests": 0, "throttled": 0, "endpoints": {}}
+
+        self.ticket_records = None
+        self.message_pages = None
+        self.agent_ids = [f"agent{i}" for i in range(AGENTS)]
+        if fixtures:
+            pages = read_pages(fixtures)
+            self.ticket_records = [ticket for page in pages["tickets"] for ticket in decode(page)]
+            self.message_pages = [decode(page) for page in pages["messages"]]
+            if not self.ticket_records or not self.message_pages:
+                raise ValueError(f"No recorded ticket and message pages in {fixtures}")
+            self.agent_ids = sorted({ticket["agentid"] for ticket in self.ticket_records if ticket.get("agentid")}) or self.agent_ids
+
+    def ticket(self, i: int) -> dict:
+        ticket_id = f"t{i:07d}"
+        if self.ticket_records:
+            return {**self.ticket_records[i % len(self.ticket_records)], "id": ticket_id}
+        return {
+            "id": ticket_id, "owner_contactid": f"c{i}", "owner_email": f"customer{i}@example.com",
+            "owner_name": f"Customer {i}", "departmentid": "d1", "agentid": self.agent_ids[i % len(self.agent_ids)],
+            "status": "R", "tags": ["booking", "inquiry"], "code": f"ABC-{i:07d}", "channel_type": "F",
+            "date_created": "2025-01-01 08:00:00", "date_changed": "2025-01-02 09:30:00",
+            "last_activity": "2025-01-02 09:30:00", "subject": f"Booking inquiry #{i}",
+            "custom_fields": [{"code": "plate", "value": f"ABC {i % 10000:04d}"}],
+        }
+
+    def ticket_messages(self, i: int) -> list:
+        if self.message_pages:
+            return self.message_pages[i % len(self.message_pages)]
+
+        agent_id = self.agent_ids[i % len(self.agent_ids)]
+        # between 1 and 2 * messages - 1 groups, `messages` on average
+        groups = 1 + (i * 7919) % max(1, 2 * self.messages - 1)
+        return [
+            {
+                "id": f"g{i}-{j}", "parent_id": f"t{i:07d}", "userid": agent_id if j % 2 else f"c{i}", "type": "M",
+                "status": "T", "datecreated": f"2025-01-01 08:{j // 60 % 60:02d}:{j % 60:02d}",
+                "messages": [
+                    {
+                        "id": f"m{i}-{j}-{k}", "userid": agent_id if j % 2 else f"c{i}", "type": "M", "format": "H",
+                        "datecreated": f"2025-01-01 08:{j // 60 % 60:02d}:{j % 60:02d}", "visibility": "P",
+                        "message": "<p>Hello, I would like to book a service for my car.</p>" * (k + 1),
+                    }
+                    for k in range(1 + j % 2)
+                ],
+            }
+            for j in range(groups)
+        ]
+
+    def throttle(self, api_key: str) -> float:
+        """
+        Records a request of `api_key` in its one-minute window.
+
+        Returns:
+            float:
+                - `None` if the request is allowed, otherwise the seconds until it would be
+        """
+        if not self.rate_limit:
+            return None
+        window = self.windows.setdefault(api_key, deque())
+        now = time.monotonic()
+        while window and now - window[0] >= 60:
+            window.popleft()
+        if len(window) >= self.rate_limit:
+            return 60 - (now - window[0])
+        window.append(now)
+        return None
+
+    def app(self) -> web.Application:
+        def page_of(request: web.Request, records: list) -> list:
+            page = int(request.query.get("_page", 1))
+            per_page = int(request.query.get("_perPage", 10))
+            return records[(page - 1) * per_page:page * per_page]
+
+        def respond(data) -> web.Response:
+            return web.Response(body=dumps(data), content_type="application/json")
+
+        async def tickets(request: web.Request) -> web.Response:
+            page = int(request.query.get("_page", 1))
+            per_page = int(request.query.get("_perPage", 10))
+            start = (page - 1) * per_page
+            return respond([self.ticket(i) for i in range(start, min(start + per_page, self.tickets))])
+
+        async def messages(request: web.Request) -> web.Response:
+            ticket_id = request.match_info["ticket_id"]
+            if not ticket_id.startswith("t") or not ticket_id[1:].isdigit() or int(ticket_id[1:]) >= self.tickets:
+                return web.json_response({"message": "Ticket not found"}, status=404)
+            return respond(page_of(request, self.ticket_messages(int(ticket_id[1:]))))
+
+        async def agents(request: web.Request) -> web.Response:
+            records = [
+                {"id": agent_id, "name": f"Agent {n}", "email": f"agent{n}@example.com", "status": "A"}
+                for n, agent_id in enumerate(self.agent_ids)
+            ]
+            return respond(page_of(request, records))
+
+        async def tags(request: web.Request) -> web.Response:
+            return respond([{"id": "booking", "name": "Booking"}, {"id": "inquiry", "name": "Inquiry"}])
+
+        async def ping(request: web.Request) -> web.Response:
+            return respond({"message": "pong"})
+
+        async def stats(request: web.Request) -> web.Response:
+            return respond(self.stats)
+
+        @web.middleware
+        async def limits(request: web.Request, handler):
+            if request.path == "/_stats":
+                return await handler(request)
+
+            endpoint = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+            self.stats["requests"] += 1
+            self.stats["endpoints"][endpoint] = self.stats["endpoints"].get(endpoint, 0) + 1
+
+            retry_after = self.throttle(request.headers.get("apikey"))
+            if retry_after is not None:
+                self.stats["throttled"] += 1
+                return web.json_response(
+                    {"message": "Too many requests"}, status=429, headers={"Retry-After": f"{retry_after:.0f}"}
+                )
+
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+            return await handler(request)
+
+        app = web.Application(middlewares=[limits])
+        app.router.add_get("/tickets", tickets)
+        app.router.add_get("/tickets/{ticket_id}/messages", messages)
+        app.router.add_get("/agents", agents)
+        app.router.add_get("/tags", tags)
+        app.router.add_get("/ping", ping)
+        app.router.add_get("/_stats", stats)
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock LiveAgent API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--tickets", type=int, default=1000, help="Tickets in the ticket list (default: 1000)")
+    parser.add_argument("--messages", type=int, default=10, help="Average message groups per ticket (default: 10)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each response is delayed (default: 0.05)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Random extra delay in seconds, up to (default: 0.02)")
+    parser.add_argument("--rate_limit", type=int, default=180, help="Requests per minute per API key, 0 for none (default: 180)")
+    parser.add_argument("--fixtures", help="Directory of recorded pages to replay (default: generated pages)")
+    args = parser.parse_args()
+
+    mock = MockLiveAgent(args.tickets, args.messages, args.latency, args.jitter, args.rate_limit, args.fixtures)
+    web.run_app(mock.app(), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,15 @@
 import os
 import json
+import functools
+import threading
 from dotenv import load_dotenv
 
-from google.cloud import bigquery
-from google.oauth2 import service_account
-
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
 
 # API stuff
-base_url = "https://mechanigo.ladesk.com/api/v3"
+# Overridable to point runs at another account or a local mock (see `benchmarks/mock_liveagent.py`)
+base_url = os.getenv("LIVEAGENT_BASE_URL", "https://mechanigo.ladesk.com/api/v3")
 tickets_list_url = f"{base_url}/tickets"
 agents_list_url = f"{base_url}/agents"
 filters = json.dumps([
@@ -30,20 +30,138 @@ headers = {
     'apikey': API_KEY
 }
 
-CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
-config_path = os.path.join(CONFIG_DIR, 'config.json')
+# Rate limiting
+# The API rate limit is 180 requests per minute, counted for each API key separately.
+# Burst is how many requests may go out back-to-back; concurrency is how many may be in flight.
+RATE_LIMIT_PER_MINUTE = int(os.getenv("LIVEAGENT_RATE_LIMIT", 180))
+RATE_LIMIT_BURST = int(os.getenv("LIVEAGENT_RATE_BURST", 10))
+MAX_CONCURRENCY = int(os.getenv("LIVEAGENT_MAX_CONCURRENCY", 8))
+MESSAGE_WORKERS = int(os.getenv("LIVEAGENT_MESSAGE_WORKERS", MAX_CONCURRENCY))
+TICKET_PAGE_PREFETCH = int(os.getenv("LIVEAGENT_TICKET_PAGE_PREFETCH", 4))
+
+# Retries for 429 and transient 5xx responses (delays in seconds)
+MAX_RETRIES = int(os.getenv("LIVEAGENT_MAX_RETRIES", 6))
+RETRY_BASE_DELAY = float(os.getenv("LIVEAGENT_RETRY_BASE_DELAY", 0.5))
+RETRY_MAX_DELAY = float(os.getenv("LIVEAGENT_RETRY_MAX_DELAY", 60))
+
+# Incremental extraction state (see `utils/state_store.py`)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite") # "sqlite" or "bigquery"
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(".state", "watermarks.db"))
+INCREMENTAL_OVERLAP_MINUTES = int(os.getenv("INCREMENTAL_OVERLAP_MINUTES", 10))
+
+# Backfills of `main.py`: date chunks processed at once (they share the rate limit above)
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", 3))
+
+# Checkpoints of extraction runs, kept until the run succeeds (see `utils/run_journal.py`)
+RUN_JOURNAL_DIR = os.getenv("RUN_JOURNAL_DIR", os.path.join(".state", "runs"))
+RUN_JOURNAL_MAX_AGE_DAYS = float(os.getenv("RUN_JOURNAL_MAX_AGE_DAYS", 7))
+
+# Background jobs of the API (see `core/jobs.py`)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(".state", "jobs.db"))
+MAX_BACKGROUND_JOBS = int(os.getenv("MAX_BACKGROUND_JOBS", 2))
+JOB_ROWS_DIR = os.getenv("JOB_ROWS_DIR", os.path.join(".state", "job_rows"))
+JOB_ROWS_MAX_AGE_HOURS = float(os.getenv("JOB_ROWS_MAX_AGE_HOURS", 24))
+
+# On-disk cache of ticket messages (see `utils/message_cache.py`)
+MESSAGE_CACHE_ENABLED = os.getenv("MESSAGE_CACHE_ENABLED", "false").lower() == "true"
+MESSAGE_CACHE_PATH = os.getenv("MESSAGE_CACHE_PATH", os.path.join(".cache", "messages.db"))
+MESSAGE_CACHE_MAX_AGE_DAYS = float(os.getenv("MESSAGE_CACHE_MAX_AGE_DAYS", 30))
+MESSAGE_CACHE_MAX_BYTES = int(os.getenv("MESSAGE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# Agents and tags, cached in memory and on disk (see `core/reference_data.py`)
+REFERENCE_CACHE_DIR = os.getenv("REFERENCE_CACHE_DIR", os.path.join(".cache", "reference"))
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", 3600)) # seconds
+REFERENCE_MISS_REFRESH_INTERVAL = float(os.getenv("REFERENCE_MISS_REFRESH_INTERVAL", 300)) # seconds between refreshes on unknown agents
+REFERENCE_PER_PAGE = int(os.getenv("LIVEAGENT_REFERENCE_PER_PAGE", 1000)) # the largest `_perPage` the API accepts
+REFERENCE_MAX_PAGES = int(os.getenv("LIVEAGENT_REFERENCE_MAX_PAGES", 100))
+
+# JSON library decoding API responses: "auto" (fastest installed), "msgspec", "orjson" or "json" (see `core/decoders.py`)
+JSON_DECODER = os.getenv("JSON_DECODER", "auto")
+
+# HTTP client (timeouts in seconds)
+HTTP_COMPRESSION = os.getenv("LIVEAGENT_HTTP_COMPRESSION", "true").lower() == "true"
+DNS_CACHE_TTL = int(os.getenv("LIVEAGENT_DNS_CACHE_TTL", 300))
+KEEPALIVE_TIMEOUT = float(os.getenv("LIVEAGENT_KEEPALIVE_TIMEOUT", 60))
+REQUEST_TIMEOUT = float(os.getenv("LIVEAGENT_REQUEST_TIMEOUT", 60))
+
+# Streaming BigQuery loads (see `utils/bq_sink.py`)
+MESSAGE_BATCH_ROWS = int(os.getenv("MESSAGE_BATCH_ROWS", 5000))
+BQ_SINK_MAX_ROWS = int(os.getenv("BQ_SINK_MAX_ROWS", 50000))
+BQ_SINK_MAX_BYTES = int(os.getenv("BQ_SINK_MAX_BYTES", 64 * 1024 ** 2))
 
-creds = json.loads(os.getenv('CREDENTIALS'))
+# Compression of the Parquet files written locally ("zstd", "snappy", "gzip" or "none")
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
 
-with open(config_path, 'r') as file:
-    json_config = json.load(file)
+# Seconds dataset/table metadata is cached between loads (see `utils/bq_utils.py`)
+BQ_METADATA_TTL = float(os.getenv("BQ_METADATA_TTL", 3600))
+# Non-null values sampled per column when inferring a BigQuery schema (see `utils/bq_utils.py`)
+SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", 1000))
+# Days partitions of the tickets/messages tables are kept (see `core/table_specs.py`); unset keeps them forever
+PARTITION_EXPIRATION_DAYS = float(os.getenv("PARTITION_EXPIRATION_DAYS")) if os.getenv("PARTITION_EXPIRATION_DAYS") else None
+
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+config_path = os.path.join(CONFIG_DIR, 'config.json')
 
 SCOPE = [
     'https://www.googleapis.com/auth/bigquery'
 ]
 
-google_creds = service_account.Credentials.from_service_account_info(creds, scopes=SCOPE)
-BQ_CLIENT = bigquery.Client(credentials=google_creds, project=google_creds.project_id)
+# The settings below are built on first use, not at import time, so LiveAgent-only runs (`--skip_bq`) never
+# parse the credentials or import the Google Cloud SDK, and API workers start serving sooner.
+# Loads run in worker threads, so the credentials and client are built under a lock: threads reaching their first
+# load together share one client instead of each building their own.
+_settings_lock = threading.RLock()
+
+def _locked_cache(func):
+    """
+    `functools.cache` for a setting without arguments that is built only once, even when first read from several
+    threads at the same time.
+    """
+    cached = functools.cache(func)
+
+    @functools.wraps(func)
+    def wrapper():
+        with _settings_lock:
+            return cached()
+
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+@functools.cache
+def get_json_config() -> dict:
+    with open(config_path, 'r') as file:
+        return json.load(file)
+
+@functools.cache
+def get_creds() -> dict:
+    return json.loads(os.getenv('CREDENTIALS'))
+
+@_locked_cache
+def get_google_creds():
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_info(get_creds(), scopes=SCOPE)
+
+@_locked_cache
+def get_bq_client():
+    from google.cloud import bigquery
+    google_creds = get_google_creds()
+    return bigquery.Client(credentials=google_creds, project=google_creds.project_id)
+
+_LAZY_SETTINGS = {
+    "json_config": get_json_config,
+    "creds": get_creds,
+    "google_creds": get_google_creds,
+    "BQ_CLIENT": get_bq_client,
+    "GCLOUD_PROJECT_ID": lambda: get_json_config().get('BIGQUERY')['project_id'],
+    "BQ_DATASET_NAME": lambda: get_json_config().get('BIGQUERY')['dataset_name'],
+}
 
-GCLOUD_PROJECT_ID = json_config.get('BIGQUERY')['project_id']
-BQ_DATASET_NAME = json_config.get('BIGQUERY')['dataset_name']
\ No newline at end of file
+def __getattr__(name: str):
+    """
+    Builds a lazy setting (`config.BQ_CLIENT`, `config.creds`, ...) the first time it is read.
+    """
+    if name not in _LAZY_SETTINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = _LAZY_SETTINGS[name]()
+    globals()[name] = value
+    return value
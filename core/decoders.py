@@ -0,0 +1,150 @@
+import json
+from typing import Any, Union
+from config import config
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON libraries in order of preference; `json` (the standard library) is always available
+BACKENDS = ["msgspec", "orjson", "json"]
+
+def available_backends() -> list:
+    """
+    Returns:
+        list:
+            - the names of the installed JSON libraries, fastest first
+    """
+    modules = {"msgspec": msgspec, "orjson": orjson}
+    return [name for name in BACKENDS if modules.get(name, json) is not None]
+
+def resolve_backend(name: str = None) -> str:
+    """
+    Picks the JSON library to decode with. `"auto"` (or a library that is not installed) falls back to the fastest
+    installed one.
+
+    Parameters:
+        - name (`str`) - `"msgspec"`, `"orjson"`, `"json"` or `"auto"`; default is `config.JSON_DECODER`
+
+    Returns:
+        str:
+            - the name of the library
+    """
+    name = (name or config.JSON_DECODER).lower()
+    available = available_backends()
+    if name in available:
+        return name
+    if name != "auto":
+        print(f"JSON decoder {name} is not installed, using {available[0]}")
+    return available[0]
+
+class PageDecoder:
+    """
+    Decodes the bytes of an API response. With `fields`, each record of a page (a list of objects, or the list
+    under `"data"`) keeps only those keys, and the records of the list fields in `nested` only theirs, so the
+    fields nothing downstream reads are not kept in memory, cached or passed on.
+
+    With `msgspec` the projection happens while parsing: unused fields are skipped without building Python objects
+    for them. Pages of another shape (e.g. a `{"data": [...]}` envelope) are decoded in full and projected after.
+    With `orjson` or `json` the page is decoded in full and projected after.
+
+    Usage:
+        ```
+        decoder = PageDecoder(["id", "messages"], {"messages": ["id", "message"]})
+        data = await request_json(session, url, decoder=decoder)
+        ```
+
+    Parameters:
+        - fields (`list[str]`) - the keys kept of each record; default keeps every key
+        - nested (`dict`) - the keys kept of the records of a list field, by field, e.g. `{"messages": ["id"]}`
+        - backend (`str`) - the JSON library, see `resolve_backend()`; default is `config.JSON_DECODER`
+    """
+    def __init__(self, fields: list = None, nested: dict = None, backend: str = None):
+        self.fields = list(fields) if fields else None
+        self.nested = {key: list(keys) for key, keys in (nested or {}).items()}
+        self.backend = resolve_backend(backend)
+
+        self._typed = None
+        if self.backend == "msgspec":
+            self._generic = msgspec.json.Decoder()
+            if self.fields:
+                self._typed = msgspec.json.Decoder(list[self._record_type()])
+
+    def _record_type(self):
+        def struct(name: str, keys: list, types: dict):
+            # UNSET fields are left out by `to_builtins()`, so a missing key stays missing
+            return msgspec.defstruct(name, [(key, types.get(key, Any), msgspec.UNSET) for key in keys])
+
+        types = {
+            key: Union[list[struct(f"{key.title()}Record", keys, {})], None]
+            for key, keys in self.nested.items()
+            if key in self.fields
+        }
+        return struct("Record", self.fields, types)
+
+    def _loads(self, body: bytes):
+        if self.backend == "msgspec":
+            try:
+                return self._generic.decode(body)
+            except msgspec.DecodeError as e:
+                raise ValueError(f"Invalid JSON response: {e}") from e
+        if self.backend == "orjson":
+            return orjson.loads(body)
+        return json.loads(body)
+
+    def _project_record(self, record):
+        if not isinstance(record, dict):
+            return record
+        row = {key: record[key] for key in self.fields if key in record}
+        for key, keys in self.nested.items():
+            if isinstance(row.get(key), list):
+                row[key] = [
+                    {k: item[k] for k in keys if k in item} if isinstance(item, dict) else item
+                    for item in row[key]
+                ]
+        return row
+
+    def project(self, data):
+        """
+        Projects a decoded page, see the class docs. Anything that is not a page is returned as is.
+        """
+        if not self.fields:
+            return data
+        if isinstance(data, list):
+            return [self._project_record(record) for record in data]
+        if isinstance(data, dict) and isinstance(data.get("data"), list):
+            return {**data, "data": [self._project_record(record) for record in data["data"]]}
+        return data
+
+    def __call__(self, body: bytes):
+        """
+        Parameters:
+            - body (`bytes`) - the response body
+
+        Returns:
+            The decoded (and projected) JSON, or `None` for an empty body.
+
+        Raises:
+            - `ValueError` - if the body is not valid JSON
+        """
+        if not body or not body.strip():
+            return None
+
+        if self._typed is not None:
+            try:
+                return msgspec.to_builtins(self._typed.decode(body))
+            except msgspec.ValidationError:
+                pass # not a list of records, decoded in full below
+            except msgspec.DecodeError as e:
+                raise ValueError(f"Invalid JSON response: {e}") from e
+
+        return self.project(self._loads(body))
+
+# Decodes whole responses, for endpoints without a projection
+decode = PageDecoder()
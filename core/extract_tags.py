@@ -2,28 +2,38 @@ import aiohttp
 import requests
 import pandas as pd
 from config import config
-from utils.bq_utils import generate_schema, load_data_to_bq
-from core.liveagent_client import async_ping, fetch_tags
+from utils.bq_utils import resolve_schema, load_data_to_bq
+from core.liveagent_client import async_ping
+from core.reference_data import get_tags
+from core.session import session_scope
+from utils.rows_file import RowsWriter
 
-async def extract_and_load_tags(table_name: str):
+async def extract_and_load_tags(table_name: str, session: aiohttp.ClientSession = None, rows_path: str = None):
     """
-    Calls `fetch_tags()` from `core.liveagent_client` and then loads
-    the data into BigQuery.
+    Fetches the tags from the API (refreshing the cache of
+    `core.reference_data.get_tags()`) and then loads the data
+    into BigQuery. Uses the given `session` if one is passed,
+    otherwise opens its own. The tags are also written to `rows_path`
+    as Parquet if one is given.
+
+    Returns:
+        dict:
+            - a summary of the load, with the number of `rows`
     """
-    async with aiohttp.ClientSession() as session:
+    async with session_scope(session) as session:
         success, ping_response = await async_ping(session)
         if not success:
             print(f"Ping failed: {ping_response}")
-            exit(1)
+            raise ConnectionError(f"Ping failed: {ping_response}")
 
         print(f"Ping to {config.base_url} successful.")
 
         try:
-            tags = await fetch_tags(session)
+            tags = await get_tags(session, refresh=True)
             print("Generating schema...")
-            schema = generate_schema(tags)
+            schema = resolve_schema(tags, config.GCLOUD_PROJECT_ID, config.BQ_DATASET_NAME, table_name)
             print("Loading data into BigQuery...")
-            load_data_to_bq(
+            result = load_data_to_bq(
                 tags,
                 config.GCLOUD_PROJECT_ID,
                 config.BQ_DATASET_NAME,
@@ -31,7 +41,13 @@ async def extract_and_load_tags(table_name: str):
                 "WRITE_TRUNCATE",
                 schema
             )
-            return tags.to_dict(orient="records") # make object JSON serializable
+            if not result.startswith("Loaded"):
+                raise RuntimeError(result)
+
+            if rows_path:
+                with RowsWriter(rows_path) as rows:
+                    rows.write(tags)
+            return {"table": table_name, "rows": len(tags), "result": result}
         except Exception as e:
-            print("Error during fetch_tags():", str(e))
+            print("Error during get_tags():", str(e))
             raise
\ No newline at end of file
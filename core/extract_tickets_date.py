@@ -1,11 +1,24 @@
 import pytz
 import json
+import asyncio
 import aiohttp
 import pandas as pd
 from tqdm import tqdm
 from config import config
-from utils.bq_utils import generate_schema, load_data_to_bq
-from core.liveagent_client import async_agents, async_tickets_filtered, fetch_all_messages, async_ping, async_tickets
+from utils.bq_utils import resolve_schema, load_data_to_bq, merge_data_to_bq
+from utils.bq_sink import BigQuerySink
+from utils.date_utils import normalize_datetimes
+from core.liveagent_client import stream_tickets, stream_message_frames, async_ping, async_tickets, ticket_rows
+from core.session import session_scope
+from core.message_columns import MESSAGE_KEYS
+from core.table_specs import MESSAGES_TABLE, TICKETS_TABLE, TICKET_KEYS
+from core.extraction_spec import ExtractionSpec
+from core.reference_data import get_agent_lookup
+from core.incremental import IncrementalRun
+from utils.state_store import get_watermark_store
+from utils.message_cache import get_message_cache
+from utils.rows_file import RowsWriter
+from utils.run_journal import RunJournal
 
 def set_filter(date: pd.Timestamp):
     """
@@ -27,26 +40,6 @@ def set_filter(date: pd.Timestamp):
         ["date_created", "D<=", f"{end}"]
     ])
 
-def set_timezone(df: pd.DataFrame, *columns: str, target_tz: str) -> pd.DataFrame:
-    """
-    Sets the time zone of a selected DataFrame columns to target time zone.
-
-    Parameters:
-        - df (`pd.DataFrame`) - the DataFrame
-        - *columns (`str`) - the column/(s) you want to change the time zone
-        - target_tz (`str`) - the time zone you want to set
-
-    Returns:
-        pd.DataFrame:
-            - A pandas DataFrame.
-    """
-    for column in columns:
-        df[column] = pd.to_datetime(df[column], errors="coerce").dt.tz_localize('UTC')
-        df[column] = df[column].apply(
-            lambda x: x.astimezone(target_tz).replace(tzinfo=None) if pd.notnull(x) else x
-        )
-    return df
-
 def format_date_col(df: pd.DataFrame, column: str, format: str = "%Y-%m-%d") -> pd.DataFrame:
     """
     Formats the selected date column to JSON serializable.
@@ -63,13 +56,13 @@ def format_date_col(df: pd.DataFrame, column: str, format: str = "%Y-%m-%d") ->
     df[column] = df[column].dt.strftime(format)
     return df
 
-def drop_cols(df: pd.DataFrame) -> pd.DataFrame:
+def drop_cols(df: pd.DataFrame, keep: list = None) -> pd.DataFrame:
     try:
         cols_to_drop = ['message_id', 'type', 'agentid']
-        existing = [col for col in cols_to_drop if col in df.columns]
+        existing = [col for col in cols_to_drop if col in df.columns and col not in (keep or [])]
 
         if existing:
-            df.drop(columns=existing, axis=1, inplace=True)
+            df.drop(columns=existing, inplace=True)
         else:
             pass
     except Exception as e:
@@ -77,22 +70,29 @@ def drop_cols(df: pd.DataFrame) -> pd.DataFrame:
         print(f"Exception: {e}")
     return df
 
-async def extract_tickets(date: pd.Timestamp, table_name: str):
-    config.ticket_payload["_page"] = 100
-    config.ticket_payload["_filters"] = set_filter(date)
+async def extract_tickets(date: pd.Timestamp, table_name: str, session: aiohttp.ClientSession = None, incremental: bool = False, progress=None, rows_path: str = None):
+    spec = ExtractionSpec(filters=set_filter(date), max_pages=100, per_page=100, message_per_page=100)
 
-    async with aiohttp.ClientSession() as session:
+    # incremental runs only fetch tickets changed since the last run and upsert them on `TICKET_KEYS`
+    run = IncrementalRun(get_watermark_store(), table_name) if incremental else None
+    if run:
+        spec = spec.replace(filters=run.filters(spec.filters))
+
+    async with session_scope(session) as session:
         success, ping_response = await async_ping(session)
         if not success:
             print(f"Ping failed: {ping_response}")
-            exit(1)
+            raise ConnectionError(f"Ping failed: {ping_response}")
 
         print(f"Ping to {config.base_url} successful.")
 
         try:
-            tickets_data = await async_tickets(session, max_pages=config.ticket_payload["_page"])
-            print(config.ticket_payload["_filters"])
-            print(config.ticket_payload["_page"])
+            if run:
+                tickets = [ticket async for ticket in run.changed_tickets(session, spec.ticket_payload(), spec.max_pages)]
+            else:
+                tickets = list(ticket_rows(await async_tickets(session, max_pages=spec.max_pages, spec=spec)))
+            print(spec.filters)
+            print(spec.max_pages)
             ticket_ids = {
                 "ticket_id": [],
                 "code": [],
@@ -101,15 +101,24 @@ async def extract_tickets(date: pd.Timestamp, table_name: str):
                 "tags": []
             }
 
-            for i in tqdm(range(len(tickets_data["id"])), desc="Processing ticket IDs"):
-                ticket_ids["ticket_id"].append(tickets_data["id"][i])
-                ticket_ids["code"].append(tickets_data["code"][i])
-                ticket_ids["owner_name"].append(tickets_data["owner_name"][i])
-                ticket_ids["date_created"].append(tickets_data["ticket_date_created"][i])
-                ticket_ids["tags"].append(','.join(tickets_data["tags"][i]))
+            for ticket in tqdm(tickets, desc="Processing ticket IDs"):
+                ticket_ids["ticket_id"].append(ticket["id"])
+                ticket_ids["code"].append(ticket["code"])
+                ticket_ids["owner_name"].append(ticket["owner_name"])
+                ticket_ids["date_created"].append(ticket["ticket_date_created"])
+                ticket_ids["tags"].append(','.join(ticket["tags"]))
+
+            if progress:
+                progress(tickets=len(tickets))
+
+            if not tickets:
+                print("No new tickets to load.")
+                if run:
+                    run.commit()
+                return {"table": table_name, "rows": 0}
 
             tickets_df = pd.DataFrame(ticket_ids)
-            tickets_df = set_timezone(tickets_df, "date_created", target_tz=pytz.timezone('Asia/Manila'))
+            tickets_df = normalize_datetimes(tickets_df, "date_created", target_tz=pytz.timezone('Asia/Manila'))
             tickets_df = drop_cols(tickets_df)
 
             print(tickets_df.head())
@@ -117,69 +126,132 @@ async def extract_tickets(date: pd.Timestamp, table_name: str):
 
             # load to BQ
             print("Generating schema...")
-            schema = generate_schema(tickets_df)
+            schema = resolve_schema(tickets_df, config.GCLOUD_PROJECT_ID, config.BQ_DATASET_NAME, table_name)
             print("Loading data into BigQuery...")
-            load_data_to_bq(
-                tickets_df,
-                config.GCLOUD_PROJECT_ID,
-                config.BQ_DATASET_NAME,
-                table_name,
-                "WRITE_TRUNCATE",
-                schema
-            )
+            if run:
+                # changed tickets are already in the table, so they are updated instead of appended again
+                result = merge_data_to_bq(
+                    tickets_df,
+                    config.GCLOUD_PROJECT_ID,
+                    config.BQ_DATASET_NAME,
+                    table_name,
+                    TICKET_KEYS,
+                    TICKETS_TABLE,
+                    schema
+                )
+            else:
+                result = load_data_to_bq(
+                    tickets_df,
+                    config.GCLOUD_PROJECT_ID,
+                    config.BQ_DATASET_NAME,
+                    table_name,
+                    "WRITE_TRUNCATE",
+                    schema,
+                    TICKETS_TABLE
+                )
+            if result.startswith("Failed"):
+                raise RuntimeError(result)
+            if run:
+                run.commit()
 
-            # process datetime kasi maarte si JSON
-            tickets_df = format_date_col(tickets_df, "date_created")
-            return tickets_df.to_dict(orient="records")
+            if rows_path:
+                with RowsWriter(rows_path) as rows:
+                    rows.write(tickets_df)
+            return {"table": table_name, "rows": len(tickets_df), "result": result}
         except Exception as e:
             print(f"Exception occurred in extract_tickets: {e}")
+            raise
 
-async def extract_ticket_messages(table_name: str):
-    config.ticket_payload["_page"] = 100
-    config.ticket_payload["_perPage"] = 100
-    config.messages_payload["_perPage"] = 100
-
+async def extract_ticket_messages(table_name: str, session: aiohttp.ClientSession = None, incremental: bool = False, progress=None, rows_path: str = None, journal: RunJournal = None):
     today_date = pd.Timestamp.now().tz_localize('Asia/Manila')
     print(f"NOW: {today_date}")
     date = today_date - pd.Timedelta(hours=6)
-    async with aiohttp.ClientSession() as session:
+    # fetched messages are checkpointed per batch, so a failed job can be resumed with its run ID
+    journal = journal or RunJournal()
+    async with session_scope(session) as session:
         success, ping_response = await async_ping(session)
         if not success:
             print(f"Ping failed: {ping_response}")
-            exit(1)
+            raise ConnectionError(f"Ping failed: {ping_response}")
 
         print(f"Ping to {config.base_url} successful.")
         try:
-            agents = await async_agents(session)
-            agents_lookup = dict(zip(agents["id"], agents["name"]))
+            agents_lookup = await get_agent_lookup(session)
 
-            config.ticket_payload["_filters"] = set_filter(date)
-            print(config.ticket_payload["_filters"])
-            print("Extracting messages, this may take a while...")
-            tickets = await async_tickets_filtered(session, config.ticket_payload, config.ticket_payload["_page"])
+            # the run's own parameters, so concurrent jobs in one worker never share filters
+            spec = ExtractionSpec(filters=set_filter(date), max_pages=100, per_page=100, message_per_page=100)
 
-            messages_df = await fetch_all_messages(tickets, agents_lookup, 100)
-            messages_df = drop_cols(messages_df)
-            messages_df = set_timezone(messages_df, "datecreated", "ticket_date_created", target_tz=pytz.timezone('Asia/Manila'))
+            # incremental runs only fetch new or changed tickets, and only their messages after the stored mark
+            run = IncrementalRun(get_watermark_store(), table_name) if incremental else None
+            if run:
+                spec = spec.replace(filters=run.filters(spec.filters))
+                tickets = run.changed_tickets(session, spec.ticket_payload(), spec.max_pages)
+            else:
+                # tickets are streamed straight into the message workers while the ticket list is still paginating
+                tickets = stream_tickets(session, spec.ticket_payload(), spec.max_pages)
 
-            print(messages_df.head())
-            print(messages_df["datecreated"])
+            print(spec.filters)
+            print(f"Extracting messages (run {journal.run_id}), this may take a while...")
+            cache = get_message_cache()
+            tickets_done = 0
+            try:
+                async for messages_df in stream_message_frames(session, journal.pending(table_name, tickets), agents_lookup, spec.max_pages, cache=cache, spec=spec):
+                    await asyncio.to_thread(journal.add_frame, table_name, messages_df)
+                    tickets_done += len(messages_df.attrs["ticket_ids"])
+                    if progress:
+                        progress(tickets=tickets_done, rows=journal.rows(table_name), loaded=0)
+            finally:
+                if cache:
+                    cache.close()
 
-            print("Generating schema...")
-            schema = generate_schema(messages_df)
-            print("Loading data into BigQuery...")
-            load_data_to_bq(
-                messages_df,
+            rows_done = journal.rows(table_name)
+            if not rows_done:
+                print("No new messages to load.")
+                if run:
+                    run.commit()
+                journal.remove()
+                return {"table": table_name, "tickets": tickets_done, "rows": 0}
+
+            # messages are upserted on (ticket_id, message_id), so overlapping windows and retries never duplicate rows
+            sink = BigQuerySink(
                 config.GCLOUD_PROJECT_ID,
                 config.BQ_DATASET_NAME,
                 table_name,
-                "WRITE_TRUNCATE",
-                schema
+                "MERGE",
+                merge_keys=MESSAGE_KEYS,
+                spec=MESSAGES_TABLE
             )
 
-            # process datetime kasi maarte si JSON
-            messages_df = format_date_col(messages_df, "datecreated")
-            messages_df = format_date_col(messages_df, "ticket_date_created")
-            return messages_df.to_dict(orient="records")
+            def load() -> list:
+                # everything is loaded from the journal, including the batches of the run being resumed
+                marks = []
+                rows = RowsWriter(rows_path) if rows_path else None
+                try:
+                    with sink:
+                        for messages_df in journal.frames(table_name):
+                            if run:
+                                marks.append(messages_df[["ticket_id", "datecreated", "message_id"]].copy())
+                            messages_df = drop_cols(messages_df, keep=MESSAGE_KEYS)
+                            messages_df = normalize_datetimes(messages_df, "datecreated", "ticket_date_created", target_tz=pytz.timezone('Asia/Manila'))
+                            sink.write(messages_df)
+                            if rows:
+                                rows.write(messages_df)
+                            if progress:
+                                progress(tickets=tickets_done, rows=rows_done, loaded=sink.loaded_rows)
+                finally:
+                    if rows:
+                        rows.close()
+                return marks
+
+            marks = await asyncio.to_thread(load)
+            result = sink.close()
+            print(result)
+
+            if run:
+                run.commit(pd.concat(marks, ignore_index=True) if marks else None)
+            journal.remove()
+            return {"table": table_name, "run_id": journal.run_id, "tickets": tickets_done, "rows": rows_done, "result": result}
         except Exception as e:
-            print(f"Exception occured: {str(e)}")
\ No newline at end of file
+            print(f"Exception occured: {str(e)}")
+            print(f"Fetched messages are kept in run {journal.run_id}; resume with resume={journal.run_id}")
+            raise
@@ -0,0 +1,50 @@
+import dataclasses
+from dataclasses import dataclass
+from config import config
+
+@dataclass(frozen=True)
+class ExtractionSpec:
+    """
+    The parameters of one extraction run: which tickets to list and how to page through the LiveAgent API. A spec
+    is immutable and passed explicitly down to `core.liveagent_client`, so concurrent runs in one worker (e.g. two
+    API jobs) never see each other's filters, unlike the shared `config.ticket_payload`/`config.messages_payload`
+    dicts, which now only provide the defaults.
+
+    Usage:
+        ```
+        spec = ExtractionSpec(filters=set_filter(date), max_pages=100, per_page=100, message_per_page=100)
+        tickets = stream_tickets(session, spec.ticket_payload(), spec.max_pages)
+        ```
+
+    Parameters:
+        - filters (`str`) - the `_filters` JSON string of the ticket list; default is `config.filters`
+        - max_pages (`int`) - maximum number of pages to retrieve per listing; default is 5
+        - per_page (`int`) - `_perPage` of the ticket list; default is `config.ticket_payload["_perPage"]`
+        - message_per_page (`int`) - `_perPage` of the message pages; default is `config.messages_payload["_perPage"]`
+    """
+    filters: str = config.filters
+    max_pages: int = 5
+    per_page: int = config.ticket_payload["_perPage"]
+    message_per_page: int = config.messages_payload["_perPage"]
+
+    def ticket_payload(self) -> dict:
+        """
+        Returns:
+            dict:
+                - a new request payload for `/tickets`
+        """
+        return {"_page": 1, "_perPage": self.per_page, "_filters": self.filters}
+
+    def messages_payload(self) -> dict:
+        """
+        Returns:
+            dict:
+                - a new request payload for `/tickets/{ticket_id}/messages`
+        """
+        return {"_page": 1, "_perPage": self.message_per_page}
+
+    def replace(self, **changes) -> "ExtractionSpec":
+        """
+        Returns a copy of the spec with some fields changed, e.g. `spec.replace(filters=...)`.
+        """
+        return dataclasses.replace(self, **changes)
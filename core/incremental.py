@@ -0,0 +1,131 @@
+import json
+import aiohttp
+import pandas as pd
+from config import config
+from core.liveagent_client import async_iter_pages, project_ticket, TICKET_DECODER
+from utils.state_store import WatermarkStore
+
+class IncrementalRun:
+    """
+    One incremental extraction into a table. Instead of a fixed date window, tickets are listed by `date_changed`
+    from the stored watermark (minus `config.INCREMENTAL_OVERLAP_MINUTES` for late arrivals), tickets whose
+    `date_changed` did not move since the last run are skipped, and the remaining tickets only fetch messages
+    from their last processed message on.
+
+    The list is sorted by `date_changed`, oldest first, so when it is cut off at `max_pages` (e.g. after an
+    outage) the watermark only moves up to the last ticket listed and the rest are fetched by the next run. If
+    the list came back cut off and out of order, the watermark is left where it was.
+
+    Marks are only written by `commit()`, so a run that fails before loading is simply repeated next time.
+
+    Usage:
+        ```
+        run = IncrementalRun(get_watermark_store(), table_name)
+        spec = spec.replace(filters=run.filters(spec.filters))
+        tickets = run.changed_tickets(session, spec.ticket_payload(), spec.max_pages)
+        ... fetch messages, load them ...
+        run.commit(messages_df)
+        ```
+
+    Parameters:
+        - store (`WatermarkStore`) - where the marks are kept
+        - namespace (`str`) - the target table name, so each table keeps its own marks
+    """
+    def __init__(self, store: WatermarkStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+        self.watermark = store.get_watermark(namespace, "date_changed")
+        self.seen = {}
+        self.skipped = 0
+        # the latest `date_changed` listed, whether the list came back in order, and whether it was listed to the end
+        self.listed_until = None
+        self.ordered = True
+        self.complete = False
+
+    def filters(self, fallback: str) -> str:
+        """
+        Returns the `_filters` for the ticket list: tickets changed since the watermark, or `fallback` on the
+        first run of a table.
+
+        Parameters:
+            - fallback (`str`) - the `_filters` JSON string used when there is no watermark yet
+        """
+        if not self.watermark:
+            return fallback
+
+        start = pd.Timestamp(self.watermark) - pd.Timedelta(minutes=config.INCREMENTAL_OVERLAP_MINUTES)
+        return json.dumps([
+            ["date_changed", "D>=", start.strftime("%Y-%m-%d %H:%M:%S")]
+        ])
+
+    async def changed_tickets(self, session: aiohttp.ClientSession, payload: dict, max_pages: int):
+        """
+        Streams the new or changed tickets of the ticket list, oldest change first. Each ticket is keyed like the
+        columns of `fetch_tickets()`, plus the `since`/`since_id` of its last processed message, so it can be passed
+        straight to `stream_all_messages()`.
+
+        Parameters:
+            - session (`aiohttp.ClientSession`) - the client session
+            - payload (`dict`) - the ticket list parameters, with `_filters` from `filters()`
+            - max_pages (`int`) - maximum number of pages to retrieve
+        """
+        payload = {**payload, "_sortField": "date_changed", "_sortDir": "ASC"}
+        per_page = int(payload.get("_perPage") or 0)
+        pages = 0
+        last_page = []
+
+        async for page in async_iter_pages(
+            session, config.tickets_list_url, payload, max_pages, config.headers, config.TICKET_PAGE_PREFETCH,
+            decoder=TICKET_DECODER
+        ):
+            pages += 1
+            last_page = page
+            tickets = [project_ticket(ticket) for ticket in page]
+            marks = self.store.get_ticket_marks(self.namespace, [ticket["id"] for ticket in tickets])
+
+            for ticket in tickets:
+                date_changed = ticket.get("date_changed")
+                if date_changed:
+                    if self.listed_until and date_changed < self.listed_until:
+                        self.ordered = False
+                    self.listed_until = max(date_changed, self.listed_until or "")
+
+                mark = marks.get(ticket["id"], {})
+                if mark.get("date_changed") and mark["date_changed"] == ticket.get("date_changed"):
+                    self.skipped += 1
+                    continue
+
+                self.seen[ticket["id"]] = ticket.get("date_changed")
+                ticket["since"] = mark.get("last_message_date")
+                ticket["since_id"] = mark.get("last_message_id")
+                yield ticket
+
+        # a full last page at `max_pages` means the list was cut off
+        self.complete = pages < max_pages or not per_page or len(last_page) < per_page
+
+    def commit(self, messages: pd.DataFrame = None):
+        """
+        Stores the marks of this run. Call only after the data has been loaded.
+
+        Parameters:
+            - messages (`pd.DataFrame`) - the fetched messages with the raw `ticket_id`, `datecreated` and
+            `message_id` columns (before `normalize_datetimes()`/`drop_cols()`); default is `None` for ticket-only runs
+        """
+        marks = {ticket_id: {"date_changed": date_changed} for ticket_id, date_changed in self.seen.items()}
+
+        if messages is not None and not messages.empty:
+            latest = messages.sort_values("datecreated", kind="stable").groupby("ticket_id").tail(1)
+            for ticket_id, datecreated, message_id in latest[["ticket_id", "datecreated", "message_id"]].itertuples(index=False):
+                marks.setdefault(ticket_id, {}).update(last_message_date=datecreated, last_message_id=message_id)
+
+        self.store.set_ticket_marks(self.namespace, marks)
+
+        if not self.complete and not self.ordered:
+            print(
+                f"Incremental run for {self.namespace}: the ticket list was cut off and not sorted by date_changed, "
+                f"keeping the watermark at {self.watermark}"
+            )
+        elif self.listed_until and self.listed_until > (self.watermark or ""):
+            self.store.set_watermark(self.namespace, "date_changed", self.listed_until)
+
+        print(f"Incremental run for {self.namespace}: {len(self.seen)} new or changed tickets, {self.skipped} unchanged skipped")
@@ -0,0 +1,242 @@
+import os
+import json
+import uuid
+import socket
+import asyncio
+import time
+import sqlite3
+from datetime import datetime, timezone
+from config import config
+
+JOB_FIELDS = [
+    "id", "kind", "table_name", "params", "status", "progress", "rows", "result", "error", "worker",
+    "created_at", "started_at", "finished_at"
+]
+# Fields stored as JSON text
+JSON_FIELDS = ("params", "progress", "result")
+# A job is finished once it reaches one of these
+FINISHED_STATUSES = ("succeeded", "failed", "interrupted")
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobStore:
+    """
+    Persistent record of ingestion jobs in a local SQLite file, so any API worker of the same instance can report
+    on a job, and jobs outlive the request that started them.
+
+    Parameters:
+        - path (`str`) - the database file; default is `config.JOBS_DB_PATH`
+    """
+    def __init__(self, path: str = None):
+        self.path = path or config.JOBS_DB_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT, table_name TEXT, params TEXT, status TEXT, progress TEXT, "
+                "rows INTEGER, result TEXT, error TEXT, worker TEXT, created_at TEXT, started_at TEXT, finished_at TEXT)"
+            )
+            # job files created before results were recorded
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "result" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN result TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, kind: str, table_name: str, params: dict) -> dict:
+        """
+        Records a new queued job.
+
+        Returns:
+            dict:
+                - the job, keyed like `JOB_FIELDS`
+        """
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "table_name": table_name,
+            "params": params,
+            "status": "queued",
+            "progress": {},
+            "rows": None,
+            "result": None,
+            "error": None,
+            "worker": f"{socket.gethostname()}:{os.getpid()}",
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' * len(JOB_FIELDS))})",
+                [json.dumps(job[field]) if field in JSON_FIELDS else job[field] for field in JOB_FIELDS]
+            )
+        return job
+
+    def update(self, job_id: str, **fields):
+        """
+        Updates fields of a job, e.g. `status="running"` or `progress={"rows": 100}`.
+        """
+        for field in JSON_FIELDS:
+            if field in fields:
+                fields[field] = json.dumps(fields[field], default=str)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                [*fields.values(), job_id]
+            )
+
+    def get(self, job_id: str) -> dict:
+        """
+        Returns:
+            dict:
+                - the job, keyed like `JOB_FIELDS`, or `None` if there is no such job
+        """
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(zip(JOB_FIELDS, row))
+        for field in JSON_FIELDS:
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def interrupt_orphans(self) -> int:
+        """
+        Marks the unfinished jobs of dead worker processes on this host as `interrupted`, e.g. after a crash or
+        a worker restart.
+
+        Returns:
+            int:
+                - the number of jobs marked
+        """
+        host = socket.gethostname()
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, worker FROM jobs WHERE status NOT IN ({', '.join('?' * len(FINISHED_STATUSES))})",
+                FINISHED_STATUSES
+            ).fetchall()
+            orphans = [
+                job_id for job_id, worker in rows
+                if worker.rsplit(":", 1)[0] == host and not _alive(int(worker.rsplit(":", 1)[1]))
+            ]
+            conn.executemany(
+                "UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE id = ?",
+                [(_now(), job_id) for job_id in orphans]
+            )
+        return len(orphans)
+
+class JobManager:
+    """
+    Runs ingestion jobs in the background of an API worker. `submit()` records the job and returns at once; at most
+    `max_jobs` jobs run at a time, the rest wait as `queued`. Each job gets a `progress(**counts)` callback whose
+    counts are stored in the job record, and a path where it may write its rows as Parquet (see `rows_path()`). It
+    ends as `succeeded` (with its summary), `failed` (with the error) or `interrupted` (worker shut down). Row files
+    older than `config.JOB_ROWS_MAX_AGE_HOURS` are deleted when the manager starts.
+
+    Usage:
+        ```
+        jobs = JobManager()
+        job = jobs.submit("messages", table_name, lambda progress, rows_path: extract_ticket_messages(...))
+        jobs.store.get(job["id"])
+        ```
+
+    Parameters:
+        - store (`JobStore`) - where jobs are recorded; default is a `JobStore()` on `config.JOBS_DB_PATH`
+        - max_jobs (`int`) - jobs running at once; default is `config.MAX_BACKGROUND_JOBS`
+    """
+    def __init__(self, store: JobStore = None, max_jobs: int = None):
+        self.store = store or JobStore()
+        self.slots = asyncio.Semaphore(max_jobs or config.MAX_BACKGROUND_JOBS)
+        self.tasks = {}
+
+        interrupted = self.store.interrupt_orphans()
+        if interrupted:
+            print(f"Marked {interrupted} unfinished job(s) of stopped workers as interrupted")
+        self.purge_rows()
+
+    def rows_path(self, job_id: str) -> str:
+        """
+        Returns:
+            str:
+                - the Parquet file holding the rows of a job (it only exists if the job wrote rows)
+        """
+        return os.path.join(config.JOB_ROWS_DIR, f"{job_id}.parquet")
+
+    def purge_rows(self):
+        """
+        Deletes row files older than `config.JOB_ROWS_MAX_AGE_HOURS`.
+        """
+        if not os.path.isdir(config.JOB_ROWS_DIR):
+            return
+
+        cutoff = time.time() - config.JOB_ROWS_MAX_AGE_HOURS * 3600
+        for name in os.listdir(config.JOB_ROWS_DIR):
+            path = os.path.join(config.JOB_ROWS_DIR, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+
+    def submit(self, kind: str, table_name: str, run, **params) -> dict:
+        """
+        Starts a job.
+
+        Parameters:
+            - kind (`str`) - what the job does, e.g. `"messages"`
+            - table_name (`str`) - the target table
+            - run (`callable`) - takes the `progress` callback and the `rows_path`, and returns the awaitable doing
+            the work; its result is a summary dictionary (with a `rows` count), or `None` if the extraction failed
+            - **params - recorded with the job, e.g. `incremental=True`
+
+        Returns:
+            dict:
+                - the queued job, keyed like `JOB_FIELDS`
+        """
+        job = self.store.create(kind, table_name, params)
+        task = asyncio.create_task(self._run(job["id"], run))
+        self.tasks[job["id"]] = task
+        task.add_done_callback(lambda _: self.tasks.pop(job["id"], None))
+        return job
+
+    async def _run(self, job_id: str, run):
+        def progress(**counts):
+            self.store.update(job_id, progress=counts)
+
+        try:
+            async with self.slots:
+                self.store.update(job_id, status="running", started_at=_now())
+                result = await run(progress, self.rows_path(job_id))
+        except asyncio.CancelledError:
+            self.store.update(job_id, status="interrupted", finished_at=_now())
+            raise
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.update(job_id, status="failed", error=str(e) or type(e).__name__, finished_at=_now())
+            return
+
+        if result is None:
+            self.store.update(job_id, status="failed", error="Extraction failed, see the logs", finished_at=_now())
+        else:
+            self.store.update(job_id, status="succeeded", rows=result.get("rows"), result=result, finished_at=_now())
+
+    async def shutdown(self):
+        """
+        Cancels the jobs still running or queued, marking them `interrupted`.
+        """
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
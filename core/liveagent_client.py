@@ -1,15 +1,22 @@
+import json
 import asyncio
 import aiohttp
 import requests
 import pandas as pd
-from tqdm.asyncio import tqdm_asyncio
+from tqdm import tqdm
 from config import config
+from core.rate_limiter import get_rate_limiter
+from core.retry import request_json
+from core.decoders import PageDecoder
+from core.message_columns import MessageColumns
+from core.extraction_spec import ExtractionSpec
+from utils.message_cache import MessageCache, cache_marker
 
 # For API rate limits
 # From LiveAgent API Documentation:
 # The API rate limit is set right now to 180 requests per minute, counted for each API key separately.
-sem = asyncio.Semaphore(2) # 2 concurrent request muna at a time
-THROTTLE_DELAY = 0.4 # for rate control; (180 requests/min = 1 request every ~0.33s)
+# Every request goes through the shared token bucket for its API key, see `core.rate_limiter`,
+# and 429/5xx responses are retried with backoff, see `core.retry`.
 
 async def async_ping(session: aiohttp.ClientSession) -> tuple[bool, dict]:
     """
@@ -24,18 +31,115 @@ async def async_ping(session: aiohttp.ClientSession) -> tuple[bool, dict]:
             - Otherwise, returns a Boolean False and an empty dictionary.
     """
     try:
-        async with session.get(f"{config.base_url}/ping") as response:
-            status_ok = response.status == 200
-            response_json = await response.json()
-            return status_ok, response_json
-    except aiohttp.ClientError as e:
+        response_json = await request_json(
+            session,
+            f"{config.base_url}/ping",
+            limiter=get_rate_limiter(config.API_KEY)
+        )
+        return True, response_json
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         print(f"Ping failed: {e}")
         return False, {}
 
+# Headers/keys the API may use to report the total number of records of a listing
+TOTAL_COUNT_HEADERS = ["X-Total-Count", "X-Total"]
+TOTAL_COUNT_KEYS = ["total", "count", "total_count"]
+
+def _page_total(data, headers) -> int:
+    for name in TOTAL_COUNT_HEADERS:
+        if str(headers.get(name, "")).isdigit():
+            return int(headers[name])
+    if isinstance(data, dict):
+        for key in TOTAL_COUNT_KEYS:
+            if str(data.get(key, "")).isdigit():
+                return int(data[key])
+    return None
+
+def _page_records(data) -> list:
+    if isinstance(data, dict):
+        return data.get("data", [])
+    return data
+
+async def async_iter_pages(session: aiohttp.ClientSession, url: str, payload: dict, max_pages: int, headers: dict, prefetch: int = 0, short_page_is_last: bool = True, decoder: PageDecoder = None):
+    """
+    Streaming version of `async_paginate()`: yields each page as soon as it arrives so callers can start working
+    before pagination ends. Stops at `max_pages`, at an empty page, or at a page shorter than `_perPage` (which
+    is the last page, so the extra empty-page request is skipped).
+
+    With `prefetch`, pages after the first are requested concurrently (still within the rate limiter) and yielded
+    in order. If the first response reports the total number of records (see `TOTAL_COUNT_HEADERS`), every
+    remaining page is requested at once; otherwise up to `prefetch` pages are kept in flight ahead of the
+    current one, and the ones past an empty or short page are cancelled.
+
+    Parameters:
+        - session (`aiohttp.ClientSession`) - the client session
+        - url (`str`) - the API url
+        - payload (`dict`) - the params accepted by the API endpoint; it is not modified
+        - max_pages (`int`) - the max number of pages you want to paginate through
+        - headers (`dict`) - the header of the request to the API
+        - prefetch (`int`) - number of pages to request ahead; default is 0 (one page at a time)
+        - short_page_is_last (`bool`) - stop at a page shorter than `_perPage`; turn it off when `_perPage` may be
+        above what the API returns per page, so pagination goes on until an empty page; default is `True`
+        - decoder (`PageDecoder`) - decodes each response, e.g. keeping only the fields used; default decodes the
+        whole response
+
+    Yields:
+        list:
+            - the records of one page
+    """
+    per_page = int(payload["_perPage"]) if payload.get("_perPage") and short_page_is_last else None
+
+    async def fetch_page(page: int):
+        params = dict(payload)
+        params["_page"] = page
+        return await request_json(session, url, params=params, headers=headers, return_headers=True, decoder=decoder)
+
+    if max_pages < 1:
+        return
+
+    data, response_headers = await fetch_page(1)
+    total = _page_total(data, response_headers)
+    data = _page_records(data)
+    if not data:
+        return
+    yield data
+    if per_page and len(data) < per_page:
+        return
+
+    last_page = max_pages
+    window = max(1, prefetch)
+    if prefetch and total is not None and per_page:
+        last_page = min(max_pages, -(-total // per_page))
+        window = last_page
+
+    pending = {}
+    next_page = 2
+    try:
+        for page in range(2, last_page + 1):
+            while next_page <= last_page and len(pending) < window:
+                pending[next_page] = asyncio.create_task(fetch_page(next_page))
+                next_page += 1
+
+            data, _ = await pending.pop(page)
+            data = _page_records(data)
+            if not data:
+                break
+
+            yield data
+
+            if per_page and len(data) < per_page:
+                break
+    finally:
+        for task in pending.values():
+            task.cancel()
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+
 async def async_paginate(session: aiohttp.ClientSession, url: str, payload: dict, max_pages: int, headers: dict) -> list:
     """
-    Accepts a max number of pages and loops through until it reaches the last page. Utilizes `asyncio.sleep()` and `asyncio.Semaphore()`
-    which helps make concurrent requests at a time (for rate limiting issues).
+    Accepts a max number of pages and loops through until it reaches the last page. Each request waits on the
+    shared rate limiter for the API key in `headers` (see `core.rate_limiter.get_rate_limiter()`) and is retried
+    on 429 and transient 5xx responses (see `core.retry.request_json()`). Use `async_iter_pages()` to process
+    pages as they arrive.
 
     **Note**: According to LiveAgent API, the API rate limit is 180 requests per minute, counted for each API key separately.
 
@@ -51,50 +155,67 @@ async def async_paginate(session: aiohttp.ClientSession, url: str, payload: dict
             - A list of data fetched from the LiveAgent API.
     """
     all_data = []
-    page = 1
-
-    while page <= max_pages:
-        payload["_page"] = page
-        async with sem:
-            await asyncio.sleep(THROTTLE_DELAY)
-            async with session.get(url, params=payload, headers=headers) as res:
-                res.raise_for_status()
-                data = await res.json()
-
-        if isinstance(data, dict):
-            data = data.get("data", [])
-
-        if not data:
-            break
-        
+    async for data in async_iter_pages(session, url, payload, max_pages, headers):
         all_data.extend(data)
-        page += 1
 
     return all_data
 
-async def fetch_tickets(session: aiohttp.ClientSession, payload: dict, max_pages: int = 5) -> dict:
+TICKET_FIELDS = [
+    'id', 'tags', 'code', 'owner_contactid', 'owner_email', 'owner_name',
+    'date_created', 'date_changed', 'agentid', 'subject', 'status', 'channel_type'
+]
+# Ticket pages are decoded keeping only `TICKET_FIELDS`
+TICKET_DECODER = PageDecoder(TICKET_FIELDS)
+
+def project_ticket(ticket: dict) -> dict:
     """
-    The function that interacts with the `/tickets` endpoint of the LiveAgent API. Uses `async_paginate()`
-    to loop through a certain number of pages and stores the data in a dictionary.
+    Keeps only the ticket fields used downstream, renaming `date_created` to `ticket_date_created`.
+
+    Parameters:
+        - ticket (`dict`) - one ticket from the `/tickets` endpoint
+
+    Returns:
+        dict:
+            - the ticket, keyed like the columns of `fetch_tickets()`
+    """
+    row = {}
+    for key in TICKET_FIELDS:
+        dest_key = "ticket_date_created" if key == "date_created" else key
+        default_value = [] if key in ["tags", "code"] else None
+        row[dest_key] = ticket.get(key, default_value)
+    return row
+
+async def stream_tickets(session: aiohttp.ClientSession, payload: dict, max_pages: int = 5, prefetch: int = None):
+    """
+    Streaming version of `fetch_tickets()`: yields each ticket as its page arrives. Can be passed straight to
+    `stream_all_messages()` so message workers start while the ticket list is still paginating.
 
     Parameters:
         - session (`aiohttp.ClientSession`) - the client session
         - payload (`dict`) - dictionary of parameters to send with the request for filtering or modifying the ticket query
         - max_pages (`int`) - maximum number of pages to retrieve; default is 5
+        - prefetch (`int`) - number of ticket pages to request ahead; default is `config.TICKET_PAGE_PREFETCH`
+
+    Yields:
+        dict:
+            - one ticket, keyed like the columns of `fetch_tickets()`
     """
-    ticket_data = await async_paginate(
-        session=session,
-        url=config.tickets_list_url,
-        payload=payload,
-        max_pages=max_pages,
-        headers=config.headers
-    )
+    prefetch = config.TICKET_PAGE_PREFETCH if prefetch is None else prefetch
+    async for page in async_iter_pages(session, config.tickets_list_url, payload, max_pages, config.headers, prefetch, decoder=TICKET_DECODER):
+        for ticket in page:
+            yield project_ticket(ticket)
 
-    field_keys = [
-        'id', 'tags', 'code', 'owner_contactid', 'owner_email', 'owner_name',
-        'date_created', 'agentid', 'subject', 'status', 'channel_type'
-    ]
+async def fetch_tickets(session: aiohttp.ClientSession, payload: dict, max_pages: int = 5, prefetch: int = None) -> dict:
+    """
+    The function that interacts with the `/tickets` endpoint of the LiveAgent API. Uses `stream_tickets()`
+    to loop through a certain number of pages and stores the data in a dictionary.
 
+    Parameters:
+        - session (`aiohttp.ClientSession`) - the client session
+        - payload (`dict`) - dictionary of parameters to send with the request for filtering or modifying the ticket query
+        - max_pages (`int`) - maximum number of pages to retrieve; default is 5
+        - prefetch (`int`) - number of ticket pages to request ahead; default is `config.TICKET_PAGE_PREFETCH`
+    """
     tickets_dict = {
         "id": [],
         "tags": [],
@@ -103,33 +224,33 @@ async def fetch_tickets(session: aiohttp.ClientSession, payload: dict, max_pages
         "owner_email": [],
         "owner_name": [],
         "ticket_date_created": [],
+        "date_changed": [],
         "agentid": [],
         "subject": [],
         "status": [],
         "channel_type": [],
     }
 
-    for ticket in ticket_data:
-        for key in field_keys:
-            dest_key = "ticket_date_created" if key == "date_created" else key
-            default_value = [] if key in ["tags", "code"] else None
-            tickets_dict[dest_key].append(ticket.get(key, default_value))
+    async for ticket in stream_tickets(session, payload, max_pages, prefetch):
+        for key, value in ticket.items():
+            tickets_dict[key].append(value)
 
     return tickets_dict
 
-async def async_tickets(session: aiohttp.ClientSession, max_pages: int = 5) -> dict:
+async def async_tickets(session: aiohttp.ClientSession, max_pages: int = 5, spec: ExtractionSpec = None) -> dict:
     """
-    Fetches tickets using a **default** payload configuration defined in `config.ticket_payload`.
+    Fetches tickets using the payload of `spec`, or the **default** payload configuration defined in `config.ticket_payload`.
 
     Parameters:
         - session (`aiohttp.ClientSession`) - the client session
         - max_pages (`int`) - the maximum number of pages to retrieve; default is 5
+        - spec (`ExtractionSpec`) - the run's filters and paging parameters; default is `ExtractionSpec()`
 
     Returns:
         dict:
             - A dictionary containing list of extracted ticket fields
     """
-    return await fetch_tickets(session, config.ticket_payload.copy(), max_pages)
+    return await fetch_tickets(session, (spec or ExtractionSpec()).ticket_payload(), max_pages)
 
 async def async_tickets_filtered(session: aiohttp.ClientSession, payload: dict, max_pages: int = 5) -> dict:
     """
@@ -159,34 +280,54 @@ async def tickets_by_date(session: aiohttp.ClientSession, date_str: str, max_pag
         dict:
             - dictionary containing list of extracted ticket fields
     """
-    payload = config.ticket_payload.copy()
+    payload = ExtractionSpec().ticket_payload()
     payload["date_created"] = date_str
     return await fetch_tickets(session, payload, max_pages)
 
-async def async_agents(session: aiohttp.ClientSession, max_pages: int = 5) -> dict:
+async def stream_agents(session: aiohttp.ClientSession, max_pages: int = None):
     """
-    Interacts with the `/agents` endpoint from the LiveAgent API to cross reference agent IDs. Gathers the
-    agent ID, name, email, and status then stores them in a dictionary.
+    Streaming version of `async_agents()`: yields each agent as its page arrives. Pages are requested with
+    `config.REFERENCE_PER_PAGE` agents each and read until an empty page, so no agent is dropped even if the API
+    returns fewer agents per page than requested.
 
     Parameters:
         - session (`aiohttp.ClientSession`) - the client session
-        - max_pages (`int`) - maximum number of pages to retrieve; default is 5
+        - max_pages (`int`) - maximum number of pages to retrieve; default is `config.REFERENCE_MAX_PAGES`
 
-    Returns:
+    Yields:
         dict:
-            - a dictionary of ID, name, email and status for each agent
+            - the ID, name, email and status of one agent
     """
     payload = {
         "_page": 1,
-        "_perPage": 5
+        "_perPage": config.REFERENCE_PER_PAGE
     }
-    agents_data = await async_paginate(
-        session=session,
-        url=config.agents_list_url,
-        payload=payload,
-        max_pages=max_pages,
-        headers=config.headers
-    )
+    async for page in async_iter_pages(
+        session, config.agents_list_url, payload, max_pages or config.REFERENCE_MAX_PAGES, config.headers,
+        short_page_is_last=False
+    ):
+        for agent in page:
+            yield {
+                "id": agent.get("id"),
+                "name": agent.get("name"),
+                "email": agent.get("email"),
+                "status": agent.get("status")
+            }
+
+async def async_agents(session: aiohttp.ClientSession, max_pages: int = None) -> dict:
+    """
+    Interacts with the `/agents` endpoint from the LiveAgent API to cross reference agent IDs. Gathers the
+    agent ID, name, email, and status then stores them in a dictionary. See `core.reference_data.get_agent_lookup()`
+    for a cached lookup.
+
+    Parameters:
+        - session (`aiohttp.ClientSession`) - the client session
+        - max_pages (`int`) - maximum number of pages to retrieve; default is `config.REFERENCE_MAX_PAGES`
+
+    Returns:
+        dict:
+            - a dictionary of ID, name, email and status for each agent
+    """
     agents_dict = {
         "id": [],
         "name": [],
@@ -194,15 +335,134 @@ async def async_agents(session: aiohttp.ClientSession, max_pages: int = 5) -> di
         "status": []
     }
 
-    for agent in agents_data:
-        agents_dict['id'].append(agent.get("id"))
-        agents_dict['name'].append(agent.get("name"))
-        agents_dict['email'].append(agent.get("email"))
-        agents_dict['status'].append(agent.get("status"))
+    async for agent in stream_agents(session, max_pages):
+        for key, value in agent.items():
+            agents_dict[key].append(value)
 
     return agents_dict
 
-async def get_ticket_messages_for_one(session: aiohttp.ClientSession, ticket_id: str, ticket_date_created: str, code: str, owner_name: str, subject: str, agent_id: str, status: str, channel_type: str, tags: str, agent_lookup: str, max_pages: int = 5) -> list:
+# Fields of `/tickets/{ticket_id}/messages` used by `_add_page()`; message pages are decoded keeping only these
+MESSAGE_FIELDS = ["id", "userid", "message", "datecreated", "type"]
+MESSAGE_DECODER = PageDecoder(["messages"], {"messages": MESSAGE_FIELDS})
+
+async def _message_pages(session: aiohttp.ClientSession, url: str, payload: dict, max_pages: int, ticket_id: str, cache: MessageCache, marker: str):
+    if cache is None or marker is None:
+        async for page in async_iter_pages(session, url, payload, max_pages, config.headers, decoder=MESSAGE_DECODER):
+            yield page
+        return
+
+    cached = cache.get(ticket_id, marker)
+    if cached is not None:
+        for page in cached[:max_pages]:
+            yield page
+        return
+
+    pages = []
+    async for page in async_iter_pages(session, url, payload, max_pages, config.headers, decoder=MESSAGE_DECODER):
+        pages.append(page)
+        yield page
+
+    # only cache complete conversations, not ones cut off at max_pages
+    per_page = payload.get("_perPage")
+    if len(pages) < max_pages or (per_page and len(pages[-1]) < int(per_page)):
+        cache.put(ticket_id, marker, pages)
+
+def _is_processed(message: dict, since: str, since_id: str) -> bool:
+    datecreated = message.get("datecreated") or ""
+    return datecreated < since or (datecreated == since and message.get("id") == since_id)
+
+def _messages_request(ticket_id: str, since: str, spec: ExtractionSpec = None) -> tuple[str, dict]:
+    url = f"{config.tickets_list_url}/{ticket_id}/messages"
+    payload = (spec or ExtractionSpec()).messages_payload()
+    if since:
+        payload["_filters"] = json.dumps([["datecreated", "D>=", since]])
+    return url, payload
+
+def _add_ticket(columns: MessageColumns, ticket_id: str, ticket_date_created: str, code: str, owner_name: str, subject: str, agent_id: str, status: str, channel_type: str, tags: str, agent_lookup: dict) -> int:
+    return columns.add_ticket(
+        ticket_id=ticket_id,
+        code=code,
+        owner_name=owner_name,
+        subject=subject,
+        ticket_date_created=ticket_date_created,
+        agentid=agent_id,
+        status=status,
+        channel_type=channel_type,
+        agent_name=agent_lookup.get(agent_id),
+        tags=','.join(tags) if tags else None
+    )
+
+def _add_page(columns: MessageColumns, ticket: int, page: list, agent_lookup: dict, since: str, since_id: str):
+    owner_name = columns.tickets["owner_name"][ticket]
+    agent_name = columns.tickets["agent_name"][ticket]
+
+    for item in page:
+        messages = item.get("messages", [])
+        for message in messages:
+            if since and _is_processed(message, since, since_id):
+                continue
+
+            msg_userid = message.get("userid")
+
+            sender = agent_lookup.get(msg_userid) if msg_userid in agent_lookup else owner_name
+
+            if msg_userid in agent_lookup:
+                receiver_type = "Customer"
+                receiver_name = owner_name
+            else:
+                receiver_type = "Agent"
+                receiver_name = agent_name
+
+            columns.add_message(
+                ticket,
+                message_id=message.get("id"),
+                message=message.get("message"),
+                datecreated=message.get("datecreated"),
+                type=message.get("type"),
+                sender_name=sender,
+                receiver_type=receiver_type,
+                receiver_name=receiver_name
+            )
+
+async def stream_ticket_messages_for_one(session: aiohttp.ClientSession, ticket_id: str, ticket_date_created: str, code: str, owner_name: str, subject: str, agent_id: str, status: str, channel_type: str, tags: str, agent_lookup: str, max_pages: int = 5, since: str = None, since_id: str = None, cache: MessageCache = None, marker: str = None, spec: ExtractionSpec = None):
+    """
+    Streaming version of `get_ticket_messages_for_one()`: yields the messages of each page of
+    `/ticket/{ticket_id}/messages` as it arrives. Takes the same parameters.
+
+    Yields:
+        list:
+            - the ticket messages of one page
+    """
+    url, payload = _messages_request(ticket_id, since, spec)
+    if since:
+        cache = None # the cache only holds whole conversations
+
+    async for page in _message_pages(session, url, payload, max_pages, ticket_id, cache, marker):
+        columns = MessageColumns()
+        ticket = _add_ticket(columns, ticket_id, ticket_date_created, code, owner_name, subject, agent_id, status, channel_type, tags, agent_lookup)
+        _add_page(columns, ticket, page, agent_lookup, since, since_id)
+        yield columns.to_records()
+
+async def get_ticket_columns_for_one(session: aiohttp.ClientSession, ticket_id: str, ticket_date_created: str, code: str, owner_name: str, subject: str, agent_id: str, status: str, channel_type: str, tags: str, agent_lookup: str, max_pages: int = 5, since: str = None, since_id: str = None, cache: MessageCache = None, marker: str = None, spec: ExtractionSpec = None) -> MessageColumns:
+    """
+    Columnar version of `get_ticket_messages_for_one()`: collects the ticket's messages into a `MessageColumns`
+    accumulator instead of one dictionary per message. Takes the same parameters.
+
+    Returns:
+        MessageColumns:
+            - the messages of the ticket
+    """
+    url, payload = _messages_request(ticket_id, since, spec)
+    if since:
+        cache = None # the cache only holds whole conversations
+
+    columns = MessageColumns()
+    ticket = _add_ticket(columns, ticket_id, ticket_date_created, code, owner_name, subject, agent_id, status, channel_type, tags, agent_lookup)
+    async for page in _message_pages(session, url, payload, max_pages, ticket_id, cache, marker):
+        _add_page(columns, ticket, page, agent_lookup, since, since_id)
+    return columns
+
+async def get_ticket_messages_for_one(session: aiohttp.ClientSession, ticket_id: str, ticket_date_created: str, code: str, owner_name: str, subject: str, agent_id: str, status: str, channel_type: str, tags: str, agent_lookup: str, max_pages: int = 5, since: str = None, since_id: str = None, cache: MessageCache = None, marker: str = None, spec: ExtractionSpec = None) -> list:
     """
     Interacts with the `/ticket/{ticket_id}/messages` endpoint of the LiveAgent API. It loops through
     each page for the tickets and extracts the ticket's messages.
@@ -219,104 +479,189 @@ async def get_ticket_messages_for_one(session: aiohttp.ClientSession, ticket_id:
         - channel_type (`str`) - the ticket channel type
         - agent_lookup (`str`) - used to cross reference the agent ID
         - max_pages (`int`) - maximum number of pages to retrieve; default is 5
+        - since (`str`) - only fetch messages created at or after this date (see `core.incremental`); default is `None`
+        - since_id (`str`) - the last message already processed at `since`, which is skipped; default is `None`
+        - cache (`MessageCache`) - serves the messages from disk while the ticket is unchanged; default is `None`
+        - marker (`str`) - the ticket's modification marker for the cache (see `utils.message_cache.cache_marker()`)
+        - spec (`ExtractionSpec`) - the run's paging parameters; default is `ExtractionSpec()`
 
     Returns:
         list:
             - list of ticket messages
     """
-    url = f"{config.tickets_list_url}/{ticket_id}/messages"
-    payload = config.messages_payload.copy()
-    
-    messages_data = await async_paginate(
-        session=session,
-        url=url,
-        payload=payload,
-        headers=config.headers,
-        max_pages=max_pages
+    columns = await get_ticket_columns_for_one(
+        session, ticket_id, ticket_date_created, code, owner_name, subject,
+        agent_id, status, channel_type, tags, agent_lookup, max_pages, since, since_id, cache, marker, spec
     )
+    return columns.to_records()
 
-    ticket_messages = []
-    for item in messages_data:
-        messages = item.get("messages", [])
-        for message in messages:
-            msg_userid = message.get("userid")
-            msg_type = message.get("type")
+def ticket_rows(response: dict):
+    """
+    Turns the column dictionary returned by `fetch_tickets()` into one dictionary per ticket.
 
-            sender = agent_lookup.get(msg_userid) if msg_userid in agent_lookup else owner_name
+    Parameters:
+        - response (`dict`) - expects the data from `/tickets` endpoint.
 
-            if msg_userid in agent_lookup:
-                receiver_type = "Customer"
-                receiver_name = owner_name
+    Yields:
+        dict:
+            - the ticket fields, keyed like the columns of `fetch_tickets()`
+    """
+    for i in range(len(response.get("id", []))):
+        yield {key: values[i] if i < len(values) else None for key, values in response.items()}
+
+async def _ticket_source(tickets):
+    if isinstance(tickets, dict):
+        for ticket in ticket_rows(tickets):
+            yield ticket
+    else:
+        async for ticket in tickets:
+            yield ticket
+
+_WORKER_DONE = object()
+
+async def stream_all_messages(session: aiohttp.ClientSession, tickets, agent_lookup: dict, max_pages: int = 5, workers: int = None, cache: MessageCache = None, spec: ExtractionSpec = None):
+    """
+    Fetches the messages of every ticket with a fixed pool of workers and yields each ticket's messages as soon as
+    they are fetched, as a `MessageColumns` batch. Tickets are pulled from a bounded queue, so only a few tickets and their messages are held in
+    memory at a time no matter how many tickets there are. Messages come out in completion order, not ticket order.
+
+    Parameters:
+        - session (`aiohttp.ClientSession`) - the client session, shared with the ticket and agent fetches
+        - tickets (`dict` or async iterable) - the data from `fetch_tickets()`, or an async iterable of ticket
+        dictionaries keyed like its columns (optionally with the `since`/`since_id` of `get_ticket_messages_for_one()`)
+        - agent_lookup (`dict`) - used to cross reference the agent ID; an `AgentLookup` is refreshed when a
+        ticket's agent is unknown
+        - max_pages (`int`) - maximum number of pages to retrieve per ticket; default is 5
+        - workers (`int`) - number of tickets fetched at the same time; default is `config.MESSAGE_WORKERS`
+        - cache (`MessageCache`) - serves unchanged tickets from disk; default is `None`
+        - spec (`ExtractionSpec`) - the run's paging parameters; default is `ExtractionSpec()`
+
+    Yields:
+        MessageColumns:
+            - the messages of one ticket
+    """
+    workers = workers or config.MESSAGE_WORKERS
+    ticket_queue = asyncio.Queue(maxsize=workers * 2)
+    result_queue = asyncio.Queue(maxsize=workers * 2)
+
+    async def produce():
+        try:
+            async for ticket in _ticket_source(tickets):
+                await ticket_queue.put(ticket)
+        except Exception as e:
+            await result_queue.put(e)
+            return
+        for _ in range(workers):
+            await ticket_queue.put(None)
+
+    # an `AgentLookup` (see `core.reference_data`) refreshes itself on unknown agents
+    ensure_agents = getattr(agent_lookup, "ensure", None)
+
+    async def work():
+        try:
+            while (ticket := await ticket_queue.get()) is not None:
+                if ensure_agents:
+                    await ensure_agents(session, ticket.get("agentid"))
+                messages = await get_ticket_columns_for_one(
+                    session,
+                    ticket.get("id"),
+                    ticket.get("ticket_date_created"),
+                    ticket.get("code"),
+                    ticket.get("owner_name"),
+                    ticket.get("subject"),
+                    ticket.get("agentid"),
+                    ticket.get("status"),
+                    ticket.get("channel_type"),
+                    ticket.get("tags"),
+                    agent_lookup,
+                    max_pages,
+                    ticket.get("since"),
+                    ticket.get("since_id"),
+                    cache,
+                    cache_marker(ticket),
+                    spec
+                )
+                await result_queue.put(messages)
+        except Exception as e:
+            await result_queue.put(e)
+            return
+        await result_queue.put(_WORKER_DONE)
+
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(work()) for _ in range(workers)]
+    try:
+        running = workers
+        while running:
+            item = await result_queue.get()
+            if item is _WORKER_DONE:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
             else:
-                receiver_type = "Agent"
-                receiver_name = agent_lookup.get(agent_id)
-
-            ticket_messages.append({
-                "ticket_id": ticket_id,
-                "code": code,
-                "owner_name": owner_name,
-                "message_id": message.get("id"),
-                "subject": subject,
-                "message": message.get("message"),
-                "datecreated": message.get("datecreated"),
-                "ticket_date_created": ticket_date_created,
-                "type": msg_type,
-                "agentid": agent_id,
-                "status": status,
-                "channel_type": channel_type,
-                "agent_name": agent_lookup.get(agent_id),
-                "sender_name": sender,
-                "receiver_type": receiver_type,
-                "receiver_name": receiver_name,
-                "tags": ','.join(tags) if tags else None
-            })
-    return ticket_messages
-
-async def fetch_all_messages(response: dict, agent_lookup: dict, max_pages: int = 5) -> pd.DataFrame:
-    """
-    Fetches all messages for each ticket ID.
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def stream_message_frames(session: aiohttp.ClientSession, tickets, agent_lookup: dict, max_pages: int = 5, cache: MessageCache = None, batch_rows: int = None, spec: ExtractionSpec = None):
+    """
+    Groups the per-ticket batches of `stream_all_messages()` into DataFrames of about `batch_rows` messages, for
+    sinks that load as they go (see `utils.bq_sink.BigQuerySink`). Takes the same parameters.
 
     Parameters:
-        - response (`dict`) - expects the data from `/tickets` endpoint.
+        - batch_rows (`int`) - messages per DataFrame; default is `config.MESSAGE_BATCH_ROWS`
+
+    Yields:
+        pd.DataFrame:
+            - a batch of messages, with the columns of `fetch_all_messages()`. `attrs["ticket_ids"]` lists every
+            ticket of the batch, including tickets without (new) messages, so the last batch may have no rows.
+    """
+    batch_rows = batch_rows or config.MESSAGE_BATCH_ROWS
+
+    def frame(batch: MessageColumns) -> pd.DataFrame:
+        df = batch.to_frame()
+        df.attrs["ticket_ids"] = list(batch.tickets["ticket_id"])
+        return df
+
+    batch = MessageColumns()
+    total = len(tickets.get("id", [])) if isinstance(tickets, dict) else None
+
+    with tqdm(total=total, desc="Fetching ticket messages") as progress:
+        async for messages in stream_all_messages(session, tickets, agent_lookup, max_pages, cache=cache, spec=spec):
+            batch.extend(messages)
+            progress.update(1)
+            if len(batch) >= batch_rows:
+                yield frame(batch)
+                batch = MessageColumns()
+
+    if batch.tickets["ticket_id"]:
+        yield frame(batch)
+
+async def fetch_all_messages(session: aiohttp.ClientSession, response: dict, agent_lookup: dict, max_pages: int = 5, cache: MessageCache = None, spec: ExtractionSpec = None) -> pd.DataFrame:
+    """
+    Fetches all messages for each ticket ID. See `stream_all_messages()` to consume the messages per ticket
+    instead of waiting for all of them.
+
+    Parameters:
+        - session (`aiohttp.ClientSession`) - the client session, shared with the ticket and agent fetches
+        - response (`dict` or async iterable) - expects the data from `/tickets` endpoint, or `stream_tickets()`
         - agent_lookup (`dict`) - used to cross reference the agent ID
         - max_pages (`int`) - maximum number of pages to retrieve; default is 5
+        - cache (`MessageCache`) - serves unchanged tickets from disk; default is `None`
+        - spec (`ExtractionSpec`) - the run's paging parameters; default is `ExtractionSpec()`
 
     Returns:
         pd.DataFrame:
             - a DataFrame of all messages for the ticket
     """
-    ticket_ids = response.get("id", [])
-    ticket_date_created = response.get("ticket_date_created", [])
-    owner_names = response.get("owner_name", [])
-    subjects = response.get("subject", [])
-    agentids = response.get("agentid", [])
-    tags_list = response.get("tags", [])
-    code = response.get("code", [])
-    status = response.get("status", [])
-    channel_type = response.get("channel_type", [])
-
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for i, ticket_id in enumerate(ticket_ids):
-            tasks.append(get_ticket_messages_for_one(
-                session,
-                ticket_id,
-                ticket_date_created[i] if i < len(ticket_date_created) else None,
-                code[i] if i < len(code) else None,
-                owner_names[i] if i < len(owner_names) else None,
-                subjects[i] if i < len(subjects) else None,
-                agentids[i] if i < len(agentids) else None,
-                status[i] if i < len(status) else None,
-                channel_type[i] if i < len(channel_type) else None,
-                tags_list[i] if i < len(tags_list) else None,
-                agent_lookup,
-                max_pages
-            ))
-
-        results = await tqdm_asyncio.gather(*tasks, desc="Fetching ticket messages")
-    
-    all_messages = [msg for sublist in results for msg in sublist]
-    return pd.DataFrame(all_messages)
+    all_messages = MessageColumns()
+    total = len(response.get("id", [])) if isinstance(response, dict) else None
+    with tqdm(total=total, desc="Fetching ticket messages") as progress:
+        async for messages in stream_all_messages(session, response, agent_lookup, max_pages, cache=cache, spec=spec):
+            all_messages.extend(messages)
+            progress.update(1)
+
+    return all_messages.to_frame()
 
 async def fetch_tags(session: aiohttp.ClientSession) -> pd.DataFrame:
     """
@@ -329,12 +674,7 @@ async def fetch_tags(session: aiohttp.ClientSession) -> pd.DataFrame:
         pd.DataFrame:
             - a DataFrame of all tags
     """
-    async with session.get(
-        url=f"{config.base_url}/tags",
-        headers=config.headers
-    ) as res:
-        res.raise_for_status()
-        data = await res.json()
+    data = await request_json(session, f"{config.base_url}/tags", headers=config.headers)
 
     try:
         df = pd.DataFrame(data=data)
@@ -0,0 +1,123 @@
+from array import array
+import numpy as np
+import pandas as pd
+
+# Column order of the messages DataFrame
+MESSAGE_COLUMNS = [
+    "ticket_id", "code", "owner_name", "message_id", "subject", "message", "datecreated",
+    "ticket_date_created", "type", "agentid", "status", "channel_type", "agent_name",
+    "sender_name", "receiver_type", "receiver_name", "tags"
+]
+# Fields that are the same for every message of a ticket, stored once per ticket
+TICKET_COLUMNS = [
+    "ticket_id", "code", "owner_name", "subject", "ticket_date_created", "agentid",
+    "status", "channel_type", "agent_name", "tags"
+]
+# Fields that differ per message
+PER_MESSAGE_COLUMNS = [
+    "message_id", "message", "datecreated", "type", "sender_name", "receiver_type", "receiver_name"
+]
+# Columns identifying a message row, used as the MERGE key of upserts
+MESSAGE_KEYS = ["ticket_id", "message_id"]
+
+class MessageColumns:
+    """
+    Columnar accumulator for ticket messages. Each per-message field is appended to its own list, while the
+    ticket-level fields (subject, owner, tags, agent name, ...) are stored once per ticket and referenced by a
+    compact ticket index, so no per-message dictionary is ever built. `to_frame()` broadcasts the ticket fields
+    into the final DataFrame in one vectorized step.
+
+    Usage:
+        ```
+        columns = MessageColumns()
+        ticket = columns.add_ticket(ticket_id=..., code=..., ...)
+        columns.add_message(ticket, message_id=..., message=..., ...)
+        df = columns.to_frame()
+        ```
+    """
+    def __init__(self):
+        self.tickets = {column: [] for column in TICKET_COLUMNS}
+        self.messages = {column: [] for column in PER_MESSAGE_COLUMNS}
+        self.ticket_index = array("q")
+
+    def __len__(self) -> int:
+        return len(self.ticket_index)
+
+    def add_ticket(self, **fields) -> int:
+        """
+        Stores the ticket-level fields of a ticket (see `TICKET_COLUMNS`); missing fields are `None`.
+
+        Returns:
+            int:
+                - the ticket's position, to pass to `add_message()`
+        """
+        for column in TICKET_COLUMNS:
+            self.tickets[column].append(fields.get(column))
+        return len(self.tickets["ticket_id"]) - 1
+
+    def add_message(self, ticket: int, message_id: str = None, message: str = None, datecreated: str = None, type: str = None, sender_name: str = None, receiver_type: str = None, receiver_name: str = None):
+        """
+        Appends one message of a ticket added with `add_ticket()` (see `PER_MESSAGE_COLUMNS`).
+        """
+        messages = self.messages
+        self.ticket_index.append(ticket)
+        messages["message_id"].append(message_id)
+        messages["message"].append(message)
+        messages["datecreated"].append(datecreated)
+        messages["type"].append(type)
+        messages["sender_name"].append(sender_name)
+        messages["receiver_type"].append(receiver_type)
+        messages["receiver_name"].append(receiver_name)
+
+    def extend(self, other: "MessageColumns"):
+        """
+        Appends all tickets and messages of another accumulator, e.g. the batch of one ticket.
+        """
+        offset = len(self.tickets["ticket_id"])
+        for column in TICKET_COLUMNS:
+            self.tickets[column].extend(other.tickets[column])
+        for column in PER_MESSAGE_COLUMNS:
+            self.messages[column].extend(other.messages[column])
+        self.ticket_index.extend(i + offset for i in other.ticket_index)
+
+    def to_frame(self, categorical: bool = False) -> pd.DataFrame:
+        """
+        Builds the messages DataFrame, with columns in `MESSAGE_COLUMNS` order.
+
+        Parameters:
+            - categorical (`bool`) - dictionary-encode the ticket-level columns as `pd.Categorical` instead of
+            broadcasting them as plain object columns, which uses far less memory on large pulls; default is `False`
+
+        Returns:
+            pd.DataFrame:
+                - one row per message
+        """
+        index = np.frombuffer(self.ticket_index, dtype=np.int64) if len(self) else np.empty(0, dtype=np.int64)
+        data = {}
+        for column in MESSAGE_COLUMNS:
+            if column in self.messages:
+                data[column] = self.messages[column]
+                continue
+
+            values = np.empty(len(self.tickets[column]), dtype=object)
+            values[:] = self.tickets[column]
+            if categorical:
+                codes, uniques = pd.factorize(values)
+                data[column] = pd.Categorical.from_codes(codes[index], uniques)
+            else:
+                data[column] = values[index]
+        return pd.DataFrame(data, columns=MESSAGE_COLUMNS)
+
+    def to_records(self) -> list:
+        """
+        Returns:
+            list:
+                - one dictionary per message, keyed like `MESSAGE_COLUMNS`
+        """
+        records = []
+        for position, ticket in enumerate(self.ticket_index):
+            records.append({
+                column: self.messages[column][position] if column in self.messages else self.tickets[column][ticket]
+                for column in MESSAGE_COLUMNS
+            })
+        return records
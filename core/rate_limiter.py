@@ -0,0 +1,145 @@
+import time
+import asyncio
+from config import config
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by every request made with the same API key.
+
+    Tokens refill continuously at `(rate_per_minute - burst) / 60` per second and the bucket holds at most `burst`
+    tokens, so in any 60-second window at most `rate_per_minute` requests go out. A semaphore caps how many
+    requests are in flight at the same time.
+
+    The refill rate adapts to the API: `penalize()` halves it and pauses new requests after a 429, and
+    `reward()` steps it back up towards the configured rate after a run of successful requests.
+
+    The bucket can be used from more than one event loop (e.g. consecutive `asyncio.run()` calls in one process):
+    the tokens and the rate are shared, so back-to-back runs still keep to the quota, while the lock and the
+    semaphore, which asyncio binds to one loop, are created for each loop.
+
+    Usage:
+        ```
+        async with limiter:
+            async with session.get(url) as res:
+                ...
+        ```
+
+    Parameters:
+        - rate_per_minute (`int`) - the request quota per minute
+        - burst (`int`) - the number of requests that may be sent back-to-back
+        - max_concurrency (`int`) - the number of requests that may be in flight at once
+    """
+    def __init__(self, rate_per_minute: int, burst: int, max_concurrency: int):
+        if rate_per_minute <= burst:
+            raise ValueError("rate_per_minute must be greater than burst")
+
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_rate = (rate_per_minute - burst) / 60
+        self.min_rate = self.max_rate / 10
+        self.rate = self.max_rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.successes = 0
+        self._primitives = {}
+
+    def _loop_primitives(self) -> tuple[asyncio.Lock, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if loop not in self._primitives:
+            # the primitives hold on to their loop, so the ones of finished loops are dropped here
+            for closed in [other for other in self._primitives if other.is_closed()]:
+                del self._primitives[closed]
+            self._primitives[loop] = (asyncio.Lock(), asyncio.Semaphore(self.max_concurrency))
+        return self._primitives[loop]
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """
+        Waits until a concurrency slot and a token are both available, then takes them.
+        """
+        lock, concurrency = self._loop_primitives()
+        await concurrency.acquire()
+        try:
+            # the lock keeps waiters in FIFO order while they sleep for the next token
+            async with lock:
+                while (pause := self.paused_until - time.monotonic()) > 0:
+                    await asyncio.sleep(pause)
+                self._refill()
+                while self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    self._refill()
+                self.tokens -= 1
+        except BaseException:
+            concurrency.release()
+            raise
+
+    def release(self):
+        """
+        Gives back the concurrency slot taken by `acquire()`, from the same event loop. Tokens are not returned.
+        """
+        self._loop_primitives()[1].release()
+
+    def penalize(self, retry_after: float = None):
+        """
+        Slows the bucket down after the API answered with a 429. The refill rate is halved (down to a tenth
+        of the configured rate) and the stored tokens are dropped so no burst follows.
+
+        Parameters:
+            - retry_after (`float`) - seconds from the `Retry-After` header; new requests wait at least this long
+        """
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0.0
+        self.successes = 0
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def reward(self, run: int = 20):
+        """
+        Records a successful request. After `run` successes in a row the refill rate goes up by a tenth of
+        the configured rate, up to the configured rate.
+
+        Parameters:
+            - run (`int`) - number of consecutive successes needed before speeding up; default is 20
+        """
+        self.successes += 1
+        if self.successes >= run and self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+            self.successes = 0
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+_limiters: dict[str, TokenBucket] = {}
+
+def get_rate_limiter(api_key: str = None) -> TokenBucket:
+    """
+    Returns the rate limiter for an API key, creating it on first use. Every caller using the same
+    key shares one bucket, since LiveAgent counts the quota per API key.
+
+    Parameters:
+        - api_key (`str`) - the LiveAgent API key; default is `config.API_KEY`
+
+    Returns:
+        TokenBucket:
+            - the shared limiter for the API key
+    """
+    key = api_key or config.API_KEY or ""
+    if key not in _limiters:
+        _limiters[key] = TokenBucket(
+            rate_per_minute=config.RATE_LIMIT_PER_MINUTE,
+            burst=config.RATE_LIMIT_BURST,
+            max_concurrency=config.MAX_CONCURRENCY
+        )
+    return _limiters[key]
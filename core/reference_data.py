@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import asyncio
+import aiohttp
+import pandas as pd
+from config import config
+from core.liveagent_client import stream_agents, fetch_tags
+
+class ReferenceCache:
+    """
+    Reference data of the LiveAgent API (agents, tags) kept in memory and in a JSON file under
+    `config.REFERENCE_CACHE_DIR`, so every run, chunk and job of a process (and the next process) reuses one
+    fetch. Records older than `ttl` seconds are fetched again; if that fetch fails, the stale records are used.
+    Concurrent callers share one fetch. The caches are module-level, so they can be used from more than one event
+    loop (e.g. consecutive `asyncio.run()` calls in one process); the lock, which asyncio binds to one loop, is
+    created for each loop.
+
+    Parameters:
+        - name (`str`) - the name of the data, used for the file name
+        - fetch (`callable`) - takes the client session and returns the awaitable list of records
+        - ttl (`float`) - seconds the records stay fresh; default is `config.REFERENCE_CACHE_TTL`
+        - root (`str`) - the directory of the file; default is `config.REFERENCE_CACHE_DIR`
+    """
+    def __init__(self, name: str, fetch, ttl: float = None, root: str = None):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = config.REFERENCE_CACHE_TTL if ttl is None else ttl
+        self.path = os.path.join(root or config.REFERENCE_CACHE_DIR, f"{name}.json")
+        self.records = None
+        self.fetched_at = 0.0
+        self._locks = {}
+
+    def _loop_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if loop not in self._locks:
+            # a lock holds on to its loop, so the ones of finished loops are dropped here
+            for closed in [other for other in self._locks if other.is_closed()]:
+                del self._locks[closed]
+            self._locks[loop] = asyncio.Lock()
+        return self._locks[loop]
+
+    def fresh(self) -> bool:
+        return self.records is not None and time.time() - self.fetched_at < self.ttl
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.records = data["records"]
+        self.fetched_at = data["fetched_at"]
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": self.fetched_at, "records": self.records}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    async def get(self, session: aiohttp.ClientSession, refresh: bool = False, stale_ok: bool = True) -> list:
+        """
+        Returns the records, from memory or disk while they are fresh, otherwise from the API.
+
+        Parameters:
+            - session (`aiohttp.ClientSession`) - the client session
+            - refresh (`bool`) - fetch from the API even if the records are fresh; default is `False`
+            - stale_ok (`bool`) - return the cached records if the fetch fails; default is `True`
+
+        Returns:
+            list:
+                - the records
+        """
+        if not refresh and self.fresh():
+            return self.records
+
+        requested_at = time.time()
+        async with self._loop_lock():
+            if self.records is None:
+                self._read()
+            # fetched by another caller while this one was waiting
+            if self.fresh() and (not refresh or self.fetched_at >= requested_at):
+                return self.records
+
+            try:
+                records = await self.fetch(session)
+            except Exception as e:
+                if self.records is None or not stale_ok:
+                    raise
+                print(f"Refreshing {self.name} failed, using the cached ones: {e}")
+                return self.records
+
+            self.records = records
+            self.fetched_at = time.time()
+            self._write()
+            print(f"Fetched {len(records)} {self.name}")
+        return self.records
+
+class AgentLookup(dict):
+    """
+    Agent names by agent ID, as passed to `stream_all_messages()`. Before each ticket, the message workers call
+    `ensure()` with the ticket's agent, which refreshes the lookup when the records expired or the agent is unknown
+    (e.g. a new agent), so a sender is never resolved against an outdated agent list. Refreshes on unknown agents
+    happen at most once per `config.REFERENCE_MISS_REFRESH_INTERVAL` seconds.
+
+    Parameters:
+        - cache (`ReferenceCache`) - the agent records
+    """
+    def __init__(self, cache: ReferenceCache):
+        super().__init__()
+        self.cache = cache
+        self._load(cache.records or [])
+
+    def _load(self, records: list):
+        self.clear()
+        self.update({agent["id"]: agent["name"] for agent in records})
+
+    async def ensure(self, session: aiohttp.ClientSession, *agent_ids: str):
+        """
+        Refreshes the lookup if it expired, or if one of `agent_ids` is unknown and the agents were not fetched
+        within the last `config.REFERENCE_MISS_REFRESH_INTERVAL` seconds.
+        """
+        missing = [agent_id for agent_id in agent_ids if agent_id and agent_id not in self]
+        if missing and time.time() - self.cache.fetched_at >= config.REFERENCE_MISS_REFRESH_INTERVAL:
+            print(f"Unknown agent(s) {missing}, refreshing agents")
+            records = await self.cache.get(session, refresh=True)
+        elif not self.cache.fresh():
+            records = await self.cache.get(session)
+        else:
+            return
+        self._load(records)
+
+async def _fetch_agents(session: aiohttp.ClientSession) -> list:
+    return [agent async for agent in stream_agents(session)]
+
+async def _fetch_tags(session: aiohttp.ClientSession) -> list:
+    tags = await fetch_tags(session)
+    return json.loads(tags.to_json(orient="records"))
+
+_agents = ReferenceCache("agents", _fetch_agents)
+_tags = ReferenceCache("tags", _fetch_tags)
+
+async def get_agent_lookup(session: aiohttp.ClientSession) -> AgentLookup:
+    """
+    Returns:
+        AgentLookup:
+            - agent names by agent ID, from the cache while it is fresh (no API call)
+    """
+    await _agents.get(session)
+    return AgentLookup(_agents)
+
+async def get_tags(session: aiohttp.ClientSession, refresh: bool = False) -> pd.DataFrame:
+    """
+    Parameters:
+        - session (`aiohttp.ClientSession`) - the client session
+        - refresh (`bool`) - fetch from the API even if the cached tags are fresh, failing if the API does;
+        default is `False`
+
+    Returns:
+        pd.DataFrame:
+            - a DataFrame of all tags, like `fetch_tags()`
+    """
+    return pd.DataFrame(await _tags.get(session, refresh, stale_ok=not refresh))
@@ -0,0 +1,108 @@
+import random
+import asyncio
+import aiohttp
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from config import config
+from core.rate_limiter import TokenBucket, get_rate_limiter
+from core.decoders import decode
+
+# 429 is the LiveAgent rate limit; the 5xx codes are transient gateway/server errors worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_EXCEPTIONS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+def parse_retry_after(value: str) -> float:
+    """
+    Parses a `Retry-After` header, which is either a number of seconds or an HTTP date.
+
+    Parameters:
+        - value (`str`) - the header value
+
+    Returns:
+        float:
+            - the number of seconds to wait, or `None` if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def next_delay(previous: float) -> float:
+    """
+    Decorrelated jitter backoff: picks a delay between the base delay and three times the previous delay,
+    capped at `config.RETRY_MAX_DELAY`.
+
+    Parameters:
+        - previous (`float`) - the previous delay in seconds
+
+    Returns:
+        float:
+            - the next delay in seconds
+    """
+    return min(config.RETRY_MAX_DELAY, random.uniform(config.RETRY_BASE_DELAY, previous * 3))
+
+async def request_json(session: aiohttp.ClientSession, url: str, params: dict = None, headers: dict = None, limiter: TokenBucket = None, max_retries: int = None, return_headers: bool = False, decoder=None):
+    """
+    Sends a GET request through the rate limiter and returns the decoded JSON body. Responses with a status in
+    `RETRY_STATUSES` and connection errors are retried with decorrelated jitter backoff, waiting at least as long
+    as the `Retry-After` header asks. A 429 also slows down the limiter (see `TokenBucket.penalize()`), and every
+    success lets it speed up again (see `TokenBucket.reward()`).
+
+    Parameters:
+        - session (`aiohttp.ClientSession`) - the client session
+        - url (`str`) - the API url
+        - params (`dict`) - the query parameters
+        - headers (`dict`) - the header of the request to the API
+        - limiter (`TokenBucket`) - the rate limiter; default is the shared limiter for the `apikey` in `headers`
+        - max_retries (`int`) - retries before giving up; default is `config.MAX_RETRIES`
+        - return_headers (`bool`) - also return the response headers; default is `False`
+        - decoder (`callable`) - decodes the response body (bytes), e.g. a `core.decoders.PageDecoder` keeping only
+        the fields used; default is `core.decoders.decode`
+
+    Returns:
+        The decoded JSON body, or a tuple of the body and the response headers if `return_headers` is set.
+
+    Raises:
+        - `aiohttp.ClientResponseError` - for non-retryable statuses, or when retries run out
+        - `aiohttp.ClientConnectionError` / `asyncio.TimeoutError` - when retries run out
+    """
+    headers = headers or {}
+    limiter = limiter or get_rate_limiter(headers.get("apikey"))
+    max_retries = config.MAX_RETRIES if max_retries is None else max_retries
+    delay = config.RETRY_BASE_DELAY
+    attempt = 0
+
+    while True:
+        retry_after = None
+        try:
+            async with limiter:
+                async with session.get(url, params=params, headers=headers) as res:
+                    if res.status not in RETRY_STATUSES or attempt >= max_retries:
+                        res.raise_for_status()
+                        data = (decoder or decode)(await res.read())
+                        limiter.reward()
+                        return (data, res.headers) if return_headers else data
+
+                    reason = f"HTTP {res.status}"
+                    retry_after = parse_retry_after(res.headers.get("Retry-After"))
+                    if res.status == 429:
+                        limiter.penalize(retry_after)
+        except RETRY_EXCEPTIONS as e:
+            if attempt >= max_retries:
+                raise
+            reason = f"{type(e).__name__}: {e}"
+
+        attempt += 1
+        delay = next_delay(delay)
+        wait = max(delay, retry_after or 0)
+        print(f"Retrying {url} in {wait:.1f}s ({reason}, attempt {attempt}/{max_retries})")
+        await asyncio.sleep(wait)
@@ -0,0 +1,51 @@
+import aiohttp
+from contextlib import asynccontextmanager
+from config import config
+from core.rate_limiter import TokenBucket, get_rate_limiter
+
+def create_session(limiter: TokenBucket = None, compress: bool = None) -> aiohttp.ClientSession:
+    """
+    Creates the long-lived client session used for every LiveAgent request. Connections are kept alive and
+    DNS lookups are cached, and the per-host connection limit matches the concurrency of the rate limiter so
+    no request ever waits on the pool while holding a rate limit slot.
+
+    Must be called from inside a running event loop. Close the session when done, or use it as an async
+    context manager.
+
+    Parameters:
+        - limiter (`TokenBucket`) - the rate limiter the pool is sized for; default is the limiter for `config.API_KEY`
+        - compress (`bool`) - whether to ask for gzip/deflate responses; default is `config.HTTP_COMPRESSION`
+
+    Returns:
+        aiohttp.ClientSession:
+            - the configured client session
+    """
+    limiter = limiter or get_rate_limiter(config.API_KEY)
+    compress = config.HTTP_COMPRESSION if compress is None else compress
+
+    connector = aiohttp.TCPConnector(
+        limit_per_host=limiter.max_concurrency,
+        ttl_dns_cache=config.DNS_CACHE_TTL,
+        keepalive_timeout=config.KEEPALIVE_TIMEOUT
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers={"Accept-Encoding": "gzip, deflate" if compress else "identity"},
+        timeout=aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
+    )
+
+@asynccontextmanager
+async def session_scope(session: aiohttp.ClientSession = None):
+    """
+    Yields the given session, or a new one from `create_session()` that is closed on exit. Lets functions
+    take an optional shared session without owning its lifetime.
+
+    Parameters:
+        - session (`aiohttp.ClientSession`) - a shared session; default is `None`
+    """
+    if session is not None:
+        yield session
+        return
+
+    async with create_session() as new_session:
+        yield new_session
@@ -0,0 +1,23 @@
+from config import config
+from utils.bq_utils import TableSpec
+
+# Messages: dashboards filter by message date, then by ticket, channel or agent
+MESSAGES_TABLE = TableSpec(
+    partition_column="datecreated",
+    partition_expiration_days=config.PARTITION_EXPIRATION_DAYS,
+    cluster_columns=("ticket_id", "channel_type", "agent_name")
+)
+# Tickets: filtered by creation date, then by ticket
+TICKETS_TABLE = TableSpec(
+    partition_column="date_created",
+    partition_expiration_days=config.PARTITION_EXPIRATION_DAYS,
+    cluster_columns=("ticket_id", "owner_name")
+)
+
+# Columns identifying a row of the tickets table, for upserts
+TICKET_KEYS = ["ticket_id"]
+
+TABLE_SPECS = {
+    "messages": MESSAGES_TABLE,
+    "tickets": TICKETS_TABLE,
+}
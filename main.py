@@ -2,17 +2,32 @@ import os
 import json
 import argparse
 import asyncio
-import aiohttp
 import pytz
 import pandas as pd
 from tqdm import tqdm
 from datetime import datetime, timedelta
 
 from config import config
-from utils.bq_utils import generate_schema, load_data_to_bq
-from core.liveagent_client import async_ping, async_agents, async_tickets, fetch_all_messages
+from utils.bq_utils import resolve_schema, load_data_to_bq, load_parquet_to_bq
+from utils.bq_sink import BigQuerySink
+from utils.date_utils import LIVEAGENT_DATE_FORMAT, normalize_datetimes
+from core.liveagent_client import async_ping, async_tickets, stream_tickets, stream_message_frames
+from core.session import create_session
+from core.extraction_spec import ExtractionSpec
+from core.reference_data import get_agent_lookup
+from core.message_columns import MESSAGE_KEYS
+from core.table_specs import MESSAGES_TABLE, TICKETS_TABLE
+from utils.message_cache import MessageCache
+from utils.run_journal import RunJournal, purge_journals
+from utils.rows_file import PartitionedRowsWriter
 
 manila_tz = pytz.timezone('Asia/Manila')
+# Chunk sizes of `--chunk`
+CHUNK_SIZES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(days=7)
+}
 
 def parse_arguments():
     """
@@ -62,45 +77,96 @@ def parse_arguments():
     parser.add_argument(
         "--weekly", "-w",
         action="store_true",
-        help="Split into weekly"
+        help="Split into weekly (same as '--chunk week')"
+    )
+    parser.add_argument(
+        "--chunk", "-ch",
+        choices=list(CHUNK_SIZES),
+        help="Split the range into chunks of an hour, a day or a week, processed concurrently"
+    )
+    parser.add_argument(
+        "--concurrency", "-cc",
+        type=int,
+        default=config.BACKFILL_CONCURRENCY,
+        help=f"Number of chunks processed at once (default: {config.BACKFILL_CONCURRENCY}); all chunks share one API rate limit"
     )
     parser.add_argument(
         "--csv", "-c",
         action="store_true",
         help="Store data into csv file"
     )
+    parser.add_argument(
+        "--parquet", "-pq",
+        action="store_true",
+        help="Store data into Parquet files partitioned by day (in 'parquet/'); without --skip_bq or --merge they are also what is loaded into BigQuery"
+    )
+    parser.add_argument(
+        "--compression", "-cz",
+        choices=["zstd", "snappy", "gzip", "none"],
+        default=config.PARQUET_COMPRESSION,
+        help=f"Compression of the Parquet files (default: {config.PARQUET_COMPRESSION})"
+    )
+    parser.add_argument(
+        "--merge", "-m",
+        action="store_true",
+        help="Upsert messages on (ticket_id, message_id) instead of appending them, so overlapping or repeated ranges do not duplicate rows"
+    )
+    parser.add_argument(
+        "--resume", "-r",
+        type=str,
+        metavar="RUN_ID",
+        help="Resume a failed run: skip the tickets it already fetched and the ranges it already loaded"
+    )
+    parser.add_argument(
+        "--no_cache", "-nc",
+        action="store_true",
+        help="Do not use the on-disk message cache; re-download messages of unchanged tickets"
+    )
     return parser.parse_args()
 
-def get_date(start_date, end_date, days=7):
+def get_chunks(start_date: datetime, end_date: datetime, chunk: str = None):
     """
-    Generates a list of date ranges (as tuples), which breaks a given date range into smaller chunks accessible as attributes.
+    Generates a list of date ranges (as tuples), which breaks the range from `start_date` to the end of `end_date`
+    into smaller chunks.
 
     Parameters:
-        - start_date (`datetime.date`) - the start of the overall date range
-        - end_date (`datetime.date`) - the end of the overall date range
-        - days (`int`) - the number of days in each chunk; default is 7
+        - start_date (`datetime`) - the first day of the overall date range
+        - end_date (`datetime`) - the last day of the overall date range (included)
+        - chunk (`str`) - the size of each chunk, a key of `CHUNK_SIZES`; default is `None` (one chunk)
 
     Returns:
-        `List[Tuple[datetime.date, datetime.date]]`:
-        - a list of tuples, each containing a start and end date representing a chunk of the original date range
+        `List[Tuple[datetime, datetime]]`:
+        - a list of tuples, each containing the start and the last second of a chunk of the original date range
     """
+    range_end = end_date + timedelta(days=1)
+    size = CHUNK_SIZES[chunk] if chunk else range_end - start_date
     chunks = []
     current = start_date
 
-    while current < end_date:
-        next_date = min(current + timedelta(days=days-1), end_date)
-        chunks.append((current, next_date))
-        current = next_date + timedelta(days=1)
+    while current < range_end:
+        next_start = min(current + size, range_end)
+        chunks.append((current, next_start - timedelta(seconds=1)))
+        current = next_start
 
     return chunks
 
-def set_date_filter(start_str: str, end_str: str):
+def chunk_label(start: datetime, end: datetime) -> tuple[str, str]:
+    """
+    Returns:
+        tuple[str, str]:
+            - the start and end of a chunk as used in messages and file names: dates for whole days, otherwise
+            dates with the hour and minute
+    """
+    date_format = "%Y-%m-%d" if start.hour == 0 and end.hour == 23 else "%Y-%m-%d_%H%M"
+    return start.strftime(date_format), end.strftime(date_format)
+
+def set_date_filter(start: datetime, end: datetime):
     """
     Sets the filter of the API request, specifically the date range.
 
     Parameters:
-        - start_str (`str`) - the starting date
-        - end_str (`str`) - the ending date
+        - start (`datetime`) - the start of the range
+        - end (`datetime`) - the end of the range (included)
 
     Returns:
         JSON:
@@ -108,22 +174,17 @@ def set_date_filter(start_str: str, end_str: str):
             `_filters` parameter in the API payload.
     """
     return json.dumps([
-        ["date_created", "D>=", f"{start_str} 00:00:00"],
-        ["date_created", "D<=", f"{end_str} 23:59:59"]
+        ["date_created", "D>=", start.strftime(LIVEAGENT_DATE_FORMAT)],
+        ["date_created", "D<=", end.strftime(LIVEAGENT_DATE_FORMAT)]
     ])
 
-def set_timezone(df: pd.DataFrame, column: str, target_tz: str) -> pd.DataFrame:
-    df[column] = pd.to_datetime(df[column], errors="coerce").dt.tz_localize('UTC')
-    df[column] = df[column].apply(lambda x: x.astimezone(target_tz) if pd.notnull(x) else x)
-    return df
-
-def drop_cols(df: pd.DataFrame):
+def drop_cols(df: pd.DataFrame, keep: list = None):
     try:
         cols_to_drop = ['message_id', 'type', 'agentid']
-        existing = [col for col in cols_to_drop if col in df.columns]
+        existing = [col for col in cols_to_drop if col in df.columns and col not in (keep or [])]
 
         if existing:
-            df.drop(columns=existing, axis=1, inplace=True)
+            df.drop(columns=existing, inplace=True)
         else:
             pass
     except Exception as e:
@@ -131,25 +192,44 @@ def drop_cols(df: pd.DataFrame):
         print(f"Exception: {e}")
     return df
 
-async def process_range(session, args, start_str: str, end_str: str):
+async def process_range(session, args, start: datetime, end: datetime, journal: RunJournal, cache: MessageCache = None, agent_lookup: dict = None):
     """
     Processes a range of dates by fetching ticket data from the API. It either fetches only ticket IDs
     or detailed messages depending on the command-line arguments provided when running the program. The output
     is saved to a CSV file and optionally uploaded to BigQuery with an auto-generated schema.
 
+    Fetched messages are checkpointed in the run journal as they arrive, and the range is loaded from the journal
+    once all its tickets are done; a resumed run skips the tickets already fetched and the ranges already loaded.
+    Checkpointing, transforming, writing and loading run in a worker thread, so the event loop keeps fetching
+    (this range and any other range processed at the same time) in the meantime.
+
     Parameters:
         - session (`aiohttp.ClientSession`) - the client session
         - args (`argparse.Namespace`) - the parsed command-line arguments containing options like `max_pages`, `ids`, or `skip_bq`
-        - start_str (`start_str`) - the start date of the range to process in string format
-        - end_str (`end_str`) - the end date of the range to process in string format
+        - start (`datetime`) - the start of the range to process
+        - end (`datetime`) - the end of the range to process (included)
+        - journal (`RunJournal`) - the checkpoint of the run
+        - cache (`MessageCache`) - serves messages of unchanged tickets from disk; default is `None`
+        - agent_lookup (`dict`) - agent names by ID; default is `get_agent_lookup()`
     
     Returns:
         None
     """
-    config.ticket_payload["_filters"] = set_date_filter(start_str, end_str)
-    tickets_data = await async_tickets(session, max_pages=args.max_pages)
+    start_str, end_str = chunk_label(start, end)
+    spec = ExtractionSpec(
+        filters=set_date_filter(start, end),
+        max_pages=args.max_pages,
+        per_page=args.per_page,
+        message_per_page=args.per_page
+    )
+
+    scope = f"{'ticket_ids' if args.ids else 'messages'}_{start_str}_to_{end_str}"
+    if journal.is_loaded(scope):
+        print(f"Skipping {start_str} to {end_str}, already loaded in run {journal.run_id}")
+        return
 
     if args.ids:
+        tickets_data = await async_tickets(session, max_pages=spec.max_pages, spec=spec)
         ticket_ids = {
             "ticket_id": [],
             "code": [],
@@ -167,52 +247,140 @@ async def process_range(session, args, start_str: str, end_str: str):
             ticket_ids["date_created"].append(tickets_data["ticket_date_created"][i])
             ticket_ids["tags"].append(','.join(tickets_data["tags"][i]))
 
-        df = pd.DataFrame(ticket_ids)
-        df = set_timezone(df, "date_created", manila_tz)
-        df = drop_cols(df)
+        def save_ids():
+            df = pd.DataFrame(ticket_ids)
+            df = normalize_datetimes(df, "date_created", target_tz=manila_tz, keep_tz=True)
+            df = drop_cols(df)
+
+            if args.csv:
+                file_name = os.path.join("csv", f"ticket_ids_{start_str}_to_{end_str}.csv")
+                df.to_csv(file_name, index=False)
+                print(f"Saved ticket IDs to file: {file_name}")
+
+            output = None
+            if args.parquet:
+                with PartitionedRowsWriter(os.path.join("parquet", "ticket_ids"), "date_created", f"{start_str}_to_{end_str}", compression=args.compression) as output:
+                    output.write(df)
+                print(f"Saved ticket IDs to {len(output.paths)} Parquet file(s) in {output.root}")
+
+            if not args.skip_bq:
+                print("Generating schema and uploading to BigQuery...")
+                schema = resolve_schema(df, config.GCLOUD_PROJECT_ID, config.BQ_DATASET_NAME, config.BQ_TABLE_NAME)
+                if output:
+                    # the Parquet files are loaded as they are, instead of uploading the DataFrame again
+                    load_parquet_to_bq(output.paths, config.GCLOUD_PROJECT_ID, config.BQ_DATASET_NAME, config.BQ_TABLE_NAME, "WRITE_APPEND", schema, TICKETS_TABLE)
+                    return
+                load_data_to_bq(
+                    df,
+                    config.GCLOUD_PROJECT_ID,
+                    config.BQ_DATASET_NAME,
+                    config.BQ_TABLE_NAME,
+                    "WRITE_APPEND",
+                    schema=schema,
+                    spec=TICKETS_TABLE
+                )
+
+        await asyncio.to_thread(save_ids)
+        journal.mark_loaded(scope)
+        return
+
+    if agent_lookup is None:
+        agent_lookup = await get_agent_lookup(session)
 
-        if args.csv:
-            file_name = os.path.join("csv", f"ticket_ids_{start_str}_to_{end_str}.csv")
-            df.to_csv(file_name, index=False)
-            print(f"Saved ticket IDs to file: {file_name}")
+    tickets = journal.pending(scope, stream_tickets(session, spec.ticket_payload(), max_pages=spec.max_pages))
+    # each batch is checkpointed as soon as it is built, so a failure never loses the tickets already fetched
+    async for df in stream_message_frames(session, tickets, agent_lookup, max_pages=spec.max_pages, cache=cache, spec=spec):
+        await asyncio.to_thread(journal.add_frame, scope, df)
 
-        if not args.skip_bq:
-            print("Generating schema and uploading to BigQuery...")
-            schema = generate_schema(df)
-            load_data_to_bq(
-                df,
+    def load():
+        file_name = os.path.join("csv", f"messages_{start_str}_to_{end_str}.csv")
+        output = None
+        if args.parquet:
+            output = PartitionedRowsWriter(os.path.join("parquet", "messages"), "datecreated", f"{start_str}_to_{end_str}", compression=args.compression)
+        # with --parquet, appends load the files written below instead of uploading the DataFrames
+        parquet_load = output is not None and not args.skip_bq and not args.merge
+        schema = None
+
+        sink = None
+        if not args.skip_bq and not parquet_load:
+            sink = BigQuerySink(
                 config.GCLOUD_PROJECT_ID,
                 config.BQ_DATASET_NAME,
                 config.BQ_TABLE_NAME,
-                "WRITE_APPEND",
-                schema=schema
+                "MERGE" if args.merge else "WRITE_APPEND",
+                merge_keys=MESSAGE_KEYS,
+                spec=MESSAGES_TABLE
             )
-        return
 
-    agents_data = await async_agents(session)
-    agent_lookup = dict(zip(agents_data["id"], agents_data["name"]))
+        # batches are read back one at a time, so the whole range is never held in memory
+        batches = 0
+        for df in journal.frames(scope):
+            df = normalize_datetimes(df, "datecreated", "ticket_date_created", target_tz=manila_tz, keep_tz=True)
+            df = drop_cols(df, keep=MESSAGE_KEYS if args.merge else None)
+
+            if args.csv:
+                df.to_csv(file_name, index=False, mode="w" if batches == 0 else "a", header=batches == 0)
+            if output:
+                output.write(df)
+            if parquet_load and schema is None and not df.empty:
+                schema = resolve_schema(df, config.GCLOUD_PROJECT_ID, config.BQ_DATASET_NAME, config.BQ_TABLE_NAME)
+            if sink:
+                sink.write(df)
+            batches += 1
+
+        if args.csv and batches:
+            print(f"Saved output to: {file_name}")
+
+        if output:
+            output.close()
+            print(f"Saved {output.rows} messages to {len(output.paths)} Parquet file(s) in {output.root}")
+            if parquet_load and output.paths:
+                result = load_parquet_to_bq(output.paths, config.GCLOUD_PROJECT_ID, config.BQ_DATASET_NAME, config.BQ_TABLE_NAME, "WRITE_APPEND", schema, MESSAGES_TABLE)
+                if not result.startswith("Loaded"):
+                    raise RuntimeError(result)
+
+        if sink:
+            print(sink.close())
+
+    await asyncio.to_thread(load)
+    journal.mark_loaded(scope)
+
+async def process_chunks(session, args, chunks: list, journal: RunJournal, cache: MessageCache = None, agent_lookup: dict = None) -> list:
+    """
+    Processes date chunks concurrently, at most `args.concurrency` at a time. Every chunk goes through the same
+    session and rate limiter, so together they never exceed the API quota; while one chunk is being converted or
+    loaded into BigQuery, the others keep fetching. A failed chunk does not stop the others.
 
-    df = await fetch_all_messages(tickets_data, agent_lookup, max_pages=args.max_pages)
-    df = set_timezone(df, "datecreated", manila_tz)
-    df = set_timezone(df, "ticket_date_created", manila_tz)
-    df = drop_cols(df)
+    Parameters:
+        - session (`aiohttp.ClientSession`) - the client session
+        - args (`argparse.Namespace`) - the parsed command-line arguments
+        - chunks (`list`) - the `(start, end)` tuples of `get_chunks()`
+        - journal (`RunJournal`) - the checkpoint of the run
+        - cache (`MessageCache`) - serves messages of unchanged tickets from disk; default is `None`
+        - agent_lookup (`dict`) - agent names by ID, shared by every chunk; default is `get_agent_lookup()` per chunk
 
-    if args.csv:
-        file_name = os.path.join("csv", f"messages_{start_str}_to_{end_str}.csv")
-        df.to_csv(file_name, index=False)
-        print(f"Saved output to: {file_name}")
-    
-    if not args.skip_bq:
-        print("Generating schema and uploading to BigQuery...")
-        schema = generate_schema(df)
-        load_data_to_bq(
-            df,
-            config.GCLOUD_PROJECT_ID,
-            config.BQ_DATASET_NAME,
-            config.BQ_TABLE_NAME,
-            "WRITE_APPEND",
-            schema=schema
-        )
+    Returns:
+        list:
+            - the `(start, end)` tuples of the chunks that failed
+    """
+    slots = asyncio.Semaphore(max(1, args.concurrency))
+
+    async def run(start: datetime, end: datetime):
+        async with slots:
+            start_str, end_str = chunk_label(start, end)
+            print(f"\nProcessing {start_str} to {end_str}...")
+            await process_range(session, args, start, end, journal, cache, agent_lookup)
+            print(f"Finished {start_str} to {end_str}")
+
+    results = await asyncio.gather(*(run(start, end) for start, end in chunks), return_exceptions=True)
+
+    failed = []
+    for (start, end), result in zip(chunks, results):
+        if isinstance(result, Exception):
+            start_str, end_str = chunk_label(start, end)
+            print(f"Failed {start_str} to {end_str}: {result}")
+            failed.append((start, end))
+    return failed
 
 async def main():
     """
@@ -224,10 +392,6 @@ async def main():
         print("Error: You must provide either --date or both --start_date and --end_date.")
         return
 
-    config.ticket_payload["_page"] = args.max_pages
-    config.ticket_payload["_perPage"] = args.per_page
-    config.messages_payload["_perPage"] = args.per_page
-
     os.makedirs("csv", exist_ok=True)
 
     if args.date:
@@ -236,7 +400,19 @@ async def main():
         start_date = datetime.strptime(args.start_date, "%Y-%m-%d")
         end_date = datetime.strptime(args.end_date, "%Y-%m-%d")
 
-    async with aiohttp.ClientSession() as session:
+    chunks = get_chunks(start_date, end_date, args.chunk or ("week" if args.weekly else None))
+
+    purge_journals()
+    try:
+        journal = RunJournal(args.resume)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        exit(1)
+    print(f"{'Resuming' if journal.resumed else 'Starting'} run {journal.run_id}")
+
+    cache = None if args.no_cache else MessageCache()
+
+    async with create_session() as session:
         success, ping_response = await async_ping(session)
         if not success:
             print("Ping failed: ", ping_response)
@@ -244,17 +420,19 @@ async def main():
         
         print(f"Ping to {config.base_url} successful.")
 
-        if args.weekly:
-            chunks = get_date(start_date, end_date)
-            for chunk_start, chunk_end in chunks:
-                start_str = chunk_start.strftime("%Y-%m-%d")
-                end_str = chunk_end.strftime("%Y-%m-%d")
-                print(f"\nProcessing {start_str} to {end_str}...")
-                await process_range(session, args, start_str, end_str)
-        else:
-            start_str = start_date.strftime("%Y-%m-%d")
-            end_str = end_date.strftime("%Y-%m-%d")
-            await process_range(session, args, start_str, end_str)
+        agent_lookup = None if args.ids else await get_agent_lookup(session)
+
+        failed = await process_chunks(session, args, chunks, journal, cache, agent_lookup)
+
+    if cache:
+        cache.close()
+
+    if failed:
+        print(f"{len(failed)} of {len(chunks)} chunk(s) failed.")
+        print(f"Re-run with the same arguments and '--resume {journal.run_id}' to continue where it stopped.")
+        exit(1)
+
+    journal.remove()
 
 # if __name__ == "__main__":
 asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,49 @@
+import argparse
+
+from config import config
+from utils.bq_utils import get_client, migrate_table
+from core.table_specs import TABLE_SPECS
+
+def parse_arguments():
+    """
+    Defines and parses the command-line arguments for the script. Use `-h` to output the help page.
+
+    Returns:
+        - `argparse.Namespace` - an object containing the values of the parsed command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Partition and cluster existing BigQuery tables.")
+    parser.add_argument(
+        "--table", "-t",
+        required=True,
+        help="Name of the table in the configured dataset"
+    )
+    parser.add_argument(
+        "--spec", "-s",
+        choices=sorted(TABLE_SPECS),
+        default="messages",
+        help="Layout to migrate the table to (default: messages)"
+    )
+    parser.add_argument(
+        "--dry_run", "-dr",
+        action="store_true",
+        help="Only print what would be done"
+    )
+    return parser.parse_args()
+
+def main():
+    """
+    Main entry point for the program.
+    """
+    args = parse_arguments()
+    client = get_client()['client']
+    print(migrate_table(
+        config.GCLOUD_PROJECT_ID,
+        config.BQ_DATASET_NAME,
+        args.table,
+        TABLE_SPECS[args.spec],
+        client,
+        dry_run=args.dry_run
+    ))
+
+if __name__ == "__main__":
+    main()
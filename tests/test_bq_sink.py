@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+from utils import bq_utils
+from utils.bq_sink import BigQuerySink
+from benchmarks.fake_bigquery import FakeBigQueryClient
+
+class RecordingClient(FakeBigQueryClient):
+    """
+    Records the write disposition of every load, and fails the loads while `fail` is set.
+    """
+    def __init__(self):
+        super().__init__()
+        self.dispositions = []
+        self.fail = False
+
+    def load_table_from_dataframe(self, df, table_id, job_config=None):
+        if self.fail:
+            raise RuntimeError("load failed")
+        self.dispositions.append(job_config.write_disposition)
+        return super().load_table_from_dataframe(df, table_id, job_config)
+
+@pytest.fixture(autouse=True)
+def fresh_metadata(monkeypatch):
+    bq_utils.invalidate_metadata()
+    monkeypatch.setattr(bq_utils, "_schemas", {})
+    yield
+    bq_utils.invalidate_metadata()
+
+def batch(start: int, rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "ticket_id": [f"t{i}" for i in range(start, start + rows)],
+        "message_id": [f"m{i}" for i in range(start, start + rows)],
+        "message": ["Hello, I would like to book a service."] * rows,
+    })
+
+def new_sink(client: FakeBigQueryClient, write_mode: str = "WRITE_TRUNCATE", **kwargs) -> BigQuerySink:
+    kwargs.setdefault("max_rows", 10 ** 6)
+    kwargs.setdefault("max_bytes", 10 ** 9)
+    return BigQuerySink("p", "d", "messages", write_mode, client=client, **kwargs)
+
+def test_flushes_when_max_rows_is_reached():
+    client = RecordingClient()
+    sink = new_sink(client, max_rows=10)
+
+    sink.write(batch(0, 6))
+    assert sink.flushes == 0
+    sink.write(batch(6, 6))
+    assert sink.flushes == 1
+    assert sink.buffered_rows == 0
+    assert client.stats["rows"] == 12
+
+def test_flushes_when_max_bytes_is_reached():
+    client = RecordingClient()
+    first = batch(0, 5)
+    size = int(first.memory_usage(index=False, deep=True).sum())
+    sink = new_sink(client, max_bytes=size * 2)
+
+    sink.write(first)
+    assert sink.flushes == 0
+    sink.write(batch(5, 5))
+    assert sink.flushes == 1
+    assert sink.buffered_bytes == 0
+
+def test_only_the_first_flush_uses_the_write_mode():
+    client = RecordingClient()
+    with new_sink(client, "WRITE_TRUNCATE", max_rows=4) as sink:
+        for start in range(0, 12, 4):
+            sink.write(batch(start, 4))
+
+    assert client.dispositions == ["WRITE_TRUNCATE", "WRITE_APPEND", "WRITE_APPEND"]
+    assert sink.loaded_rows == 12
+
+def test_failed_flush_keeps_the_buffer():
+    client = RecordingClient()
+    sink = new_sink(client, max_rows=5)
+
+    client.fail = True
+    with pytest.raises(RuntimeError):
+        sink.write(batch(0, 5))
+    assert sink.flushes == 0
+    assert sink.buffered_rows == 5
+    assert len(sink.buffer) == 1
+
+    client.fail = False
+    sink.close()
+    assert sink.loaded_rows == 5
+    # the retried flush is still the first one
+    assert client.dispositions == ["WRITE_TRUNCATE"]
+
+def test_exit_does_not_retry_a_failed_flush():
+    client = RecordingClient()
+    client.fail = True
+    attempts = []
+    original = client.load_table_from_dataframe
+
+    def load(df, table_id, job_config=None):
+        attempts.append(len(df))
+        return original(df, table_id, job_config)
+
+    client.load_table_from_dataframe = load
+    with pytest.raises(RuntimeError, match="load failed"):
+        with new_sink(client, max_rows=5) as sink:
+            sink.write(batch(0, 5))
+
+    assert attempts == [5]
+    assert sink.buffered_rows == 5
+
+def test_exit_flushes_on_other_errors():
+    client = RecordingClient()
+    with pytest.raises(KeyError):
+        with new_sink(client) as sink:
+            sink.write(batch(0, 3))
+            raise KeyError("ticket_id")
+
+    assert sink.loaded_rows == 3
+    assert client.stats["rows"] == 3
@@ -0,0 +1,28 @@
+import pandas as pd
+import pytz
+from utils.date_utils import normalize_datetimes
+
+manila_tz = pytz.timezone("Asia/Manila")
+
+def test_converts_utc_to_naive_local_time():
+    df = pd.DataFrame({"datecreated": ["2025-01-02 03:04:05", None]})
+    df = normalize_datetimes(df, "datecreated", target_tz=manila_tz)
+
+    assert df["datecreated"][0] == pd.Timestamp("2025-01-02 11:04:05")
+    assert pd.isna(df["datecreated"][1])
+    assert df["datecreated"].dt.tz is None
+
+def test_falls_back_for_values_with_an_offset():
+    df = pd.DataFrame({"datecreated": ["2025-01-02 03:04:05", "2025-01-02T03:04:05Z", "2025-01-02T11:04:05+08:00", "2025-01-02", "not a date"]})
+    df = normalize_datetimes(df, "datecreated", target_tz=manila_tz)
+
+    assert list(df["datecreated"][:3]) == [pd.Timestamp("2025-01-02 11:04:05")] * 3
+    assert df["datecreated"][3] == pd.Timestamp("2025-01-02 08:00:00")
+    assert pd.isna(df["datecreated"][4])
+
+def test_keep_tz():
+    df = pd.DataFrame({"datecreated": ["2025-01-02T03:04:05Z"]})
+    df = normalize_datetimes(df, "datecreated", "missing", target_tz=manila_tz, keep_tz=True)
+
+    assert str(df["datecreated"].dt.tz) == "Asia/Manila"
+    assert df["datecreated"][0] == pd.Timestamp("2025-01-02 03:04:05", tz="UTC")
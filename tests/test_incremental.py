@@ -0,0 +1,131 @@
+import asyncio
+import pandas as pd
+import pytest
+from core import incremental
+from core.incremental import IncrementalRun
+from utils.state_store import WatermarkStore
+
+class MemoryStore(WatermarkStore):
+    def __init__(self, watermark: str = None, marks: dict = None):
+        self.watermarks = {("tickets", "date_changed"): watermark} if watermark else {}
+        self.marks = marks or {}
+
+    def get_watermark(self, namespace: str, name: str) -> str:
+        return self.watermarks.get((namespace, name))
+
+    def set_watermark(self, namespace: str, name: str, value: str):
+        self.watermarks[(namespace, name)] = value
+
+    def get_ticket_marks(self, namespace: str, ticket_ids: list) -> dict:
+        return {ticket_id: self.marks[ticket_id] for ticket_id in ticket_ids if ticket_id in self.marks}
+
+    def set_ticket_marks(self, namespace: str, marks: dict):
+        for ticket_id, mark in marks.items():
+            stored = self.marks.setdefault(ticket_id, {})
+            stored.update({key: value for key, value in mark.items() if value is not None})
+
+def ticket(ticket_id: str, date_changed: str) -> dict:
+    return {"id": ticket_id, "date_created": "2025-01-01 08:00:00", "date_changed": date_changed}
+
+@pytest.fixture
+def listing(monkeypatch):
+    """
+    Serves `listing.tickets` as the ticket list, `listing.per_page` per page, and records the payloads.
+    """
+    class Listing:
+        tickets = []
+        per_page = 2
+        payloads = []
+
+    async def iter_pages(session, url, payload, max_pages, headers, prefetch=0, decoder=None):
+        Listing.payloads.append(payload)
+        for page in range(max_pages):
+            records = Listing.tickets[page * Listing.per_page:(page + 1) * Listing.per_page]
+            if not records:
+                return
+            yield records
+            if len(records) < Listing.per_page:
+                return
+
+    monkeypatch.setattr(incremental, "async_iter_pages", iter_pages)
+    return Listing
+
+def list_changed(run: IncrementalRun, per_page: int, max_pages: int = 10) -> list:
+    async def collect():
+        return [t async for t in run.changed_tickets(None, {"_page": 1, "_perPage": per_page}, max_pages)]
+    return asyncio.run(collect())
+
+def test_skips_unchanged_tickets_and_hands_off_since(listing):
+    listing.tickets = [ticket("t1", "2025-01-02 10:00:00"), ticket("t2", "2025-01-02 11:00:00"), ticket("t3", "2025-01-02 12:00:00")]
+    store = MemoryStore("2025-01-02 10:00:00", {
+        "t1": {"date_changed": "2025-01-02 10:00:00", "last_message_date": "2025-01-02 09:00:00", "last_message_id": "m1"},
+        "t2": {"date_changed": "2025-01-02 09:00:00", "last_message_date": "2025-01-02 08:30:00", "last_message_id": "m2"},
+    })
+    run = IncrementalRun(store, "tickets")
+
+    tickets = list_changed(run, listing.per_page)
+
+    assert [t["id"] for t in tickets] == ["t2", "t3"]
+    assert run.skipped == 1
+    assert (tickets[0]["since"], tickets[0]["since_id"]) == ("2025-01-02 08:30:00", "m2")
+    assert (tickets[1]["since"], tickets[1]["since_id"]) == (None, None)
+    assert listing.payloads[0]["_sortField"] == "date_changed"
+    assert listing.payloads[0]["_sortDir"] == "ASC"
+
+def test_commit_stores_marks_and_moves_the_watermark(listing):
+    listing.tickets = [ticket("t1", "2025-01-02 10:00:00"), ticket("t2", "2025-01-02 11:00:00"), ticket("t3", "2025-01-02 12:00:00")]
+    store = MemoryStore("2025-01-02 09:00:00")
+    run = IncrementalRun(store, "tickets")
+    list_changed(run, listing.per_page)
+
+    run.commit(pd.DataFrame({
+        "ticket_id": ["t1", "t1", "t3"],
+        "datecreated": ["2025-01-02 09:58:00", "2025-01-02 09:59:00", "2025-01-02 11:59:00"],
+        "message_id": ["m1", "m2", "m3"],
+    }))
+
+    assert store.get_watermark("tickets", "date_changed") == "2025-01-02 12:00:00"
+    assert store.marks["t1"] == {"date_changed": "2025-01-02 10:00:00", "last_message_date": "2025-01-02 09:59:00", "last_message_id": "m2"}
+    assert store.marks["t2"] == {"date_changed": "2025-01-02 11:00:00"}
+
+    # the next run continues from the marks
+    rerun = IncrementalRun(store, "tickets")
+    tickets = list_changed(rerun, listing.per_page)
+    assert tickets == []
+    assert rerun.skipped == 3
+
+def test_cut_off_list_moves_the_watermark_to_the_last_ticket_listed(listing):
+    listing.tickets = [ticket(f"t{i}", f"2025-01-02 1{i}:00:00") for i in range(6)]
+    store = MemoryStore("2025-01-02 09:00:00")
+    run = IncrementalRun(store, "tickets")
+
+    tickets = list_changed(run, listing.per_page, max_pages=2)
+    run.commit()
+
+    assert len(tickets) == 4
+    assert not run.complete
+    assert store.get_watermark("tickets", "date_changed") == "2025-01-02 13:00:00"
+
+def test_cut_off_unsorted_list_keeps_the_watermark(listing):
+    listing.tickets = [ticket("t1", "2025-01-02 12:00:00"), ticket("t2", "2025-01-02 10:00:00"), ticket("t3", "2025-01-02 11:00:00")]
+    store = MemoryStore("2025-01-02 09:00:00")
+    run = IncrementalRun(store, "tickets")
+
+    list_changed(run, listing.per_page, max_pages=1)
+    run.commit()
+
+    assert not run.ordered
+    assert store.get_watermark("tickets", "date_changed") == "2025-01-02 09:00:00"
+    # the tickets listed are still marked, so the next run skips them
+    assert store.marks["t1"]["date_changed"] == "2025-01-02 12:00:00"
+
+def test_unsorted_list_listed_to_the_end_moves_the_watermark(listing):
+    listing.tickets = [ticket("t1", "2025-01-02 12:00:00"), ticket("t2", "2025-01-02 10:00:00"), ticket("t3", "2025-01-02 11:00:00")]
+    store = MemoryStore()
+    run = IncrementalRun(store, "tickets")
+
+    list_changed(run, listing.per_page)
+    run.commit()
+
+    assert run.complete
+    assert store.get_watermark("tickets", "date_changed") == "2025-01-02 12:00:00"
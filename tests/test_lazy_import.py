@@ -0,0 +1,35 @@
+import sys
+import threading
+from utils.lazy_import import lazy_import
+
+def test_first_use_from_many_threads(tmp_path, monkeypatch):
+    # a module whose import is slow enough for the threads to overlap
+    (tmp_path / "slow_module.py").write_text(
+        "import time\n"
+        "IMPORTS = globals().get('IMPORTS', 0) + 1\n"
+        "time.sleep(0.2)\n"
+        "VALUE = 42\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "slow_module", raising=False)
+
+    module = lazy_import("slow_module")
+    assert "slow_module" not in sys.modules
+
+    results, errors = [], []
+    def use():
+        try:
+            results.append(module.VALUE)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert results == [42] * 8
+    assert module.IMPORTS == 1
+    assert sys.modules["slow_module"].VALUE == 42
@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+from config import config
+from core import rate_limiter
+from core.rate_limiter import get_rate_limiter
+
+@pytest.fixture(autouse=True)
+def fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_MINUTE", 60000)
+    monkeypatch.setattr(config, "RATE_LIMIT_BURST", 100)
+    monkeypatch.setattr(config, "MAX_CONCURRENCY", 4)
+
+async def use_limiter(requests: int) -> int:
+    """
+    Sends `requests` concurrent dummy requests through the shared limiter and returns the most in flight at once.
+    """
+    in_flight = peak = 0
+
+    async def request():
+        nonlocal in_flight, peak
+        async with get_rate_limiter("k"):
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+
+    await asyncio.gather(*(request() for _ in range(requests)))
+    return peak
+
+def test_shared_limiter_works_across_event_loops():
+    assert asyncio.run(use_limiter(30)) == 4
+    # a second loop in the same process reuses the limiter
+    assert asyncio.run(use_limiter(30)) == 4
+
+    limiter = get_rate_limiter("k")
+    assert len(limiter._primitives) == 1
+
+def test_limiters_are_shared_per_api_key():
+    assert get_rate_limiter("k") is get_rate_limiter("k")
+    assert get_rate_limiter("k") is not get_rate_limiter("other")
@@ -0,0 +1,33 @@
+import asyncio
+from core.reference_data import ReferenceCache
+
+def test_cache_works_across_event_loops(tmp_path):
+    fetches = []
+
+    async def fetch(session):
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        return [{"id": "a1", "name": "Agent 1"}]
+
+    cache = ReferenceCache("agents", fetch, ttl=3600, root=str(tmp_path))
+
+    async def get_concurrently(refresh: bool):
+        return await asyncio.gather(*(cache.get(None, refresh=refresh) for _ in range(5)))
+
+    # concurrent callers share one fetch, in every loop
+    assert asyncio.run(get_concurrently(False)) == [[{"id": "a1", "name": "Agent 1"}]] * 5
+    assert len(fetches) == 1
+    assert asyncio.run(get_concurrently(True))[0] == [{"id": "a1", "name": "Agent 1"}]
+    assert len(fetches) == 2
+    assert len(cache._locks) == 1
+
+def test_cache_is_read_from_disk(tmp_path):
+    async def fetch(session):
+        return [{"id": "t1", "name": "Tag 1"}]
+
+    asyncio.run(ReferenceCache("tags", fetch, root=str(tmp_path)).get(None))
+
+    async def fail(session):
+        raise AssertionError("fetched again")
+
+    assert asyncio.run(ReferenceCache("tags", fail, root=str(tmp_path)).get(None)) == [{"id": "t1", "name": "Tag 1"}]
@@ -0,0 +1,100 @@
+import time
+import asyncio
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from config import config
+from core.rate_limiter import TokenBucket
+from core.retry import request_json
+
+RETRY_AFTER = 1
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(config, "RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(config, "RETRY_MAX_DELAY", 0.05)
+
+def flaky_app(statuses: list) -> tuple[web.Application, list]:
+    """
+    An app whose `/tickets` answers with `statuses` in turn, then 200 with a ticket list.
+    """
+    hits = []
+
+    async def tickets(request: web.Request) -> web.Response:
+        hits.append(time.monotonic())
+        status = statuses[len(hits) - 1] if len(hits) <= len(statuses) else 200
+        if status == 429:
+            return web.json_response({"message": "Too many requests"}, status=429, headers={"Retry-After": str(RETRY_AFTER)})
+        if status != 200:
+            return web.json_response({"message": "Error"}, status=status)
+        return web.json_response([{"id": "t1"}])
+
+    app = web.Application()
+    app.router.add_get("/tickets", tickets)
+    return app, hits
+
+async def fetch(app: web.Application, limiter: TokenBucket, **kwargs):
+    async with TestServer(app) as server:
+        async with aiohttp.ClientSession() as session:
+            return await request_json(session, str(server.make_url("/tickets")), limiter=limiter, **kwargs)
+
+def new_limiter() -> TokenBucket:
+    return TokenBucket(rate_per_minute=610, burst=10, max_concurrency=2)
+
+def test_retries_429_and_503_until_success():
+    app, hits = flaky_app([429, 503])
+    limiter = new_limiter()
+
+    start = time.monotonic()
+    data = asyncio.run(fetch(app, limiter))
+
+    assert data == [{"id": "t1"}]
+    assert len(hits) == 3
+    # the retry after the 429 waits at least as long as Retry-After asks
+    assert hits[1] - hits[0] >= RETRY_AFTER
+    assert time.monotonic() - start >= RETRY_AFTER
+
+def test_429_halves_the_rate_and_successes_restore_it():
+    app, _ = flaky_app([429])
+    limiter = new_limiter()
+
+    asyncio.run(fetch(app, limiter))
+
+    assert limiter.rate == pytest.approx(limiter.max_rate / 2)
+    assert limiter.successes == 1
+
+    for _ in range(19):
+        limiter.reward()
+    assert limiter.rate == pytest.approx(limiter.max_rate / 2 + limiter.max_rate / 10)
+
+    for _ in range(20 * 10):
+        limiter.reward()
+    assert limiter.rate == pytest.approx(limiter.max_rate)
+
+def test_penalize_stops_at_a_tenth_of_the_rate():
+    limiter = new_limiter()
+    for _ in range(10):
+        limiter.penalize()
+    assert limiter.rate == pytest.approx(limiter.min_rate)
+    assert limiter.tokens == 0
+
+def test_client_error_is_not_retried():
+    app, hits = flaky_app([404])
+    limiter = new_limiter()
+
+    with pytest.raises(aiohttp.ClientResponseError) as e:
+        asyncio.run(fetch(app, limiter))
+
+    assert e.value.status == 404
+    assert len(hits) == 1
+
+def test_gives_up_after_max_retries():
+    app, hits = flaky_app([503] * 5)
+    limiter = new_limiter()
+
+    with pytest.raises(aiohttp.ClientResponseError) as e:
+        asyncio.run(fetch(app, limiter, max_retries=2))
+
+    assert e.value.status == 503
+    assert len(hits) == 3
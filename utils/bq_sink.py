@@ -0,0 +1,128 @@
+import pandas as pd
+
+from config import config
+from utils.bq_utils import bigquery, TableSpec, get_client, resolve_schema, run_load_job, run_merge_job
+
+class BigQuerySink:
+    """
+    Loads DataFrame batches into a BigQuery table as they are produced, instead of one load at the end of a run.
+    Batches are buffered and flushed as a Parquet load job (`load_table_from_dataframe()`) once the buffer reaches
+    `max_rows` rows or `max_bytes` bytes, so memory stays bounded and a crash mid-run keeps every batch flushed so far.
+
+    The first flush uses `write_mode`; later flushes append. With `write_mode="MERGE"` every flush is upserted on
+    `merge_keys` instead (see `run_merge_job()`), so re-loading rows never duplicates them. If no `schema` is given
+    it is resolved against the table for every flush (see `resolve_schema()`, cached per table).
+
+    Usage:
+        ```
+        with BigQuerySink(project_id, dataset_name, table_name, "WRITE_TRUNCATE") as sink:
+            async for df in stream_message_frames(...):
+                sink.write(df)
+        ```
+
+    Parameters:
+        - project_id (`str`) - the GCP project
+        - dataset_name (`str`) - the dataset
+        - table_name (`str`) - the table
+        - write_mode (`str`) - the write disposition of the first flush, or `"MERGE"`; default is `"WRITE_APPEND"`
+        - schema (`list[SchemaField]`) - the table schema; default is resolved with `resolve_schema()`
+        - max_rows (`int`) - rows buffered before a flush; default is `config.BQ_SINK_MAX_ROWS`
+        - max_bytes (`int`) - bytes buffered before a flush; default is `config.BQ_SINK_MAX_BYTES`
+        - merge_keys (`list[str]`) - the key columns of a `"MERGE"`; default is `None`
+        - spec (`TableSpec`) - the partitioning and clustering of a new table; default is `None`
+        - client (`bigquery.Client`) - the client to load with; default is `config.BQ_CLIENT`. Any object with the
+        same `get_dataset`/`create_dataset`/`get_table`/`create_table`/`update_table`/`load_table_from_dataframe`
+        (plus `query`/`delete_table` for `"MERGE"`) methods works, e.g. a fake client for local runs.
+    """
+    def __init__(self, project_id: str, dataset_name: str, table_name: str, write_mode: str = "WRITE_APPEND", schema: list = None, max_rows: int = None, max_bytes: int = None, merge_keys: list = None, spec: TableSpec = None, client=None):
+        self.project_id = project_id
+        self.dataset_name = dataset_name
+        self.table_name = table_name
+        self.table_id = f"{project_id}.{dataset_name}.{table_name}"
+        self.write_mode = write_mode
+        self.schema = schema
+        self.max_rows = max_rows or config.BQ_SINK_MAX_ROWS
+        self.max_bytes = max_bytes or config.BQ_SINK_MAX_BYTES
+        self.merge_keys = merge_keys
+        self.spec = spec
+        self.client = client or get_client()['client']
+
+        self.buffer = []
+        self.buffered_rows = 0
+        self.buffered_bytes = 0
+        self.loaded_rows = 0
+        self.flushes = 0
+        self.flush_error = None
+
+    def write(self, df: pd.DataFrame):
+        """
+        Buffers a batch, flushing if the buffer is full.
+
+        Parameters:
+            - df (`pd.DataFrame`) - the batch; every batch must have the same columns
+        """
+        if df.empty:
+            return
+
+        self.buffer.append(df)
+        self.buffered_rows += len(df)
+        self.buffered_bytes += int(df.memory_usage(index=False, deep=True).sum())
+
+        if self.buffered_rows >= self.max_rows or self.buffered_bytes >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        """
+        Loads the buffered batches as one load job. Raises if the job fails; the buffer is kept in that case.
+        """
+        if not self.buffer:
+            return
+
+        df = pd.concat(self.buffer, ignore_index=True) if len(self.buffer) > 1 else self.buffer[0]
+        first = self.flushes == 0
+
+        try:
+            schema = self.schema or resolve_schema(df, self.project_id, self.dataset_name, self.table_name, self.client)
+            if self.write_mode == "MERGE":
+                run_merge_job(
+                    df, self.project_id, self.dataset_name, self.table_name, self.client,
+                    self.merge_keys, self.spec, schema
+                )
+            else:
+                job_config = bigquery.LoadJobConfig(
+                    schema=schema,
+                    write_disposition=self.write_mode if first else "WRITE_APPEND",
+                )
+                run_load_job(df, self.project_id, self.dataset_name, self.table_name, self.client, job_config, schema, self.spec)
+        except Exception as e:
+            # remembered so `__exit__` does not retry the flush that just failed
+            self.flush_error = e
+            raise
+
+        self.flushes += 1
+        self.loaded_rows += len(df)
+        print(f"Flushed {len(df)} rows into {self.table_id} ({self.loaded_rows} so far)")
+
+        self.buffer = []
+        self.buffered_rows = 0
+        self.buffered_bytes = 0
+
+    def close(self) -> str:
+        """
+        Flushes whatever is left in the buffer.
+
+        Returns:
+            str:
+                - a summary like the one returned by `load_data_to_bq()`
+        """
+        self.flush()
+        return f"Loaded {self.loaded_rows} rows into {self.table_id}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # flush on errors too, so everything fetched before a crash is kept, unless the error is a failed flush:
+        # retrying it would fail the same way and hide the original error
+        if exc is None or exc is not self.flush_error:
+            self.flush()
@@ -1,10 +1,21 @@
+from __future__ import annotations
+
+import time
+import uuid
+import threading
 import pandas as pd
-from google.cloud import bigquery
-from google.cloud.exceptions import NotFound
-from google.cloud.bigquery import SchemaField
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from typing import List
 
 from config import config
+from utils.lazy_import import lazy_import
+
+# The Google Cloud SDK is only imported once a BigQuery object is actually used
+bigquery = lazy_import("google.cloud.bigquery")
+exceptions = lazy_import("google.api_core.exceptions")
 
 def get_client():
     return {
@@ -13,70 +24,540 @@ def get_client():
         'project_id': config.creds['project_id']
     }
 
+# Process-wide cache of dataset/table metadata, so repeated loads into the same table (e.g. every `--weekly` chunk)
+# skip the existence checks and the expiry update. Entries expire after `config.BQ_METADATA_TTL` seconds and are
+# dropped when BigQuery reports the dataset or table as missing.
+_datasets = {}
+_tables = {}
+# Serializes the existence checks, so loads running in threads (e.g. concurrent backfill chunks) create a dataset
+# or table only once
+_metadata_lock = threading.Lock()
+
+# Field types a table can be partitioned on
+PARTITION_TYPES = ("DATE", "DATETIME", "TIMESTAMP")
+# Field types a table can be clustered on
+CLUSTER_TYPES = ("STRING", "INTEGER", "NUMERIC", "BOOLEAN", "DATE", "DATETIME", "TIMESTAMP")
+
+@dataclass(frozen=True)
+class TableSpec:
+    """
+    Layout of a table created by `ensure_table()`: time partitioning, clustering and partition expiration. Columns
+    the schema does not have (or whose type does not allow it) are skipped, so one spec can serve tables with
+    slightly different columns.
+
+    Parameters:
+        - partition_column (`str`) - the `DATE`/`DATETIME`/`TIMESTAMP` column to partition on; default is `None`
+        - partition_type (`str`) - `"HOUR"`, `"DAY"`, `"MONTH"` or `"YEAR"`; default is `"DAY"`
+        - partition_expiration_days (`float`) - drop partitions older than this; default is `None` (keep forever)
+        - cluster_columns (`tuple[str]`) - up to four columns to cluster on, most filtered first; default is `()`
+    """
+    partition_column: str = None
+    partition_type: str = "DAY"
+    partition_expiration_days: float = None
+    cluster_columns: tuple = ()
+
+    def partitioning(self, schema: list) -> bigquery.TimePartitioning:
+        """
+        Returns:
+            bigquery.TimePartitioning:
+                - the partitioning for a table with `schema`, or `None`
+        """
+        if not any(field.name == self.partition_column and field.field_type in PARTITION_TYPES for field in schema or []):
+            return None
+
+        expiration_ms = int(self.partition_expiration_days * 86400000) if self.partition_expiration_days else None
+        return bigquery.TimePartitioning(type_=self.partition_type, field=self.partition_column, expiration_ms=expiration_ms)
+
+    def clustering(self, schema: list) -> list:
+        """
+        Returns:
+            list:
+                - the clustering fields for a table with `schema`, or `None`
+        """
+        fields = {field.name: field for field in schema or []}
+        columns = [
+            column for column in self.cluster_columns
+            if column in fields and fields[column].field_type in CLUSTER_TYPES and fields[column].mode != "REPEATED"
+        ]
+        return columns[:4] or None
+
+    def apply(self, table: bigquery.Table, schema: list) -> bigquery.Table:
+        """
+        Sets the partitioning and clustering of a table that is about to be created.
+        """
+        table.time_partitioning = self.partitioning(schema)
+        table.clustering_fields = self.clustering(schema)
+        return table
+
+    def matches(self, table: bigquery.Table) -> bool:
+        """
+        Returns:
+            bool:
+                - whether an existing table already has this layout
+        """
+        wanted = self.partitioning(table.schema)
+        current = table.time_partitioning
+        if (wanted is None) != (current is None):
+            return False
+        if wanted and (current.field != wanted.field or current.type_ != wanted.type_ or current.expiration_ms != wanted.expiration_ms):
+            return False
+        return (table.clustering_fields or None) == self.clustering(table.schema)
+
+def _fresh(entry: dict) -> bool:
+    return entry is not None and time.monotonic() - entry["checked_at"] < config.BQ_METADATA_TTL
+
+def invalidate_metadata(table_id: str = None):
+    """
+    Drops cached metadata so the next load checks BigQuery again.
+
+    Parameters:
+        - table_id (`str`) - `project.dataset.table` to forget, together with its dataset; default is `None` (everything)
+    """
+    if table_id is None:
+        _datasets.clear()
+        _tables.clear()
+        return
+
+    _tables.pop(table_id, None)
+    _datasets.pop(table_id.rsplit(".", 1)[0], None)
+
 def ensure_dataset(project_id: str, dataset_name: str, client: bigquery.Client):
     dataset_id = f"{project_id}.{dataset_name}"
-    try:
-        client.get_dataset(dataset_id)
-    except NotFound:
-        dataset = bigquery.Dataset(dataset_id)
-        dataset.location = "asia-southeast1"
-        client.create_dataset(dataset, timeout=30)
-        print(f"Created dataset '{dataset_id}'")
-
-def ensure_table(project_id: str, dataset_name: str, table_name: str, client: bigquery.Client, schema=None):
+    if _fresh(_datasets.get(dataset_id)):
+        return
+
+    with _metadata_lock:
+        if _fresh(_datasets.get(dataset_id)):
+            return
+
+        try:
+            client.get_dataset(dataset_id)
+        except exceptions.NotFound:
+            dataset = bigquery.Dataset(dataset_id)
+            dataset.location = "asia-southeast1"
+            client.create_dataset(dataset, timeout=30)
+            print(f"Created dataset '{dataset_id}'")
+        _datasets[dataset_id] = {"checked_at": time.monotonic()}
+
+def ensure_table(project_id: str, dataset_name: str, table_name: str, client: bigquery.Client, schema=None, spec: TableSpec = None):
+    """
+    Creates the table if it does not exist yet, partitioned and clustered as described by `spec`. Existing tables
+    are left as they are; see `migrate_table()`.
+
+    Returns:
+        bigquery.Table:
+            - the table as last seen by this process (cached for `config.BQ_METADATA_TTL` seconds)
+    """
     table_id = f"{project_id}.{dataset_name}.{table_name}"
-    try:
-        client.get_table(table_id)
-        print(f"Table {table_id} already exists.")
-    except NotFound:
-        table = bigquery.Table(table_id, schema=schema) if schema else bigquery.Table(table_id)
-        client.create_table(table)
-        print(f"Created table '{table_id}'")
-
-def generate_schema(df: pd.DataFrame) -> List[SchemaField]:
-    TYPE_MAPPING = {
-        "i": "INTEGER",
-        "u": "NUMERIC",
-        "b": "BOOLEAN",
-        "f": "FLOAT",
-        "O": "STRING",
-        "S": "STRING",
-        "U": "STRING",
-        "M": "DATETIME",
-    }
+    entry = _tables.get(table_id)
+    if _fresh(entry):
+        return entry["table"]
 
-    schema = []
-    for column, dtype in df.dtypes.items():
-        val = df[column].iloc[0]
-        mode = "REPEATED" if isinstance(val, list) else "NULLABLE"
+    with _metadata_lock:
+        entry = _tables.get(table_id)
+        if _fresh(entry):
+            return entry["table"]
 
-        if isinstance(val, dict) or (mode == "REPEATED" and isinstance(val[0], dict)):
-            fields = generate_schema(pd.json_normalize(val))
-        else:
-            fields = ()
-        
-        # type = "RECORD" if fields else TYPE_MAPPING.get(dtype.kind)
-        if fields:
-            field_type = "RECORD"
-        elif pd.api.types.is_datetime64_any_dtype(dtype):
-            field_type = "DATETIME"
+        try:
+            table = client.get_table(table_id)
+            print(f"Table {table_id} already exists.")
+        except exceptions.NotFound:
+            table = bigquery.Table(table_id, schema=schema) if schema else bigquery.Table(table_id)
+            if spec:
+                table = spec.apply(table, schema)
+            table = client.create_table(table)
+            print(f"Created table '{table_id}'")
+        _tables[table_id] = {"table": table, "checked_at": time.monotonic()}
+        return table
+
+def clear_expiry(table_id: str, client: bigquery.Client):
+    """
+    Removes the table's expiration (inherited from the dataset's default) unless it is already known to be cleared.
+    """
+    entry = _tables.get(table_id)
+    if _fresh(entry) and getattr(entry["table"], "expires", None) is None:
+        return
+
+    table = client.get_table(table_id)
+    if table.expires is not None:
+        table.expires = None
+        table = client.update_table(table, ["expires"])
+    _tables[table_id] = {"table": table, "checked_at": time.monotonic()}
+
+def run_load_job(df: pd.DataFrame, project_id: str, dataset_name: str, table_name: str, client: bigquery.Client, job_config: bigquery.LoadJobConfig, schema=None, spec: TableSpec = None):
+    """
+    Loads a DataFrame into a table, creating the dataset and table first if needed. Existence and expiry checks are
+    served from the metadata cache, so in steady state only the load job reaches BigQuery. If the load fails with
+    `NotFound` (the table or dataset was dropped since it was cached), the cache entry is invalidated and the load
+    is retried once.
+
+    Parameters:
+        - df (`pd.DataFrame`) - the rows to load
+        - project_id (`str`) - the GCP project
+        - dataset_name (`str`) - the dataset
+        - table_name (`str`) - the table
+        - client (`bigquery.Client`) - the client
+        - job_config (`bigquery.LoadJobConfig`) - the load job settings
+        - schema (`list[SchemaField]`) - used when the table has to be created; default is `None`
+        - spec (`TableSpec`) - the layout used when the table has to be created; default is `None`
+    """
+    _run_load(
+        project_id, dataset_name, table_name, client, job_config, schema, spec,
+        lambda table_id: client.load_table_from_dataframe(df, table_id, job_config=job_config)
+    )
+
+def run_parquet_load_job(path: str, project_id: str, dataset_name: str, table_name: str, client: bigquery.Client, job_config: bigquery.LoadJobConfig, schema=None, spec: TableSpec = None):
+    """
+    `run_load_job()` for a local Parquet file: the file is uploaded as it is with a Parquet load job, without
+    converting it to a DataFrame. Takes the same parameters, with `path` instead of `df`; `job_config` should have
+    `source_format=PARQUET` (see `load_parquet_to_bq()`).
+    """
+    def start(table_id: str):
+        with open(path, "rb") as f:
+            return client.load_table_from_file(f, table_id, job_config=job_config)
+
+    _run_load(project_id, dataset_name, table_name, client, job_config, schema, spec, start)
+
+def _run_load(project_id: str, dataset_name: str, table_name: str, client: bigquery.Client, job_config: bigquery.LoadJobConfig, schema, spec: TableSpec, start):
+    table_id = f"{project_id}.{dataset_name}.{table_name}"
+    for attempt in range(2):
+        ensure_dataset(project_id, dataset_name, client)
+        table = ensure_table(project_id, dataset_name, table_name, client, schema, spec)
+        if job_config.write_disposition != "WRITE_TRUNCATE":
+            add_missing_columns(table, schema, client)
+        try:
+            job = start(table_id)
+            job.result()
+            break
+        except exceptions.NotFound:
+            invalidate_metadata(table_id)
+            if attempt:
+                raise
+    clear_expiry(table_id, client)
+
+def add_missing_columns(table: bigquery.Table, schema: list, client: bigquery.Client) -> bigquery.Table:
+    """
+    Appends the fields of `schema` the table does not have yet, as `NULLABLE` columns.
+
+    Returns:
+        bigquery.Table:
+            - the (possibly updated) table
+    """
+    existing = {field.name for field in table.schema}
+    missing = [field for field in schema or [] if field.name not in existing]
+    if not missing:
+        return table
+
+    with _metadata_lock:
+        table = client.get_table(table.reference)
+        # another load may have added them in the meantime
+        existing = {field.name for field in table.schema}
+        missing = [field for field in missing if field.name not in existing]
+        if missing:
+            table.schema = list(table.schema) + [
+                bigquery.SchemaField(field.name, field.field_type, mode="REPEATED" if field.mode == "REPEATED" else "NULLABLE", fields=field.fields)
+                for field in missing
+            ]
+            table = client.update_table(table, ["schema"])
+            print(f"Added columns {[field.name for field in missing]} to {table.reference}")
+        _tables[str(table.reference)] = {"table": table, "checked_at": time.monotonic()}
+    return table
+
+def layout_statement(table_id: str, schema: list, spec: TableSpec) -> str:
+    """
+    Builds the `CREATE OR REPLACE TABLE ... AS SELECT` that rewrites a table in place with the layout of `spec`.
+    """
+    clauses = []
+    partitioning = spec.partitioning(schema)
+    if partitioning:
+        field_type = next(field.field_type for field in schema if field.name == spec.partition_column)
+        column = f"`{spec.partition_column}`"
+        if field_type == "DATE" and partitioning.type_ == "DAY":
+            clauses.append(f"PARTITION BY {column}")
+        elif partitioning.type_ == "DAY":
+            clauses.append(f"PARTITION BY DATE({column})")
         else:
-            field_type = TYPE_MAPPING.get(dtype.kind, "STRING")
-        schema.append(
-            SchemaField(
-                name=column,
-                field_type=field_type,
-                mode=mode,
-                fields=fields,
-            )
-        )
+            clauses.append(f"PARTITION BY {field_type}_TRUNC({column}, {partitioning.type_})")
+
+    clustering = spec.clustering(schema)
+    if clustering:
+        clauses.append("CLUSTER BY " + ", ".join(f"`{column}`" for column in clustering))
+    if partitioning and spec.partition_expiration_days:
+        clauses.append(f"OPTIONS (partition_expiration_days = {spec.partition_expiration_days})")
+
+    return "\n".join([f"CREATE OR REPLACE TABLE `{table_id}`", *clauses, f"AS SELECT * FROM `{table_id}`"])
+
+def migrate_table(project_id: str, dataset_name: str, table_name: str, spec: TableSpec, client: bigquery.Client, dry_run: bool = False) -> str:
+    """
+    Brings an existing table to the layout of `spec`. Clustering and partition expiration are changed in place
+    (BigQuery re-clusters data in the background). A different partitioning needs a rewrite, done atomically with
+    `CREATE OR REPLACE TABLE ... AS SELECT * FROM` the table itself, which scans the whole table once.
+
+    Parameters:
+        - project_id (`str`) - the GCP project
+        - dataset_name (`str`) - the dataset
+        - table_name (`str`) - the table to migrate
+        - spec (`TableSpec`) - the wanted layout
+        - client (`bigquery.Client`) - the client
+        - dry_run (`bool`) - only report what would be done; default is `False`
+
+    Returns:
+        str:
+            - what was (or would be) done
+    """
+    table_id = f"{project_id}.{dataset_name}.{table_name}"
+    table = client.get_table(table_id)
+    if spec.matches(table):
+        return f"{table_id} already matches the spec"
+
+    wanted = spec.partitioning(table.schema)
+    current = table.time_partitioning
+    if (wanted is None and current is None) or (wanted and current and current.field == wanted.field and current.type_ == wanted.type_):
+        if dry_run:
+            return f"Would update clustering/partition expiration of {table_id}"
+        table.clustering_fields = spec.clustering(table.schema)
+        fields = ["clustering_fields"]
+        if wanted:
+            table.time_partitioning = wanted
+            fields.append("time_partitioning")
+        client.update_table(table, fields)
+        result = f"Updated clustering/partition expiration of {table_id}"
+    else:
+        statement = layout_statement(table_id, table.schema, spec)
+        if dry_run:
+            return f"Would rewrite {table_id}:\n{statement}"
+        client.query(statement).result()
+        result = f"Rewrote {table_id} with the new partitioning"
+
+    invalidate_metadata(table_id)
+    clear_expiry(table_id, client)
+    return result
+
+def _partition_bound(name: str, value, field_type: str) -> bigquery.ScalarQueryParameter:
+    value = pd.Timestamp(value)
+    if field_type == "TIMESTAMP":
+        value = value.tz_localize("UTC") if value.tz is None else value
+        return bigquery.ScalarQueryParameter(name, "TIMESTAMP", value.to_pydatetime())
+
+    if value.tz is not None:
+        value = value.tz_localize(None)
+    if field_type == "DATE":
+        return bigquery.ScalarQueryParameter(name, "DATE", value.date())
+    return bigquery.ScalarQueryParameter(name, "DATETIME", value.to_pydatetime())
+
+def merge_statement(table: bigquery.Table, staging_id: str, df: pd.DataFrame, keys: list, partition_column: str = None):
+    """
+    Builds the MERGE of a staging table into `table` on `keys`. When `partition_column` is a date field of the table,
+    the target is restricted to the date range of `df` (plus a day on each side, so time zone shifts are covered),
+    which lets BigQuery prune every other partition.
 
+    Returns:
+        tuple:
+            - the statement
+            - its query parameters
+    """
+    columns = list(df.columns)
+    condition = " AND ".join(f"T.`{key}` = S.`{key}`" for key in keys)
+    params = []
+
+    field_types = {field.name: field.field_type for field in table.schema}
+    field_type = field_types.get(partition_column)
+    if field_type in PARTITION_TYPES and len(df) and df[partition_column].notna().all():
+        values = df[partition_column]
+        if not pd.api.types.is_datetime64_any_dtype(values):
+            values = pd.to_datetime(values)
+        params = [
+            _partition_bound("partition_start", values.min() - pd.Timedelta(days=1), field_type),
+            _partition_bound("partition_end", values.max() + pd.Timedelta(days=1), field_type),
+        ]
+        condition += f" AND T.`{partition_column}` BETWEEN @partition_start AND @partition_end"
+
+    updates = ", ".join(f"`{column}` = S.`{column}`" for column in columns if column not in keys)
+    statement = f"MERGE `{table.reference}` T\nUSING `{staging_id}` S\nON {condition}\n"
+    if updates:
+        statement += f"WHEN MATCHED THEN UPDATE SET {updates}\n"
+    statement += (
+        f"WHEN NOT MATCHED THEN INSERT ({', '.join(f'`{column}`' for column in columns)}) "
+        f"VALUES ({', '.join(f'S.`{column}`' for column in columns)})"
+    )
+    return statement, params
+
+def run_merge_job(df: pd.DataFrame, project_id: str, dataset_name: str, table_name: str, client: bigquery.Client, keys: list, spec: TableSpec = None, schema=None) -> int:
+    """
+    Upserts a DataFrame into a table: the rows are loaded into a short-lived staging table, then MERGEd into the
+    target on `keys`, so rows already in the table are updated instead of duplicated. Re-running an overlapping
+    window, or several backfills at once, leaves one row per key. A new target is created as described by `spec`,
+    and the MERGE only scans the partitions of `spec.partition_column` covered by `df`.
+
+    Parameters:
+        - df (`pd.DataFrame`) - the rows to upsert; must contain the `keys` columns
+        - project_id (`str`) - the GCP project
+        - dataset_name (`str`) - the dataset
+        - table_name (`str`) - the target table
+        - client (`bigquery.Client`) - the client
+        - keys (`list[str]`) - the columns identifying a row, e.g. `["ticket_id", "message_id"]`
+        - spec (`TableSpec`) - the layout of the table; default is `None`
+        - schema (`list[SchemaField]`) - the schema of `df`; default is generated from it
+
+    Returns:
+        int:
+            - the number of rows inserted or updated
+    """
+    table_id = f"{project_id}.{dataset_name}.{table_name}"
+    df = df.drop_duplicates(keys, keep="last")
+    schema = schema or resolve_schema(df, project_id, dataset_name, table_name, client)
+
+    for attempt in range(2):
+        ensure_dataset(project_id, dataset_name, client)
+        table = ensure_table(project_id, dataset_name, table_name, client, schema, spec)
+        table = add_missing_columns(table, schema, client)
+
+        staging_id = f"{table_id}__staging_{uuid.uuid4().hex[:12]}"
+        staging = bigquery.Table(staging_id, schema=schema)
+        # in case the run dies before the staging table is dropped
+        staging.expires = datetime.now(timezone.utc) + timedelta(hours=6)
+        try:
+            client.create_table(staging)
+            job_config = bigquery.LoadJobConfig(schema=schema, write_disposition="WRITE_TRUNCATE")
+            client.load_table_from_dataframe(df, staging_id, job_config=job_config).result()
+
+            statement, params = merge_statement(table, staging_id, df, keys, spec.partition_column if spec else None)
+            job = client.query(statement, job_config=bigquery.QueryJobConfig(query_parameters=params))
+            job.result()
+            break
+        except exceptions.NotFound:
+            invalidate_metadata(table_id)
+            if attempt:
+                raise
+        finally:
+            client.delete_table(staging_id, not_found_ok=True)
+
+    clear_expiry(table_id, client)
+    return job.num_dml_affected_rows or 0
+
+def _arrow_type_name(arrow_type: pa.DataType) -> str:
+    if pa.types.is_boolean(arrow_type):
+        return "BOOLEAN"
+    if pa.types.is_unsigned_integer(arrow_type):
+        return "NUMERIC"
+    if pa.types.is_integer(arrow_type):
+        return "INTEGER"
+    if pa.types.is_floating(arrow_type):
+        return "FLOAT"
+    if pa.types.is_decimal(arrow_type):
+        return "NUMERIC"
+    if pa.types.is_timestamp(arrow_type):
+        return "DATETIME"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return "BYTES"
+    # strings, and columns with no values to infer from
+    return "STRING"
+
+def _arrow_field(name: str, arrow_type: pa.DataType, mode: str = "NULLABLE") -> bigquery.SchemaField:
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        item = _arrow_field(name, arrow_type.value_type)
+        return bigquery.SchemaField(name, item.field_type, mode="REPEATED", fields=item.fields)
+    if pa.types.is_struct(arrow_type):
+        fields = tuple(_arrow_field(field.name, field.type) for field in arrow_type)
+        return bigquery.SchemaField(name, "RECORD", mode=mode, fields=fields)
+    return bigquery.SchemaField(name, _arrow_type_name(arrow_type), mode=mode)
+
+def _infer_field(name: str, values: pd.Series, sample_size: int):
+    """
+    Infers one field from up to `sample_size` non-null values of a column.
+
+    Returns:
+        tuple:
+            - the `SchemaField`
+            - whether there were any values to infer from
+    """
+    sample = values[values.notna()].iloc[:sample_size]
+    try:
+        field = _arrow_field(name, pa.array(sample, from_pandas=True).type)
+    except (pa.ArrowException, TypeError, ValueError):
+        # mixed types in one column, e.g. numbers and strings
+        repeated = any(isinstance(value, (list, tuple)) for value in sample)
+        field = bigquery.SchemaField(name, "STRING", mode="REPEATED" if repeated else "NULLABLE")
+    return field, len(sample) > 0
+
+def generate_schema(df: pd.DataFrame, sample_size: int = None) -> List[bigquery.SchemaField]:
+    """
+    Infers the BigQuery schema of a DataFrame. Each column's type comes from Arrow's inference over a bounded sample
+    of its non-null values, so a null or odd first row does not decide the type, nested dicts/lists become
+    `RECORD`/`REPEATED` fields in the same pass, and empty frames work. Columns without any value are `STRING`.
+
+    Parameters:
+        - df (`pd.DataFrame`) - the DataFrame
+        - sample_size (`int`) - non-null values sampled per column; default is `config.SCHEMA_SAMPLE_ROWS`
+
+    Returns:
+        list[SchemaField]:
+            - one field per column, in column order
+    """
+    sample_size = sample_size or config.SCHEMA_SAMPLE_ROWS
+    return [_infer_field(column, df[column], sample_size)[0] for column in df.columns]
+
+# Schema last resolved per table, see `resolve_schema()`
+_schemas = {}
+
+def _existing_table(table_id: str, client: bigquery.Client) -> bigquery.Table:
+    entry = _tables.get(table_id)
+    if _fresh(entry):
+        return entry["table"]
+    try:
+        table = client.get_table(table_id)
+    except exceptions.NotFound:
+        return None
+    _tables[table_id] = {"table": table, "checked_at": time.monotonic()}
+    return table
+
+def resolve_schema(df: pd.DataFrame, project_id: str, dataset_name: str, table_name: str, client: bigquery.Client = None) -> List[bigquery.SchemaField]:
+    """
+    Returns the load schema of a DataFrame for a table. Columns the table already has keep the table's type and
+    mode, so later batches never drift from it; only new columns are inferred with `generate_schema()`. The result
+    is cached per table and reused while the columns stay the same, unless a column inferred from nulls only now
+    has values.
+
+    Parameters:
+        - df (`pd.DataFrame`) - the rows about to be loaded
+        - project_id (`str`) - the GCP project
+        - dataset_name (`str`) - the dataset
+        - table_name (`str`) - the table
+        - client (`bigquery.Client`) - the client; default is `config.BQ_CLIENT`
+
+    Returns:
+        list[SchemaField]:
+            - one field per column of `df`, in column order
+    """
+    table_id = f"{project_id}.{dataset_name}.{table_name}"
+    columns = tuple(df.columns)
+    entry = _schemas.get(table_id)
+    if entry and entry["columns"] == columns and not any(df[column].notna().any() for column in entry["unresolved"]):
+        return entry["schema"]
+
+    table = _existing_table(table_id, client or get_client()['client'])
+    existing = {field.name: field for field in table.schema} if table else {}
+
+    schema = []
+    unresolved = set()
+    for column in columns:
+        if column in existing:
+            schema.append(existing[column])
+            continue
+        field, resolved = _infer_field(column, df[column], config.SCHEMA_SAMPLE_ROWS)
+        schema.append(field)
+        if not resolved:
+            unresolved.add(column)
+
+    _schemas[table_id] = {"columns": columns, "schema": schema, "unresolved": unresolved}
     return schema
 
-def load_data_to_bq(df: pd.DataFrame, project_id: str, dataset_name: str, table_name: str, write_mode: str="WRITE_APPEND", schema=None):
+def load_data_to_bq(df: pd.DataFrame, project_id: str, dataset_name: str, table_name: str, write_mode: str="WRITE_APPEND", schema=None, spec: TableSpec = None):
     client = get_client()['client']
-    ensure_dataset(project_id, dataset_name, client)
-    ensure_table(project_id, dataset_name, table_name, client, schema)
     table_id = f"{project_id}.{dataset_name}.{table_name}"
 
     job_config = bigquery.LoadJobConfig(
@@ -86,13 +567,67 @@ def load_data_to_bq(df: pd.DataFrame, project_id: str, dataset_name: str, table_
     )
 
     try:
-        job = client.load_table_from_dataframe(df, table_id, job_config=job_config)
-        job.result()
-        table = client.get_table(table_id)
-        table.expires = None
-        client.update_table(table, ["expires"])
+        run_load_job(df, project_id, dataset_name, table_name, client, job_config, schema, spec)
         print(f"Successfully loaded {df.shape[0]} rows into {table_id}")
         return f"Loaded {df.shape[0]} rows into {table_id}"
     except Exception as e:
         print(f"Error uploading data to BigQuery: {e}")
-        return f"Failed to upload data: {e}"
\ No newline at end of file
+        return f"Failed to upload data: {e}"
+
+def load_parquet_to_bq(paths: list, project_id: str, dataset_name: str, table_name: str, write_mode: str="WRITE_APPEND", schema=None, spec: TableSpec = None):
+    """
+    `load_data_to_bq()` for Parquet files written locally (see `utils.rows_file.PartitionedRowsWriter`): each file is
+    loaded with a Parquet load job, so the column types stored in the files are kept and no DataFrame is built.
+    With `write_mode="WRITE_TRUNCATE"` only the first file truncates the table.
+
+    Parameters:
+        - paths (`list[str]`) - the Parquet files
+        - project_id (`str`) - the GCP project
+        - dataset_name (`str`) - the dataset
+        - table_name (`str`) - the table
+        - write_mode (`str`) - the write disposition of the first file; default is `"WRITE_APPEND"`
+        - schema (`list[SchemaField]`) - the schema of the load job, also used when the table has to be created and
+        to add missing columns; default is `None` (the table takes the schema of the files)
+        - spec (`TableSpec`) - the layout used when the table has to be created; default is `None`
+
+    Returns:
+        str:
+            - a summary like the one returned by `load_data_to_bq()`
+    """
+    client = get_client()['client']
+    table_id = f"{project_id}.{dataset_name}.{table_name}"
+
+    parquet_options = bigquery.ParquetOptions()
+    parquet_options.enable_list_inference = True
+
+    rows = 0
+    try:
+        for i, path in enumerate(paths):
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                schema=schema,
+                write_disposition=write_mode if i == 0 else "WRITE_APPEND",
+                parquet_options=parquet_options,
+            )
+            run_parquet_load_job(path, project_id, dataset_name, table_name, client, job_config, schema, spec)
+            rows += pq.ParquetFile(path).metadata.num_rows
+        print(f"Successfully loaded {rows} rows from {len(paths)} Parquet file(s) into {table_id}")
+        return f"Loaded {rows} rows into {table_id}"
+    except Exception as e:
+        print(f"Error uploading data to BigQuery: {e}")
+        return f"Failed to upload data: {e}"
+
+def merge_data_to_bq(df: pd.DataFrame, project_id: str, dataset_name: str, table_name: str, keys: list, spec: TableSpec = None, schema=None):
+    """
+    `load_data_to_bq()` counterpart of `run_merge_job()`: upserts `df` on `keys` and returns a summary string.
+    """
+    client = get_client()['client']
+    table_id = f"{project_id}.{dataset_name}.{table_name}"
+
+    try:
+        affected = run_merge_job(df, project_id, dataset_name, table_name, client, keys, spec, schema)
+        print(f"Successfully merged {df.shape[0]} rows into {table_id} ({affected} inserted or updated)")
+        return f"Merged {df.shape[0]} rows into {table_id}"
+    except Exception as e:
+        print(f"Error merging data into BigQuery: {e}")
+        return f"Failed to merge data: {e}"
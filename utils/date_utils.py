@@ -0,0 +1,54 @@
+import pandas as pd
+
+# Format of the dates returned by the LiveAgent API, e.g. "2025-01-01 13:45:00"
+LIVEAGENT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def _parse_each(values: pd.Series, source_tz: str) -> pd.Series:
+    # one value at a time, since pandas refuses to parse values with and without a UTC offset (e.g.
+    # "2025-01-02T03:04:05Z") together; offset values are converted to naive `source_tz` time like the rest
+    def parse(value):
+        parsed = pd.to_datetime(value, errors="coerce")
+        if not pd.isna(parsed) and parsed.tzinfo is not None:
+            parsed = parsed.tz_convert(source_tz).tz_localize(None)
+        return parsed
+
+    return pd.to_datetime(values.map(parse))
+
+def normalize_datetimes(df: pd.DataFrame, *columns: str, target_tz, source_tz: str = "UTC", format: str = LIVEAGENT_DATE_FORMAT, keep_tz: bool = False) -> pd.DataFrame:
+    """
+    Parses date columns and converts them from `source_tz` to `target_tz` in one vectorized pass per column,
+    keeping them as `datetime64` so `generate_schema()` maps them to `DATETIME`. Values that do not match
+    `format` fall back to pandas' format inference (values with a UTC offset, e.g. `"2025-01-02T03:04:05Z"`, are
+    converted to `source_tz` first), and values that still cannot be parsed become `NaT`. Columns missing from the
+    DataFrame are skipped.
+
+    Parameters:
+        - df (`pd.DataFrame`) - the DataFrame
+        - *columns (`str`) - the column/(s) you want to convert
+        - target_tz (`str` or `tzinfo`) - the time zone you want to set
+        - source_tz (`str`) - the time zone of the raw values; default is `"UTC"`
+        - format (`str`) - the format of the raw values; default is `LIVEAGENT_DATE_FORMAT`. Pass `None` to let
+        pandas infer it (slower).
+        - keep_tz (`bool`) - keep the columns time zone aware; default is `False` (naive local time)
+
+    Returns:
+        pd.DataFrame:
+            - The same DataFrame with the converted columns.
+    """
+    for column in columns:
+        if column not in df.columns:
+            continue
+
+        values = df[column]
+        if not pd.api.types.is_datetime64_any_dtype(values):
+            parsed = pd.to_datetime(values, format=format, errors="coerce")
+            missed = parsed.isna() & values.notna()
+            if format and missed.any():
+                parsed[missed] = _parse_each(values[missed], source_tz)
+            values = parsed
+        if values.dt.tz is None:
+            values = values.dt.tz_localize(source_tz)
+
+        values = values.dt.tz_convert(target_tz)
+        df[column] = values if keep_tz else values.dt.tz_localize(None)
+    return df
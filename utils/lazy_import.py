@@ -0,0 +1,39 @@
+import types
+import importlib
+import threading
+
+class _LazyModule(types.ModuleType):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        # loads run in worker threads (e.g. `asyncio.to_thread()`), so the first uses may race each other; the
+        # lock makes every thread wait for the one import instead of seeing a half-executed module
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name: str):
+    """
+    Returns a module that is only imported when one of its attributes is first used. Used for the Google Cloud SDK,
+    whose import alone takes about a second, so code paths that never touch BigQuery do not pay for it. The first
+    use is thread-safe (unlike `importlib.util.LazyLoader` before Python 3.12).
+
+    Parameters:
+        - name (`str`) - the module, e.g. `"google.cloud.bigquery"`
+
+    Returns:
+        module:
+            - a stand-in for the module, importing it on first use
+    """
+    return _LazyModule(name)
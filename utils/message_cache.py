@@ -0,0 +1,114 @@
+import os
+import time
+import json
+import zlib
+import sqlite3
+from config import config
+
+def cache_marker(ticket: dict) -> str:
+    """
+    Builds the modification marker of a ticket from the ticket list. Cached messages are only used while the
+    ticket's `date_changed` and `status` are the same as when they were cached.
+
+    Parameters:
+        - ticket (`dict`) - the ticket, keyed like the columns of `fetch_tickets()`
+
+    Returns:
+        str:
+            - the marker, or `None` if the ticket has no `date_changed` (such tickets are never cached)
+    """
+    if not ticket.get("date_changed"):
+        return None
+    return f"{ticket['date_changed']}|{ticket.get('status')}"
+
+class MessageCache:
+    """
+    On-disk cache of the raw `/tickets/{ticket_id}/messages` pages, keyed by ticket ID and the ticket's modification
+    marker (see `cache_marker()`). A hit replays the pages from disk without any HTTP call, so unchanged tickets
+    cost nothing on re-runs. Pages are stored as zlib-compressed JSON in a SQLite file.
+
+    Entries older than `max_age_days` are evicted, then the oldest entries until the cache is under `max_bytes`.
+    Eviction runs when the cache is opened and every 500 writes.
+
+    Parameters:
+        - path (`str`) - the database file; default is `config.MESSAGE_CACHE_PATH`
+        - max_age_days (`float`) - default is `config.MESSAGE_CACHE_MAX_AGE_DAYS`
+        - max_bytes (`int`) - default is `config.MESSAGE_CACHE_MAX_BYTES`
+    """
+    def __init__(self, path: str = None, max_age_days: float = None, max_bytes: int = None):
+        self.path = path or config.MESSAGE_CACHE_PATH
+        self.max_age_days = config.MESSAGE_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.max_bytes = config.MESSAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "ticket_id TEXT PRIMARY KEY, marker TEXT, pages BLOB, size INTEGER, stored_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS messages_stored_at ON messages (stored_at)")
+        self.evict()
+
+    def get(self, ticket_id: str, marker: str) -> list:
+        """
+        Returns:
+            list:
+                - the cached pages of the ticket, or `None` if it is not cached or changed since
+        """
+        row = self.conn.execute(
+            "SELECT pages FROM messages WHERE ticket_id = ? AND marker = ?", (ticket_id, marker)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, ticket_id: str, marker: str, pages: list):
+        """
+        Stores all pages of a ticket, replacing any older entry.
+        """
+        blob = zlib.compress(json.dumps(pages).encode("utf-8"))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)",
+                (ticket_id, marker, blob, len(blob), time.time())
+            )
+
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self.evict()
+
+    def evict(self):
+        """
+        Drops entries older than `max_age_days`, then the oldest entries until the cache fits in `max_bytes`.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM messages WHERE stored_at < ?", (time.time() - self.max_age_days * 86400,))
+
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                cutoff = self.conn.execute(
+                    "SELECT stored_at FROM ("
+                    "SELECT stored_at, SUM(size) OVER (ORDER BY stored_at) AS running FROM messages"
+                    ") WHERE running >= ? ORDER BY stored_at LIMIT 1",
+                    (excess,)
+                ).fetchone()[0]
+                self.conn.execute("DELETE FROM messages WHERE stored_at <= ?", (cutoff,))
+
+    def close(self):
+        print(f"Message cache: {self.hits} hits, {self.misses} misses")
+        self.conn.close()
+
+def get_message_cache() -> MessageCache:
+    """
+    Returns a new `MessageCache` if `config.MESSAGE_CACHE_ENABLED` is set, otherwise `None`.
+    """
+    return MessageCache() if config.MESSAGE_CACHE_ENABLED else None
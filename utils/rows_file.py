@@ -0,0 +1,207 @@
+import io
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import config
+from utils.json_utils import dumps_rows
+
+class RowsWriter:
+    """
+    Appends DataFrame batches to a Parquet file as they are produced, one row group per batch, so the rows of a run
+    can be served later without keeping them in memory. If a batch brings a type for a column that was empty so far
+    (e.g. `tags` only `None` in the first batches), the rows written so far are re-streamed into a file with the
+    widened schema.
+
+    Usage:
+        ```
+        with RowsWriter(path) as rows:
+            rows.write(df)
+        ```
+
+    Parameters:
+        - path (`str`) - the Parquet file; it is complete once the writer is closed
+        - compression (`str`) - `"zstd"`, `"snappy"`, `"gzip"` or `"none"`; default is `config.PARQUET_COMPRESSION`
+    """
+    def __init__(self, path: str, compression: str = None):
+        self.path = path
+        self.compression = compression or config.PARQUET_COMPRESSION
+        self.rows = 0
+        self._writer = None
+        self._parts = 0
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def _open(self, schema: pa.Schema):
+        self._parts += 1
+        self._current = f"{self.path}.part{self._parts}"
+        self._writer = pq.ParquetWriter(self._current, schema, compression=self.compression)
+
+    def _widen(self, schema: pa.Schema):
+        previous = self._current
+        self._writer.close()
+        self._open(schema)
+        for batch in pq.ParquetFile(previous).iter_batches():
+            self._writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        os.remove(previous)
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        self.write_table(pa.Table.from_pandas(df, preserve_index=False))
+
+    def write_table(self, table: pa.Table):
+        if not table.num_rows:
+            return
+
+        if self._writer is None:
+            self._open(table.schema)
+        elif table.schema != self._writer.schema:
+            schema = pa.unify_schemas([self._writer.schema, table.schema], promote_options="permissive")
+            if schema != self._writer.schema:
+                self._widen(schema)
+            table = table.cast(schema)
+
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._current, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class PartitionedRowsWriter:
+    """
+    Writes DataFrame batches as Parquet files partitioned by day, in the Hive layout
+    `{root}/{partition}={YYYY-MM-DD}/{name}.parquet` that BigQuery, pyarrow and Spark read as a dataset. Each day
+    gets its own `RowsWriter`, so every batch adds one row group to the file of each day it covers. Columns that
+    are empty in a batch are written as strings, and time zone aware columns as their naive local (wall-clock) time,
+    so the files load into BigQuery as they are, with the `DATETIME` columns of a DataFrame load.
+
+    Usage:
+        ```
+        with PartitionedRowsWriter(os.path.join("parquet", "messages"), "datecreated", name) as output:
+            output.write(df)
+        output.paths
+        ```
+
+    Parameters:
+        - root (`str`) - the directory of the dataset
+        - column (`str`) - the date column the rows are partitioned on
+        - name (`str`) - the file name in each partition, e.g. the date range of the run
+        - partition (`str`) - the partition key in the directory names; default is `"date"`
+        - compression (`str`) - see `RowsWriter`; default is `config.PARQUET_COMPRESSION`
+    """
+    def __init__(self, root: str, column: str, name: str, partition: str = "date", compression: str = None):
+        self.root = root
+        self.column = column
+        self.name = name
+        self.partition = partition
+        self.compression = compression
+        self.rows = 0
+        self._writers = {}
+
+    @property
+    def paths(self) -> list:
+        """
+        The files written so far, one per day (complete once the writer is closed).
+        """
+        return [writer.path for writer in self._writers.values()]
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+
+        values = df[self.column]
+        if not pd.api.types.is_datetime64_any_dtype(values):
+            values = pd.to_datetime(values, errors="coerce")
+        # local days of tz-aware values; only the distinct days are formatted
+        days = values.dt.floor("D")
+
+        aware = [name for name in df.columns if isinstance(df[name].dtype, pd.DatetimeTZDtype)]
+        if aware:
+            df = df.assign(**{name: df[name].dt.tz_localize(None) for name in aware})
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.cast(pa.schema([
+            field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema
+        ]))
+
+        for day in days.unique():
+            key = "__HIVE_DEFAULT_PARTITION__" if pd.isna(day) else day.strftime("%Y-%m-%d")
+            mask = days.isna() if pd.isna(day) else days == day
+            if key not in self._writers:
+                path = os.path.join(self.root, f"{self.partition}={key}", f"{self.name}.parquet")
+                self._writers[key] = RowsWriter(path, self.compression)
+            self._writers[key].write_table(table.filter(pa.array(mask.to_numpy())))
+        self.rows += len(df)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def count_rows(path: str) -> int:
+    """
+    Returns:
+        int:
+            - the number of rows in a Parquet file, read from its footer
+    """
+    return pq.ParquetFile(path).metadata.num_rows
+
+def iter_batches(path: str, offset: int = 0, limit: int = None, batch_size: int = 1000):
+    """
+    Reads rows `offset` to `offset + limit` of a Parquet file as Arrow record batches of at most `batch_size` rows.
+    Only the batches in range are converted, so memory stays at about one batch.
+    """
+    remaining = limit
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        if offset >= batch.num_rows:
+            offset -= batch.num_rows
+            continue
+
+        batch = batch.slice(offset)
+        offset = 0
+        if remaining is not None:
+            batch = batch.slice(0, remaining)
+            remaining -= batch.num_rows
+
+        if batch.num_rows:
+            yield batch
+        if remaining is not None and remaining <= 0:
+            return
+
+def stream_ndjson(path: str, offset: int = 0, limit: int = None, batch_size: int = 1000):
+    """
+    Yields rows of a Parquet file as newline-delimited JSON, one chunk per batch.
+    """
+    for batch in iter_batches(path, offset, limit, batch_size):
+        yield dumps_rows(batch.to_pylist())
+
+def stream_arrow(path: str, offset: int = 0, limit: int = None, batch_size: int = 1000):
+    """
+    Yields rows of a Parquet file in the Arrow IPC streaming format, one chunk per batch.
+    """
+    schema = pq.ParquetFile(path).schema_arrow
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, schema) as stream:
+        for batch in iter_batches(path, offset, limit, batch_size):
+            stream.write_batch(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import sqlite3
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pandas as pd
+from datetime import datetime, timezone
+from config import config
+
+# Run IDs as generated by `RunJournal`; anything else is rejected, so a run ID never points outside the journal root
+RUN_ID_PATTERN = re.compile(r"[0-9a-f]{12}")
+
+class RunJournal:
+    """
+    Checkpoint of one extraction run on local disk. Every batch of fetched messages is written as a Parquet
+    segment as soon as it is complete, and the tickets it covers are recorded in a SQLite index, so a run that
+    fails after hours of fetching keeps everything fetched so far. Resuming the run (same `run_id`) skips the
+    tickets already done, and the final load reads every segment back from the journal.
+
+    Work is grouped in scopes, e.g. one per date chunk of a backfill or the target table of an API job; a scope
+    is marked loaded once its load succeeded, so a resumed run does not load it again.
+
+    Usage:
+        ```
+        journal = RunJournal(run_id)
+        tickets = journal.pending(scope, stream_tickets(...))
+        async for df in stream_message_frames(session, tickets, ...):
+            journal.add_frame(scope, df)
+        for df in journal.frames(scope):
+            sink.write(df)
+        journal.mark_loaded(scope)
+        ```
+
+    Parameters:
+        - run_id (`str`) - the run to resume; default is a new run
+        - root (`str`) - the directory holding the journals; default is `config.RUN_JOURNAL_DIR`
+
+    Raises:
+        - `ValueError` - if `run_id` is not a run ID generated by `RunJournal`
+        - `FileNotFoundError` - if there is no journal for `run_id`
+    """
+    def __init__(self, run_id: str = None, root: str = None):
+        root = root or config.RUN_JOURNAL_DIR
+        if run_id:
+            if not RUN_ID_PATTERN.fullmatch(run_id):
+                raise ValueError(f"Invalid run ID {run_id!r}")
+            path = os.path.realpath(os.path.join(root, run_id))
+            if os.path.dirname(path) != os.path.realpath(root):
+                raise ValueError(f"Invalid run ID {run_id!r}")
+            if not os.path.isdir(path):
+                raise FileNotFoundError(f"No run journal {run_id} in {root}")
+
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.resumed = bool(run_id)
+        self.dir = os.path.join(root, self.run_id)
+        self.path = os.path.join(self.dir, "journal.db")
+        os.makedirs(self.dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT, file TEXT, rows INTEGER, created_at TEXT)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS tickets (scope TEXT, ticket_id TEXT, PRIMARY KEY (scope, ticket_id))")
+            conn.execute("CREATE TABLE IF NOT EXISTS scopes (scope TEXT PRIMARY KEY, loaded_at TEXT)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def done_tickets(self, scope: str) -> set:
+        """
+        Returns:
+            set:
+                - the IDs of the tickets of `scope` whose messages are in the journal
+        """
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT ticket_id FROM tickets WHERE scope = ?", (scope,))}
+
+    async def pending(self, scope: str, tickets):
+        """
+        Streams the tickets of an async iterable (e.g. `stream_tickets()`) that are not done yet in `scope`.
+        """
+        done = self.done_tickets(scope)
+        if done:
+            print(f"Resuming run {self.run_id}: skipping {len(done)} ticket(s) already fetched for {scope}")
+
+        async for ticket in tickets:
+            if ticket.get("id") not in done:
+                yield ticket
+
+    def add_frame(self, scope: str, df: pd.DataFrame):
+        """
+        Writes a batch of `stream_message_frames()` as a segment and marks its tickets as done, including tickets
+        without messages (listed in `df.attrs["ticket_ids"]`). The segment is written before the index, so a crash
+        in between only leaves an unused file and the tickets are fetched again.
+        """
+        ticket_ids = df.attrs.get("ticket_ids")
+        if ticket_ids is None:
+            ticket_ids = df["ticket_id"].unique().tolist()
+
+        file = None
+        if not df.empty:
+            file = f"{uuid.uuid4().hex}.parquet"
+            path = os.path.join(self.dir, file)
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+
+        with self._connect() as conn:
+            if file:
+                conn.execute(
+                    "INSERT INTO segments (scope, file, rows, created_at) VALUES (?, ?, ?, ?)",
+                    (scope, file, len(df), datetime.now(timezone.utc).isoformat())
+                )
+            conn.executemany(
+                "INSERT OR IGNORE INTO tickets (scope, ticket_id) VALUES (?, ?)",
+                [(scope, ticket_id) for ticket_id in ticket_ids]
+            )
+
+    def frames(self, scope: str):
+        """
+        Reads the segments of `scope` back, one DataFrame at a time, in the order they were written.
+
+        Yields:
+            pd.DataFrame:
+                - a batch as passed to `add_frame()`
+        """
+        with self._connect() as conn:
+            files = [row[0] for row in conn.execute("SELECT file FROM segments WHERE scope = ? ORDER BY id", (scope,))]
+
+        for file in files:
+            yield pq.read_table(os.path.join(self.dir, file)).to_pandas()
+
+    def rows(self, scope: str) -> int:
+        """
+        Returns:
+            int:
+                - the number of messages of `scope` in the journal
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(rows), 0) FROM segments WHERE scope = ?", (scope,)).fetchone()[0]
+
+    def is_loaded(self, scope: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM scopes WHERE scope = ? AND loaded_at IS NOT NULL", (scope,)).fetchone() is not None
+
+    def mark_loaded(self, scope: str):
+        """
+        Records that `scope` was loaded. Call only after the load succeeded.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO scopes (scope, loaded_at) VALUES (?, ?)",
+                (scope, datetime.now(timezone.utc).isoformat())
+            )
+
+    def remove(self):
+        """
+        Deletes the journal, once the whole run succeeded.
+        """
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def purge_journals(root: str = None, max_age_days: float = None) -> int:
+    """
+    Deletes the journals of runs not touched for `max_age_days`, i.e. failed runs that were never resumed.
+
+    Parameters:
+        - root (`str`) - the directory holding the journals; default is `config.RUN_JOURNAL_DIR`
+        - max_age_days (`float`) - default is `config.RUN_JOURNAL_MAX_AGE_DAYS`
+
+    Returns:
+        int:
+            - the number of journals deleted
+    """
+    root = root or config.RUN_JOURNAL_DIR
+    max_age_days = config.RUN_JOURNAL_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    if not os.path.isdir(root):
+        return 0
+
+    cutoff = time.time() - max_age_days * 86400
+    purged = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        journal = os.path.join(path, "journal.db")
+        if os.path.isdir(path) and os.path.getmtime(journal if os.path.exists(journal) else path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            purged += 1
+    return purged
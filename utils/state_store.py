@@ -0,0 +1,226 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from config import config
+
+TICKET_MARK_FIELDS = ["date_changed", "last_message_date", "last_message_id"]
+
+class WatermarkStore(ABC):
+    """
+    Stores the high-water marks of incremental extractions, namespaced per target table:
+        - watermarks: one value per name, e.g. the latest `date_changed` seen in the ticket list
+        - ticket marks: per ticket, its `date_changed` and the date and ID of the last message already processed
+
+    Dates are kept as the strings returned by the LiveAgent API (`YYYY-MM-DD HH:MM:SS`), which sort correctly.
+    """
+    @abstractmethod
+    def get_watermark(self, namespace: str, name: str) -> str:
+        ...
+
+    @abstractmethod
+    def set_watermark(self, namespace: str, name: str, value: str):
+        ...
+
+    @abstractmethod
+    def get_ticket_marks(self, namespace: str, ticket_ids: list) -> dict:
+        """
+        Returns:
+            dict:
+                - ticket ID to a dictionary of `TICKET_MARK_FIELDS`, for the tickets that have marks
+        """
+
+    @abstractmethod
+    def set_ticket_marks(self, namespace: str, marks: dict):
+        """
+        Upserts ticket marks. A `None` field keeps the stored value.
+
+        Parameters:
+            - namespace (`str`) - the target table name
+            - marks (`dict`) - ticket ID to a dictionary of `TICKET_MARK_FIELDS`
+        """
+
+class SQLiteWatermarkStore(WatermarkStore):
+    """
+    Watermark store backed by a local SQLite file.
+
+    Parameters:
+        - path (`str`) - the database file; default is `config.STATE_DB_PATH`
+    """
+    def __init__(self, path: str = None):
+        self.path = path or config.STATE_DB_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS watermarks ("
+                "namespace TEXT, name TEXT, value TEXT, updated_at TEXT, PRIMARY KEY (namespace, name))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ticket_marks ("
+                "namespace TEXT, ticket_id TEXT, date_changed TEXT, last_message_date TEXT, last_message_id TEXT, "
+                "PRIMARY KEY (namespace, ticket_id))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_watermark(self, namespace: str, name: str) -> str:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM watermarks WHERE namespace = ? AND name = ?", (namespace, name)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, namespace: str, name: str, value: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO watermarks VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                (namespace, name, value, datetime.now(timezone.utc).isoformat())
+            )
+
+    def get_ticket_marks(self, namespace: str, ticket_ids: list) -> dict:
+        marks = {}
+        ticket_ids = list(ticket_ids)
+        with self._connect() as conn:
+            # SQLite caps the number of bound parameters, so look up in chunks
+            for i in range(0, len(ticket_ids), 500):
+                chunk = ticket_ids[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT ticket_id, {', '.join(TICKET_MARK_FIELDS)} FROM ticket_marks "
+                    f"WHERE namespace = ? AND ticket_id IN ({', '.join('?' * len(chunk))})",
+                    (namespace, *chunk)
+                ).fetchall()
+                for ticket_id, *values in rows:
+                    marks[ticket_id] = dict(zip(TICKET_MARK_FIELDS, values))
+        return marks
+
+    def set_ticket_marks(self, namespace: str, marks: dict):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO ticket_marks VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, ticket_id) DO UPDATE SET "
+                "date_changed = COALESCE(excluded.date_changed, date_changed), "
+                "last_message_date = COALESCE(excluded.last_message_date, last_message_date), "
+                "last_message_id = COALESCE(excluded.last_message_id, last_message_id)",
+                [
+                    (namespace, ticket_id, *(mark.get(field) for field in TICKET_MARK_FIELDS))
+                    for ticket_id, mark in marks.items()
+                ]
+            )
+
+class BigQueryWatermarkStore(WatermarkStore):
+    """
+    Watermark store backed by two BigQuery tables (`_watermarks` and `_ticket_marks`) in the configured dataset,
+    for deployments without a persistent local disk (e.g. Cloud Run).
+
+    Parameters:
+        - project_id (`str`) - the GCP project; default is `config.GCLOUD_PROJECT_ID`
+        - dataset_name (`str`) - the dataset; default is `config.BQ_DATASET_NAME`
+    """
+    def __init__(self, project_id: str = None, dataset_name: str = None):
+        from google.cloud import bigquery
+
+        self.bigquery = bigquery
+        self.client = config.BQ_CLIENT
+        dataset_id = f"{project_id or config.GCLOUD_PROJECT_ID}.{dataset_name or config.BQ_DATASET_NAME}"
+        self.watermarks_table = f"{dataset_id}._watermarks"
+        self.ticket_marks_table = f"{dataset_id}._ticket_marks"
+
+        self._query(f"""
+            CREATE TABLE IF NOT EXISTS `{self.watermarks_table}` (
+                namespace STRING, name STRING, value STRING, updated_at TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS `{self.ticket_marks_table}` (
+                namespace STRING, ticket_id STRING, date_changed STRING, last_message_date STRING, last_message_id STRING
+            )
+        """)
+
+    def _query(self, sql: str, params: list = None):
+        job_config = self.bigquery.QueryJobConfig(query_parameters=params or [])
+        return list(self.client.query(sql, job_config=job_config).result())
+
+    def get_watermark(self, namespace: str, name: str) -> str:
+        rows = self._query(
+            f"SELECT value FROM `{self.watermarks_table}` WHERE namespace = @namespace AND name = @name LIMIT 1",
+            [
+                self.bigquery.ScalarQueryParameter("namespace", "STRING", namespace),
+                self.bigquery.ScalarQueryParameter("name", "STRING", name)
+            ]
+        )
+        return rows[0]["value"] if rows else None
+
+    def set_watermark(self, namespace: str, name: str, value: str):
+        self._query(
+            f"""
+            MERGE `{self.watermarks_table}` T
+            USING (SELECT @namespace AS namespace, @name AS name, @value AS value) S
+            ON T.namespace = S.namespace AND T.name = S.name
+            WHEN MATCHED THEN UPDATE SET value = S.value, updated_at = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED THEN INSERT (namespace, name, value, updated_at)
+                VALUES (S.namespace, S.name, S.value, CURRENT_TIMESTAMP())
+            """,
+            [
+                self.bigquery.ScalarQueryParameter("namespace", "STRING", namespace),
+                self.bigquery.ScalarQueryParameter("name", "STRING", name),
+                self.bigquery.ScalarQueryParameter("value", "STRING", value)
+            ]
+        )
+
+    def get_ticket_marks(self, namespace: str, ticket_ids: list) -> dict:
+        rows = self._query(
+            f"SELECT ticket_id, {', '.join(TICKET_MARK_FIELDS)} FROM `{self.ticket_marks_table}` "
+            "WHERE namespace = @namespace AND ticket_id IN UNNEST(@ticket_ids)",
+            [
+                self.bigquery.ScalarQueryParameter("namespace", "STRING", namespace),
+                self.bigquery.ArrayQueryParameter("ticket_ids", "STRING", [str(i) for i in ticket_ids])
+            ]
+        )
+        return {row["ticket_id"]: {field: row[field] for field in TICKET_MARK_FIELDS} for row in rows}
+
+    def set_ticket_marks(self, namespace: str, marks: dict):
+        if not marks:
+            return
+
+        rows = [
+            self.bigquery.StructQueryParameter(
+                None,
+                self.bigquery.ScalarQueryParameter("ticket_id", "STRING", str(ticket_id)),
+                *(self.bigquery.ScalarQueryParameter(field, "STRING", mark.get(field)) for field in TICKET_MARK_FIELDS)
+            )
+            for ticket_id, mark in marks.items()
+        ]
+        self._query(
+            f"""
+            MERGE `{self.ticket_marks_table}` T
+            USING UNNEST(@marks) S
+            ON T.namespace = @namespace AND T.ticket_id = S.ticket_id
+            WHEN MATCHED THEN UPDATE SET
+                date_changed = COALESCE(S.date_changed, T.date_changed),
+                last_message_date = COALESCE(S.last_message_date, T.last_message_date),
+                last_message_id = COALESCE(S.last_message_id, T.last_message_id)
+            WHEN NOT MATCHED THEN INSERT (namespace, ticket_id, {', '.join(TICKET_MARK_FIELDS)})
+                VALUES (@namespace, S.ticket_id, {', '.join(f'S.{field}' for field in TICKET_MARK_FIELDS)})
+            """,
+            [
+                self.bigquery.ScalarQueryParameter("namespace", "STRING", namespace),
+                self.bigquery.ArrayQueryParameter("marks", "STRUCT", rows)
+            ]
+        )
+
+_store: WatermarkStore = None
+
+def get_watermark_store() -> WatermarkStore:
+    """
+    Returns the process-wide watermark store for `config.STATE_BACKEND`, creating it on first use.
+
+    Returns:
+        WatermarkStore:
+            - a `SQLiteWatermarkStore` or a `BigQueryWatermarkStore`
+    """
+    global _store
+    if _store is None:
+        _store = BigQueryWatermarkStore() if config.STATE_BACKEND == "bigquery" else SQLiteWatermarkStore()
+    return _store